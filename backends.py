@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import threading
+
+from google.genai import types
+
+from history import estimate_tokens
+
+
+class CassetteMismatchError(RuntimeError):
+    """Raised when a replayed session sends a request the cassette did not record."""
+
+
+def _dump(model):
+    """Serializes a google-genai pydantic object to plain JSON types."""
+    return model.model_dump(mode="json", exclude_none=True)
+
+
+def _dump_request(model, contents, config):
+    return {
+        "model": model,
+        "contents": [_dump(content) for content in contents],
+        "config": _dump(config) if config is not None else None,
+    }
+
+
+class GeminiBackend:
+    """Streams responses from the real Gemini API through a genai.Client."""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def generate_stream(self, model, contents, config):
+        stream = await self.client.aio.models.generate_content_stream(
+            model=model, contents=contents, config=config
+        )
+        async for chunk in stream:
+            yield chunk
+
+
+def as_backend(client_or_backend):
+    """Wraps a genai.Client in a GeminiBackend; backends are returned unchanged."""
+    if hasattr(client_or_backend, "generate_stream"):
+        return client_or_backend
+    return GeminiBackend(client_or_backend)
+
+
+class RecordingBackend:
+    """
+    Passes requests through to another backend and saves every request and its
+    streamed response chunks to a JSON cassette file.
+
+    The cassette is rewritten after each interaction, so a session that crashes
+    part way through still leaves a usable recording behind.
+    """
+
+    def __init__(self, inner, cassette_path):
+        self.inner = as_backend(inner)
+        self.cassette_path = cassette_path
+        self.interactions = []
+        self._lock = threading.Lock()
+
+    async def generate_stream(self, model, contents, config):
+        chunks = []
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            chunks.append(_dump(chunk))
+            yield chunk
+
+        with self._lock:
+            self.interactions.append(
+                {
+                    "request": _dump_request(model, contents, config),
+                    "response": chunks,
+                }
+            )
+            directory = os.path.dirname(os.path.abspath(self.cassette_path))
+            os.makedirs(directory, exist_ok=True)
+            with open(self.cassette_path, "w") as f:
+                json.dump({"interactions": self.interactions}, f, indent=1)
+
+
+class ReplayBackend:
+    """
+    Serves responses from a cassette written by RecordingBackend, without
+    touching the network.
+
+    Interactions are matched by the conversation sent: a request is answered
+    with the recorded response whose contents are identical. With strict=False,
+    unmatched requests fall back to the next unused interaction in recorded
+    order, which is handy when tool output has changed slightly since recording.
+    """
+
+    def __init__(self, cassette_path, strict=True):
+        with open(cassette_path, "r") as f:
+            self.interactions = json.load(f)["interactions"]
+        self.strict = strict
+        self._used = set()
+        self._lock = threading.Lock()
+
+    def _find(self, contents):
+        wanted = [_dump(content) for content in contents]
+        with self._lock:
+            for index, interaction in enumerate(self.interactions):
+                if index not in self._used and interaction["request"]["contents"] == wanted:
+                    self._used.add(index)
+                    return interaction
+            if not self.strict:
+                for index, interaction in enumerate(self.interactions):
+                    if index not in self._used:
+                        self._used.add(index)
+                        return interaction
+        raise CassetteMismatchError(
+            f"No recorded response for a conversation of {len(contents)} messages"
+        )
+
+    async def generate_stream(self, model, contents, config):
+        interaction = self._find(contents)
+        for chunk in interaction["response"]:
+            yield types.GenerateContentResponse.model_validate(chunk)
+
+
+def _scripted_part(step):
+    """Turns a plan step ({"text": ...} or {"call": name, "args": {...}}) into a Part."""
+    if "call" in step:
+        return types.Part(
+            function_call=types.FunctionCall(
+                name=step["call"], args=step.get("args", {})
+            )
+        )
+    return types.Part(text=step["text"])
+
+
+class ScriptedBackend:
+    """
+    Fake model that plays back a fixed plan, for offline tests and benchmarks.
+
+    `turns` is a list with one entry per model response; each entry is a list of
+    steps such as {"call": "get_file_content", "args": {"file_path": "x"}} or
+    {"text": "..."}. The turn to play is chosen from the number of model
+    messages already in the conversation, so one backend can serve many
+    concurrent sessions. Each response waits `latency` seconds before the first
+    chunk and `chunk_latency` seconds between chunks, and reports usage
+    metadata estimated from the request size.
+    """
+
+    def __init__(self, turns, latency=0.0, chunk_latency=0.0):
+        self.turns = turns
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.calls = 0
+
+    async def generate_stream(self, model, contents, config):
+        self.calls += 1
+        turn_index = sum(1 for content in contents if content.role == "model")
+        if turn_index >= len(self.turns):
+            steps = [{"text": "Scripted plan finished."}]
+        else:
+            steps = self.turns[turn_index]
+
+        prompt_tokens = sum(estimate_tokens(content) for content in contents)
+        if config is not None and config.system_instruction:
+            prompt_tokens += len(str(config.system_instruction)) // 4
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        for index, step in enumerate(steps):
+            if index and self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            is_last = index == len(steps) - 1
+            part = _scripted_part(step)
+            yield types.GenerateContentResponse(
+                candidates=[
+                    types.Candidate(content=types.Content(role="model", parts=[part]))
+                ],
+                usage_metadata=(
+                    types.GenerateContentResponseUsageMetadata(
+                        prompt_token_count=prompt_tokens,
+                        candidates_token_count=sum(
+                            estimate_tokens(types.Content(parts=[_scripted_part(s)]))
+                            for s in steps
+                        ),
+                    )
+                    if is_last
+                    else None
+                ),
+            )
@@ -0,0 +1,187 @@
+"""
+Offline benchmarks for the agent loop in main.py.
+
+Each scenario replays a canned function-call plan through ScriptedBackend (or a
+recorded cassette through ReplayBackend), so the numbers cover our own overhead
+and the real tools, with model latency simulated instead of fetched.
+
+Usage:
+    python benchmarks/agent_loop.py [--repeat N] [--latency SECONDS] [--json]
+    python benchmarks/agent_loop.py --cassette session.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+# Make the project root and its 'functions' directory importable.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "functions"))
+
+import call_function as call_function_module  # noqa: E402
+import main  # noqa: E402
+from backends import ReplayBackend, ScriptedBackend, as_backend  # noqa: E402
+from history import estimate_tokens  # noqa: E402
+from tool_cache import tool_cache  # noqa: E402
+
+# Canned plans, one list of steps per model turn.
+SCENARIOS = {
+    # The "When analyzing code" flow from the system prompt.
+    "calculator_code_review": (
+        "How does the calculator render results?",
+        [
+            [{"call": "get_file_content", "args": {"file_path": "calculator/main.py"}}],
+            [
+                {
+                    "call": "get_file_content",
+                    "args": {"file_path": "calculator/pkg/render.py"},
+                }
+            ],
+            [{"text": "1. main.py evaluates the expression.\n2. render() draws a box."}],
+        ],
+    ),
+    # The "what files are in the root?" special case: two listings in one turn.
+    "root_listing": (
+        "what files are in the root?",
+        [
+            [
+                {"call": "get_files_info", "args": {"directory": "."}},
+                {"call": "get_files_info", "args": {"directory": "calculator"}},
+            ],
+            [{"text": "The root contains main.py, tests.py and calculator/."}],
+        ],
+    ),
+    "run_calculator_tests": (
+        "Run the calculator tests",
+        [
+            [{"call": "run_python_file", "args": {"file_path": "calculator/tests.py"}}],
+            [{"text": "All calculator tests pass."}],
+        ],
+    ),
+}
+
+
+class TimedBackend:
+    """Wraps a backend and records how long each model call takes and what it was sent."""
+
+    def __init__(self, inner):
+        self.inner = as_backend(inner)
+        self.model_seconds = 0.0
+        self.history_tokens = []
+
+    async def generate_stream(self, model, contents, config):
+        started = time.perf_counter()
+        self.history_tokens.append(sum(estimate_tokens(c) for c in contents))
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            yield chunk
+        self.model_seconds += time.perf_counter() - started
+
+
+class ToolTimer:
+    """Times every call_function dispatch while installed."""
+
+    def __init__(self):
+        self.durations = []
+        self._original = call_function_module.call_function
+
+    def __enter__(self):
+        def timed_call_function(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return self._original(*args, **kwargs)
+            finally:
+                self.durations.append(time.perf_counter() - started)
+
+        call_function_module.call_function = timed_call_function
+        return self
+
+    def __exit__(self, *exc_info):
+        call_function_module.call_function = self._original
+
+
+def run_once(backend_factory, prompt):
+    """Runs one session and returns its timing breakdown."""
+    tool_cache.clear()  # Measure cold tool calls on every repetition.
+    backend = TimedBackend(backend_factory())
+
+    with ToolTimer() as tools:
+        started = time.perf_counter()
+        result = asyncio.run(
+            main.process_ai_interaction_async(backend, prompt, verbose=False, quiet=True)
+        )
+        total_seconds = time.perf_counter() - started
+
+    iterations = max(result["iterations"], 1)
+    overhead = total_seconds - backend.model_seconds - sum(tools.durations)
+    return {
+        "total_seconds": total_seconds,
+        "model_seconds": backend.model_seconds,
+        "tool_seconds": sum(tools.durations),
+        "tool_calls": len(tools.durations),
+        "overhead_per_iteration_seconds": max(overhead, 0.0) / iterations,
+        "iterations": result["iterations"],
+        "final_history_tokens": backend.history_tokens[-1] if backend.history_tokens else 0,
+    }
+
+
+def summarize(samples):
+    """Median of every numeric field across repetitions."""
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--cassette", help="Benchmark a recorded session instead.")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    # Tools resolve paths relative to the project root.
+    os.chdir(PROJECT_ROOT)
+
+    if args.cassette:
+        with open(args.cassette, "r") as f:
+            first_request = json.load(f)["interactions"][0]["request"]
+        prompt = first_request["contents"][0]["parts"][0]["text"]
+        scenarios = {
+            os.path.basename(args.cassette): (
+                prompt,
+                lambda: ReplayBackend(args.cassette, strict=False),
+            )
+        }
+    else:
+        scenarios = {
+            name: (prompt, lambda turns=turns: ScriptedBackend(turns, latency=args.latency))
+            for name, (prompt, turns) in SCENARIOS.items()
+        }
+
+    results = {}
+    for name, (prompt, backend_factory) in scenarios.items():
+        samples = [run_once(backend_factory, prompt) for _ in range(args.repeat)]
+        results[name] = summarize(samples)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{'scenario':<24} {'iters':>5} {'total ms':>9} {'model ms':>9} "
+        f"{'tools ms':>9} {'calls':>5} {'ovh/iter ms':>11} {'history tok':>11}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<24} {r['iterations']:>5.0f} {r['total_seconds'] * 1000:>9.1f} "
+            f"{r['model_seconds'] * 1000:>9.1f} {r['tool_seconds'] * 1000:>9.1f} "
+            f"{r['tool_calls']:>5.0f} {r['overhead_per_iteration_seconds'] * 1000:>11.2f} "
+            f"{r['final_history_tokens']:>11.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
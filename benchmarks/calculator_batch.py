@@ -0,0 +1,107 @@
+"""
+Benchmark of Calculator.evaluate_batch against a per-row evaluate() loop.
+
+Every method evaluates the same formula over the same random columns; the
+NumPy and array.array paths are timed separately, whichever are available.
+
+Usage:
+    python benchmarks/calculator_batch.py [--rows N] [--repeat N] [--json]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+# Make the calculator package importable.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "calculator"))
+
+import pkg.calculator as calculator_module  # noqa: E402
+from pkg.calculator import Calculator, evaluate_batch  # noqa: E402
+
+FORMULA = "(price * quantity - discount) / (1 + rate) - -fee"
+
+
+def make_columns(rows):
+    generator = random.Random(0)
+    return {
+        "price": [generator.uniform(1, 100) for _ in range(rows)],
+        "quantity": [float(generator.randint(1, 20)) for _ in range(rows)],
+        "discount": [generator.uniform(0, 10) for _ in range(rows)],
+        "rate": [generator.choice((0.0, 0.1, 0.2)) for _ in range(rows)],
+        "fee": [generator.uniform(0, 2) for _ in range(rows)],
+    }
+
+
+def per_row(columns):
+    calculator = Calculator()
+    names = list(columns)
+    return [
+        calculator.evaluate(FORMULA, **dict(zip(names, row)))
+        for row in zip(*columns.values())
+    ]
+
+
+def batch_numpy(columns):
+    return evaluate_batch(FORMULA, columns)
+
+
+def batch_array(columns):
+    numpy = calculator_module.numpy
+    calculator_module.numpy = None  # Force the array.array fallback.
+    try:
+        return evaluate_batch(FORMULA, columns)
+    finally:
+        calculator_module.numpy = numpy
+
+
+def time_method(method, columns, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        method(columns)
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    columns = make_columns(args.rows)
+    methods = {"per_row": (per_row, columns), "batch_array": (batch_array, columns)}
+    numpy = calculator_module.numpy
+    if numpy is not None:
+        # Columns already in NumPy arrays, as a table loaded with NumPy would be.
+        arrays = {name: numpy.asarray(column) for name, column in columns.items()}
+        methods["batch_numpy"] = (batch_numpy, arrays)
+
+    results = {}
+    for name, (method, inputs) in methods.items():
+        seconds = time_method(method, inputs, args.repeat)
+        results[name] = {"seconds": seconds, "rows_per_second": args.rows / seconds}
+    for r in results.values():
+        r["speedup"] = results["per_row"]["seconds"] / r["seconds"]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{args.rows} rows of {FORMULA!r}")
+    print(f"{'method':<12} {'ms':>9} {'rows/s':>12} {'speedup':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:<12} {r['seconds'] * 1000:>9.1f} {r['rows_per_second']:>12.0f} "
+            f"{r['speedup']:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,322 @@
+"""
+Benchmark suite for the calculator and the tool functions on synthetic workloads.
+
+Each workload builds its input in a scratch directory, then is timed over
+several repetitions (best wall time, the least noisy to compare) and run once more under tracemalloc
+for the peak Python memory it allocates. Results are compared with a JSON
+baseline; the run fails if any workload is slower, or peaks higher, than its
+baseline by more than the threshold.
+
+Baselines are machine-specific: record them on the machine you compare on.
+Timings are compared relative to a fixed pure-Python calibration loop timed
+in the same run, so a uniformly slower (e.g. busier) machine doesn't count
+as a regression.
+The small scale finishes in well under a minute; the full scale builds
+100k-entry directories and multi-GB files and needs several GB of scratch
+space.
+
+A change that makes a workload slower or hungrier on purpose re-records its
+baseline in the same commit (--save-baseline --only NAME). Peak memory
+depends on the Python version rather than the machine, so CI checks it on
+every push and pull request with --memory-only; the timing check is for
+runs on the machine that recorded the baseline.
+
+Usage:
+    python benchmarks/suite.py [--scale small|full] [--repeat N] [--only NAME ...]
+    python benchmarks/suite.py --save-baseline           # record benchmarks/baselines.json
+    python benchmarks/suite.py --threshold 0.5 --json    # compare, fail on >50% regressions
+    python benchmarks/suite.py --memory-only             # compare peak memory only
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Make the project root, its 'functions' directory and the calculator importable.
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "functions"))
+sys.path.insert(0, os.path.join(PROJECT_ROOT, "calculator"))
+
+from get_file_content import get_file_content  # noqa: E402
+from get_files_info import get_files_info  # noqa: E402
+from pkg.calculator import Calculator, compile_expression, evaluate_batch  # noqa: E402
+from run_python import run_python_file  # noqa: E402
+from write_file import write_file  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# A workload may be this much slower (or use this much more peak memory) than
+# its baseline before the run fails.
+DEFAULT_THRESHOLD = 0.5
+
+# Timings shorter than this are too noisy to fail a run on.
+MIN_COMPARED_SECONDS = 0.01
+
+# Workload sizes per scale.
+SCALES = {
+    "small": {
+        "expression_terms": 20_000,
+        "nesting_depth": 1_000,
+        "batch_rows": 200_000,
+        "directory_entries": 10_000,
+        "file_bytes": 64 * 1024**2,
+        "script_output_bytes": 20 * 1024**2,
+        "small_writes": 500,
+    },
+    "full": {
+        "expression_terms": 200_000,
+        "nesting_depth": 5_000,
+        "batch_rows": 5_000_000,
+        "directory_entries": 100_000,
+        "file_bytes": 2 * 1024**3,
+        "script_output_bytes": 500 * 1024**2,
+        "small_writes": 5_000,
+    },
+}
+
+WORKLOADS = {}
+
+
+def workload(name):
+    """Registers a setup function: setup(scratch, sizes) returns the callable to time."""
+
+    def decorator(setup):
+        WORKLOADS[name] = setup
+        return setup
+
+    return decorator
+
+
+@workload("calculator_long_expression")
+def _calculator_long_expression(scratch, sizes):
+    # A flat chain is the worst case for the compile step: one operator per term.
+    terms = [f"{i % 97 + 1} {'+-*/'[i % 4]} " for i in range(sizes["expression_terms"])]
+    expression = "".join(terms) + "1"
+
+    def run():
+        compile_expression.cache_clear()
+        Calculator().evaluate(expression)
+
+    return run
+
+
+@workload("calculator_nested_expression")
+def _calculator_nested_expression(scratch, sizes):
+    depth = sizes["nesting_depth"]
+    expression = "(1 + " * depth + "1" + ")" * depth
+
+    def run():
+        compile_expression.cache_clear()
+        calculator = Calculator()
+        calculator.evaluate(expression)
+        calculator.evaluate(expression)  # The second call runs the compiled form.
+
+    return run
+
+
+@workload("calculator_cached_evaluate")
+def _calculator_cached_evaluate(scratch, sizes):
+    calculator = Calculator()
+    expression = "(price * quantity - discount) / (1 + rate)"
+
+    def run():
+        for i in range(100_000):
+            calculator.evaluate(expression, price=i, quantity=3, discount=1, rate=0.2)
+
+    return run
+
+
+@workload("calculator_evaluate_batch")
+def _calculator_evaluate_batch(scratch, sizes):
+    rows = sizes["batch_rows"]
+    columns = {"a": [float(i % 1000) for i in range(rows)], "b": [float(i % 7) for i in range(rows)]}
+    return lambda: evaluate_batch("(a * 2 - b) / b", columns)
+
+
+@workload("get_files_info_large_directory")
+def _get_files_info_large_directory(scratch, sizes):
+    directory = os.path.join(scratch, "many")
+    os.makedirs(directory)
+    for i in range(sizes["directory_entries"]):
+        with open(os.path.join(directory, f"file_{i:06d}.txt"), "w") as f:
+            f.write("x")
+    return lambda: get_files_info(scratch, "many")
+
+
+@workload("get_file_content_large_file")
+def _get_file_content_large_file(scratch, sizes):
+    path = os.path.join(scratch, "large.txt")
+    line = b"The quick brown fox jumps over the lazy dog. 0123456789\n"
+    block = line * (1024 * 1024 // len(line))
+    with open(path, "wb") as f:
+        written = 0
+        while written < sizes["file_bytes"]:
+            f.write(block)
+            written += len(block)
+    lines = written // len(line)
+
+    def run():
+        get_file_content(scratch, "large.txt")  # The head of the file.
+        get_file_content(scratch, "large.txt", start_line=lines // 2, line_count=100)
+        get_file_content(scratch, "large.txt", byte_offset=written - 4096, byte_count=4096)
+
+    return run
+
+
+@workload("run_python_file_high_output")
+def _run_python_file_high_output(scratch, sizes):
+    with open(os.path.join(scratch, "noisy.py"), "w") as f:
+        f.write(
+            "import sys\n"
+            "block = b'y' * 65535 + b'\\n'\n"
+            f"for _ in range({sizes['script_output_bytes'] // 65536}):\n"
+            "    sys.stdout.buffer.write(block)\n"
+        )
+    return lambda: run_python_file(scratch, "noisy.py", timeout=600)
+
+
+@workload("write_file_many_small_writes")
+def _write_file_many_small_writes(scratch, sizes):
+    count = sizes["small_writes"]
+
+    def run():
+        for i in range(count):
+            write_file(scratch, f"writes/{i % 50}/note_{i}.txt", f"note {i}\n")
+
+    return run
+
+
+def calibrate(repeat):
+    """Best time of a fixed pure-Python loop; timings are compared relative to it."""
+    samples = []
+    for _ in range(max(repeat, 5)):
+        started = time.perf_counter()
+        total = 0
+        for i in range(1_000_000):
+            total += i % 7
+        samples.append(time.perf_counter() - started)
+    return min(samples)
+
+
+def measure(name, setup, sizes, repeat):
+    """Builds the workload in a fresh scratch directory; returns its timing and peak memory."""
+    scratch = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    try:
+        run = setup(scratch, sizes)
+        run()  # Warm-up: imports, caches, page cache.
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            samples.append(time.perf_counter() - started)
+
+        tracemalloc.start()
+        try:
+            run()
+            _current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    return {"seconds": min(samples), "peak_bytes": peak}
+
+
+def compare(results, calibration, baseline, threshold, memory_only=False):
+    """Returns one message per workload that regressed beyond the threshold."""
+    # Scale the baseline timings by how fast this run's machine is.
+    speed = calibration / baseline.get("_calibration_seconds", calibration)
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        expected_seconds = expected["seconds"] * speed
+        if (
+            not memory_only
+            and expected_seconds >= MIN_COMPARED_SECONDS
+            and result["seconds"] > expected_seconds * (1 + threshold)
+        ):
+            regressions.append(
+                f"{name}: {result['seconds'] * 1000:.1f} ms vs baseline "
+                f"{expected_seconds * 1000:.1f} ms (adjusted for machine speed)"
+            )
+        if result["peak_bytes"] > expected["peak_bytes"] * (1 + threshold) + 64 * 1024:
+            regressions.append(
+                f"{name}: peak {result['peak_bytes'] / 1024**2:.1f} MiB vs baseline "
+                f"{expected['peak_bytes'] / 1024**2:.1f} MiB"
+            )
+    return regressions
+
+
+def load_baselines(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="+", choices=sorted(WORKLOADS), help="Run only these workloads.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Record results as the new baseline.")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument(
+        "--memory-only", action="store_true", help="Compare peak memory only, not timings."
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    sizes = SCALES[args.scale]
+    calibration = calibrate(args.repeat)
+    results = {}
+    for name in args.only or WORKLOADS:
+        results[name] = measure(name, WORKLOADS[name], sizes, args.repeat)
+        if not args.json:
+            r = results[name]
+            print(
+                f"{name:<32} {r['seconds'] * 1000:>10.1f} ms "
+                f"{r['peak_bytes'] / 1024**2:>9.2f} MiB peak",
+                flush=True,
+            )
+
+    baselines = load_baselines(args.baseline)
+    if args.save_baseline:
+        baseline = baselines.setdefault(args.scale, {})
+        if args.only and "_calibration_seconds" in baseline:
+            # Keep the other workloads' timings valid: express the new ones
+            # against the calibration they were recorded with.
+            speed = baseline["_calibration_seconds"] / calibration
+            for result in results.values():
+                result["seconds"] *= speed
+        else:
+            baseline["_calibration_seconds"] = calibration
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved {args.scale} baseline to {args.baseline}", file=sys.stderr)
+        return 0
+
+    regressions = compare(
+        results, calibration, baselines.get(args.scale, {}), args.threshold, args.memory_only
+    )
+    if args.json:
+        print(json.dumps({"results": results, "regressions": regressions}, indent=2))
+    for message in regressions:
+        print(f"REGRESSION {message}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
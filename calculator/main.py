@@ -1,17 +1,28 @@
+import argparse
 import sys
 from pkg.calculator import Calculator
 from pkg.render import render
 
+# Output buffer for streaming mode; each chunk is written in one call.
+OUTPUT_BUFFER_BYTES = 1024 * 1024
+
 
 def main():
-    calculator = Calculator()
-    if len(sys.argv) <= 1:
+    args, parser = parse_args(sys.argv[1:])
+    if args.stdin or args.file:
+        stream_main(args, parser)
+        return
+
+    if not args.expression:
         print("Calculator App")
         print('Usage: python main.py "<expression>"')
+        print("       python main.py --stdin | --file PATH [--workers N] [--chunk-size N]")
+        print("                      [--format compact|table]")
         print('Example: python main.py "3 + 5"')
         return
 
-    expression = " ".join(sys.argv[1:])
+    calculator = Calculator()
+    expression = " ".join(args.expression)
     try:
         result = calculator.evaluate(expression)
         to_print = render(expression, result)
@@ -20,5 +31,53 @@ def main():
         print(f"Error: {e}")
 
 
+def parse_args(argv):
+    # Options may come in any order, e.g. --workers 4 --stdin.
+    parser = argparse.ArgumentParser(prog="main.py")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--stdin", action="store_true")
+    source.add_argument("--file")
+    parser.add_argument("--workers", type=int)  # Defaults to the CPU count.
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--format")
+    parser.add_argument("expression", nargs="*")
+    args = parser.parse_args(argv)
+
+    streaming = args.stdin or args.file
+    if streaming and args.expression:
+        parser.error("give an expression or --stdin/--file, not both")
+    if not streaming and (args.workers, args.chunk_size, args.format) != (None, None, None):
+        parser.error("--workers, --chunk-size and --format need --stdin or --file")
+    return args, parser
+
+
+def stream_main(args, parser):
+    # Evaluates one expression per input line and writes one line per result.
+    # Imported here so a single expression doesn't pay for multiprocessing.
+    from pkg.stream import DEFAULT_CHUNK_SIZE, RENDERERS, stream_results
+
+    output_format = args.format or "compact"
+    if output_format not in RENDERERS:
+        parser.error(f"--format must be one of: {', '.join(sorted(RENDERERS))}")
+    chunk_size = args.chunk_size or DEFAULT_CHUNK_SIZE
+
+    lines = sys.stdin if args.stdin else open(args.file, "r")
+    output = open(
+        sys.stdout.fileno(), "w", buffering=OUTPUT_BUFFER_BYTES, closefd=False
+    )
+    try:
+        for text in stream_results(lines, args.workers, chunk_size, output_format):
+            output.write(text)
+    except BrokenPipeError:
+        pass  # The reader went away (e.g. piped into head); stop quietly.
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        try:
+            output.close()
+        except BrokenPipeError:
+            pass
+
+
 if __name__ == "__main__":
     main()
@@ -1,59 +1,311 @@
-class Calculator:
-    def __init__(self):
-        self.operators = {
-            "+": lambda a, b: a + b,
-            "-": lambda a, b: a - b,
-            "*": lambda a, b: a * b,
-            "/": lambda a, b: a / b,
-        }
-        self.precedence = {
-            "+": 1,
-            "-": 1,
-            "*": 2,
-            "/": 2,
-        }
-
-    def evaluate(self, expression):
-        if not expression or expression.isspace():
-            return None
-        tokens = expression.strip().split()
-        return self._evaluate_infix(tokens)
-
-    def _evaluate_infix(self, tokens):
-        values = []
-        operators = []
-
-        for token in tokens:
-            if token in self.operators:
-                while (
-                    operators
-                    and operators[-1] in self.operators
-                    and self.precedence[operators[-1]] >= self.precedence[token]
-                ):
-                    self._apply_operator(operators, values)
-                operators.append(token)
+import math
+import operator
+import re
+from array import array
+from functools import lru_cache
+from itertools import repeat
+
+try:
+    import numpy
+except ImportError:  # evaluate_batch falls back to array.array.
+    numpy = None
+
+# Compiled expressions kept by compile_expression, least recently used dropped first.
+CACHE_SIZE = 1024
+
+# Rows evaluate_batch works on at once, bounding the temporaries it allocates.
+BATCH_CHUNK_ROWS = 65536
+
+OPERATORS = {
+    "+": lambda a, b: a + b,
+    "-": lambda a, b: a - b,
+    "*": lambda a, b: a * b,
+    "/": lambda a, b: a / b,
+    "neg": lambda a: -a,
+}
+
+PRECEDENCE = {
+    "+": 1,
+    "-": 1,
+    "*": 2,
+    "/": 2,
+    "neg": 3,  # Unary minus binds tighter than any binary operator.
+}
+
+_SYMBOLS = frozenset("+-*/()")
+
+_TOKEN = re.compile(
+    r"\s*(?:(\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)|([A-Za-z_]\w*)|(\S))"
+)
+
+
+def tokenize(expression):
+    tokens = []
+    for number, name, symbol in _TOKEN.findall(expression):
+        if number:
+            tokens.append(("number", float(number)))
+        elif name:
+            tokens.append(("name", name))
+        elif symbol in _SYMBOLS:
+            tokens.append(("symbol", symbol))
+        else:
+            raise ValueError(f"invalid token: {symbol}")
+    return tokens
+
+
+def _to_postfix(tokens):
+    # Shunting-yard, checking operand/operator order as it goes so that a
+    # malformed expression fails at compile time rather than on every call.
+    output = []
+    operators = []
+    expect_operand = True
+    last_operator = None
+
+    def pop_operator():
+        output.append(("operator", operators.pop()))
+
+    for kind, value in tokens:
+        if kind != "symbol":
+            if not expect_operand:
+                raise ValueError("invalid expression")
+            output.append((kind, value))
+            expect_operand = False
+        elif value == "(":
+            if not expect_operand:
+                raise ValueError("invalid expression")
+            operators.append(value)
+        elif value == ")":
+            if expect_operand:
+                raise ValueError("invalid expression")
+            while operators and operators[-1] != "(":
+                pop_operator()
+            if not operators:
+                raise ValueError("mismatched parentheses")
+            operators.pop()
+        elif expect_operand:
+            if value != "-":
+                raise ValueError(f"not enough operands for operator {value}")
+            operators.append("neg")
+            last_operator = value
+        else:
+            while (
+                operators
+                and operators[-1] != "("
+                and PRECEDENCE[operators[-1]] >= PRECEDENCE[value]
+            ):
+                pop_operator()
+            operators.append(value)
+            expect_operand = True
+            last_operator = value
+
+    if expect_operand:
+        if last_operator is not None:
+            raise ValueError(f"not enough operands for operator {last_operator}")
+        raise ValueError("invalid expression")
+    while operators:
+        if operators[-1] == "(":
+            raise ValueError("mismatched parentheses")
+        pop_operator()
+    return output
+
+
+def run_postfix(postfix, variables, values, operators=OPERATORS):
+    # Generic stack machine over the compiled form; `values` holds one value
+    # per name in `variables`.
+    stack = []
+    for kind, value in postfix:
+        if kind == "number":
+            stack.append(value)
+        elif kind == "name":
+            stack.append(values[variables.index(value)])
+        elif value == "neg":
+            stack.append(operators["neg"](stack.pop()))
+        else:
+            b = stack.pop()
+            a = stack.pop()
+            stack.append(operators[value](a, b))
+    return stack[0]
+
+
+def _to_function(expression, postfix, variables):
+    # Turns the postfix form into the source of a Python lambda taking the
+    # variables positionally, with only the parentheses precedence needs, and
+    # compiles it once. Operands stay in postfix order, so a + b + c still
+    # evaluates left to right.
+    constants = {}
+    stack = []  # (source, precedence)
+    for kind, value in postfix:
+        if kind == "number":
+            if math.isfinite(value):
+                stack.append((repr(value), 4))
             else:
-                try:
-                    values.append(float(token))
-                except ValueError:
-                    raise ValueError(f"invalid token: {token}")
+                name = f"_c{len(constants)}"
+                constants[name] = value
+                stack.append((name, 4))
+        elif kind == "name":
+            stack.append((f"_v{variables.index(value)}", 4))
+        elif value == "neg":
+            source, precedence = stack.pop()
+            if precedence < PRECEDENCE["neg"]:
+                source = f"({source})"
+            stack.append((f"-{source}", PRECEDENCE["neg"]))
+        else:
+            precedence = PRECEDENCE[value]
+            b, b_precedence = stack.pop()
+            a, a_precedence = stack.pop()
+            if a_precedence < precedence:
+                a = f"({a})"
+            if b_precedence <= precedence:
+                b = f"({b})"
+            stack.append((f"{a} {value} {b}", precedence))
+
+    parameters = ", ".join(f"_v{i}" for i in range(len(variables)))
+    source = f"lambda {parameters}: {stack[0][0]}"
+    try:
+        code = compile(source, f"<expression {expression!r}>", "eval")
+    except (SyntaxError, RecursionError, MemoryError):
+        # Too deeply nested for the Python compiler; interpret the postfix instead.
+        return lambda *values: run_postfix(postfix, variables, values)
+    return eval(code, {"__builtins__": {}, **constants})
+
 
-        while operators:
-            self._apply_operator(operators, values)
+class CompiledExpression:
+    def __init__(self, expression, postfix):
+        self.expression = expression
+        self.postfix = postfix
+        self.variables = tuple(
+            dict.fromkeys(value for kind, value in postfix if kind == "name")
+        )
+        # Building Python code costs far more than one postfix run, so an
+        # expression is only turned into code once it is evaluated again.
+        self._function = None
+        self._evaluated = False
 
-        if len(values) != 1:
-            raise ValueError("invalid expression")
+    def evaluate(self, variables):
+        try:
+            values = [variables[name] for name in self.variables]
+        except KeyError as e:
+            raise ValueError(f"no value for variable: {e.args[0]}") from None
+        if self._function is None:
+            if not self._evaluated:
+                self._evaluated = True
+                return run_postfix(self.postfix, self.variables, values)
+            self._function = _to_function(self.expression, self.postfix, self.variables)
+        return self._function(*values)
 
-        return values[0]
+    def __call__(self, **variables):
+        return self.evaluate(variables)
 
-    def _apply_operator(self, operators, values):
-        if not operators:
-            return
+    def __repr__(self):
+        return f"CompiledExpression({self.expression!r})"
 
-        operator = operators.pop()
-        if len(values) < 2:
-            raise ValueError(f"not enough operands for operator {operator}")
 
-        b = values.pop()
-        a = values.pop()
-        values.append(self.operators[operator](a, b))
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(expression):
+    tokens = tokenize(expression)
+    if not tokens:
+        raise ValueError("empty expression")
+    return CompiledExpression(expression, _to_postfix(tokens))
+
+
+def _numpy_divide(a, b):
+    # Elementwise a / b, NaN wherever b is zero.
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        quotient = numpy.true_divide(a, b)
+    return numpy.where(numpy.asarray(b) == 0, numpy.nan, quotient)
+
+
+def _elementwise(function):
+    # Lifts a scalar function to lists, broadcasting scalar operands.
+    def apply(*operands):
+        if not any(isinstance(operand, list) for operand in operands):
+            return function(*operands)
+        return list(
+            map(
+                function,
+                *(o if isinstance(o, list) else repeat(o) for o in operands),
+            )
+        )
+
+    return apply
+
+
+def _divide_or_nan(a, b):
+    return a / b if b else math.nan
+
+
+_NUMPY_OPERATORS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _numpy_divide,
+    "neg": operator.neg,
+}
+
+_LIST_OPERATORS = {
+    "+": _elementwise(operator.add),
+    "-": _elementwise(operator.sub),
+    "*": _elementwise(operator.mul),
+    "/": _elementwise(_divide_or_nan),
+    "neg": _elementwise(operator.neg),
+}
+
+
+def evaluate_batch(expression, columns, chunk_rows=BATCH_CHUNK_ROWS):
+    # Evaluates one expression for every row of `columns` (a mapping of
+    # variable name to a sequence; all the same length). Returns a float64
+    # NumPy array, or array("d") without NumPy. Unlike evaluate(), division
+    # by zero gives NaN for that row instead of raising.
+    compiled = compile_expression(expression)
+    missing = [name for name in compiled.variables if name not in columns]
+    if missing:
+        raise ValueError(f"no value for variable: {missing[0]}")
+    lengths = {len(column) for column in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("columns must all have the same length")
+    if not lengths:
+        raise ValueError("evaluate_batch needs at least one column")
+    rows = lengths.pop()
+    chunk_rows = max(1, chunk_rows)
+
+    if numpy is not None:
+        result = numpy.empty(rows, dtype=numpy.float64)
+        for start in range(0, rows, chunk_rows):
+            end = min(start + chunk_rows, rows)
+            values = [
+                numpy.asarray(columns[name][start:end], dtype=numpy.float64)
+                for name in compiled.variables
+            ]
+            result[start:end] = run_postfix(
+                compiled.postfix, compiled.variables, values, _NUMPY_OPERATORS
+            )
+        return result
+
+    result = array("d")
+    for start in range(0, rows, chunk_rows):
+        end = min(start + chunk_rows, rows)
+        values = [[float(v) for v in columns[name][start:end]] for name in compiled.variables]
+        chunk = run_postfix(compiled.postfix, compiled.variables, values, _LIST_OPERATORS)
+        if isinstance(chunk, list):
+            result.extend(chunk)
+        else:
+            result.extend(repeat(chunk, end - start))  # No variables: the same value on every row.
+    return result
+
+
+class Calculator:
+    def __init__(self):
+        self.operators = OPERATORS
+        self.precedence = PRECEDENCE
+
+    def compile(self, expression):
+        return compile_expression(expression)
+
+    def evaluate(self, expression, **variables):
+        if not expression or expression.isspace():
+            return None
+        # Parsing only happens on a cache miss; a hit goes straight to the compiled code.
+        return compile_expression(expression).evaluate(variables)
+
+    def evaluate_batch(self, expression, columns, chunk_rows=BATCH_CHUNK_ROWS):
+        return evaluate_batch(expression, columns, chunk_rows)
@@ -1,21 +1,43 @@
-def render(expression, result):
+def format_result(result):
     if isinstance(result, float) and result.is_integer():
-        result_str = str(int(result))
-    else:
-        result_str = str(result)
+        return str(int(result))
+    return str(result)
+
+
+def render(expression, result):
+    result_str = format_result(result)
 
     box_width = max(len(expression), len(result_str)) + 4
+    blank = "│" + " " * box_width + "│"
 
-    box = []
-    box.append("┌" + "─" * box_width + "┐")
-    box.append(
-        "│" + " " * 2 + expression + " " * (box_width - len(expression) - 2) + "│"
-    )
-    box.append("│" + " " * box_width + "│")
-    box.append("│" + " " * 2 + "=" + " " * (box_width - 3) + "│")
-    box.append("│" + " " * box_width + "│")
-    box.append(
-        "│" + " " * 2 + result_str + " " * (box_width - len(result_str) - 2) + "│"
-    )
-    box.append("└" + "─" * box_width + "┘")
+    box = [
+        "┌" + "─" * box_width + "┐",
+        "│  " + expression.ljust(box_width - 2) + "│",
+        blank,
+        "│  " + "=".ljust(box_width - 2) + "│",
+        blank,
+        "│  " + result_str.ljust(box_width - 2) + "│",
+        "└" + "─" * box_width + "┘",
+    ]
     return "\n".join(box)
+
+
+# Batch output renders one line per expression. `result` is the value, or
+# the exception raised while evaluating it.
+
+
+def render_compact(expression, result):
+    if isinstance(result, Exception):
+        return f"{expression} : Error: {result}"
+    return f"{expression} = {format_result(result)}"
+
+
+TABLE_HEADER = "expression\tresult"
+
+
+def render_table_row(expression, result):
+    # Tab-separated, so tabs inside the expression become spaces.
+    expression = expression.replace("\t", " ")
+    if isinstance(result, Exception):
+        return f"{expression}\tError: {result}"
+    return f"{expression}\t{format_result(result)}"
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+from collections import deque
+from itertools import islice
+
+from pkg.calculator import Calculator
+from pkg.render import TABLE_HEADER, render_compact, render_table_row
+
+# Expressions handed to a worker at once.
+DEFAULT_CHUNK_SIZE = 2000
+
+# Chunks in flight per worker; bounds memory however long the input is.
+CHUNKS_PER_WORKER = 2
+
+RENDERERS = {
+    "compact": render_compact,
+    "table": render_table_row,
+}
+
+
+def evaluate_chunk(lines, output_format="compact"):
+    # Evaluates and renders one chunk of input lines, skipping blank ones.
+    # Returns the rendered text, newline-terminated, so it can be written in
+    # one call.
+    calculator = Calculator()
+    render_row = RENDERERS[output_format]
+    rows = []
+    for line in lines:
+        expression = line.strip()
+        if not expression:
+            continue
+        try:
+            result = calculator.evaluate(expression)
+        except (ValueError, ArithmeticError) as e:
+            result = e
+        rows.append(render_row(expression, result))
+    if not rows:
+        return ""
+    return "\n".join(rows) + "\n"
+
+
+def _chunks(lines, chunk_size):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_results(lines, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, output_format="compact"):
+    # Yields rendered chunks in input order. `lines` is read lazily: with
+    # several workers only workers * CHUNKS_PER_WORKER chunks are in flight.
+    if output_format not in RENDERERS:
+        raise ValueError(f"unknown output format: {output_format}")
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(lines, max(1, chunk_size))
+
+    if output_format == "table":
+        yield TABLE_HEADER + "\n"
+
+    if workers == 1:
+        for chunk in chunks:
+            yield evaluate_chunk(chunk, output_format)
+        return
+
+    with multiprocessing.Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(evaluate_chunk, (chunk, output_format)))
+            if len(pending) >= workers * CHUNKS_PER_WORKER:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
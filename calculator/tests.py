@@ -1,5 +1,12 @@
+import math
 import unittest
+from unittest import mock
+
+import main
+import pkg.calculator
 from pkg.calculator import Calculator
+from pkg.render import render_compact, render_table_row
+from pkg.stream import stream_results
 
 
 class TestCalculator(unittest.TestCase):
@@ -42,6 +49,115 @@ class TestCalculator(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.calculator.evaluate("+ 3")
 
+    def test_unspaced_expression(self):
+        result = self.calculator.evaluate("3+5*2")
+        self.assertEqual(result, 13)
+
+    def test_parentheses(self):
+        result = self.calculator.evaluate("(3 + 5) * (10 - 4) / 2")
+        self.assertEqual(result, 24)
+
+    def test_unary_minus(self):
+        self.assertEqual(self.calculator.evaluate("-3 * 4"), -12)
+        self.assertEqual(self.calculator.evaluate("2 - -3"), 5)
+        self.assertEqual(self.calculator.evaluate("-(2 + 3)"), -5)
+
+    def test_left_associativity(self):
+        self.assertEqual(self.calculator.evaluate("10 - 4 - 3"), 3)
+        self.assertEqual(self.calculator.evaluate("64 / 4 / 2"), 8)
+
+    def test_variables(self):
+        result = self.calculator.evaluate("price * (1 + rate)", price=200, rate=0.5)
+        self.assertEqual(result, 300)
+
+    def test_missing_variable(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("x + 1")
+
+    def test_mismatched_parentheses(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("(3 + 5")
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("3 + 5)")
+
+    def test_trailing_operator(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate("3 +")
+
+    def test_compiled_expression_is_cached(self):
+        compiled = self.calculator.compile("x * x + 1")
+        self.assertIs(self.calculator.compile("x * x + 1"), compiled)
+        self.assertEqual(compiled(x=3), 10)
+
+    def test_deeply_nested_expression(self):
+        expression = "(" * 300 + "1" + ")" * 300 + " + 1" * 5000
+        self.assertEqual(self.calculator.evaluate(expression), 5001)
+
+    def test_evaluate_batch(self):
+        result = self.calculator.evaluate_batch(
+            "a * b + 1", {"a": [1, 2, 3], "b": [4, 5, 6]}
+        )
+        self.assertEqual(list(result), [5, 11, 19])
+
+    def test_evaluate_batch_division_by_zero(self):
+        result = self.calculator.evaluate_batch("a / b", {"a": [1, 0, 3], "b": [2, 0, 0]})
+        self.assertEqual(result[0], 0.5)
+        self.assertTrue(math.isnan(result[1]))
+        self.assertTrue(math.isnan(result[2]))
+
+    def test_evaluate_batch_in_chunks(self):
+        columns = {"x": list(range(10))}
+        result = self.calculator.evaluate_batch("-x * 2", columns, chunk_rows=3)
+        self.assertEqual(list(result), [-2 * x for x in range(10)])
+
+    def test_evaluate_batch_without_numpy(self):
+        with mock.patch.object(pkg.calculator, "numpy", None):
+            result = self.calculator.evaluate_batch("a / b - 1", {"a": [4, 1], "b": [2, 0]})
+            constant = self.calculator.evaluate_batch("2 + 3", {"a": [4, 1]})
+        self.assertEqual(result.typecode, "d")
+        self.assertEqual(result[0], 1)
+        self.assertTrue(math.isnan(result[1]))
+        self.assertEqual(list(constant), [5, 5])
+
+    def test_evaluate_batch_mismatched_columns(self):
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate_batch("a + b", {"a": [1, 2], "b": [1]})
+        with self.assertRaises(ValueError):
+            self.calculator.evaluate_batch("a + b", {"a": [1, 2]})
+
+
+class TestStreaming(unittest.TestCase):
+    def test_render_compact(self):
+        self.assertEqual(render_compact("3 + 5", 8.0), "3 + 5 = 8")
+        self.assertEqual(
+            render_compact("$ 3", ValueError("invalid token: $")),
+            "$ 3 : Error: invalid token: $",
+        )
+
+    def test_render_table_row(self):
+        self.assertEqual(render_table_row("10 / 4", 2.5), "10 / 4\t2.5")
+
+    def test_stream_preserves_order(self):
+        lines = [f"{i} * 2\n" for i in range(100)] + ["1 / 0\n", "\n"]
+        output = "".join(stream_results(lines, workers=2, chunk_size=7))
+        expected = [f"{i} * 2 = {i * 2}" for i in range(100)]
+        expected.append("1 / 0 : Error: float division by zero")
+        self.assertEqual(output.splitlines(), expected)
+
+    def test_stream_table_format(self):
+        output = "".join(stream_results(["3 + 5"], workers=1, output_format="table"))
+        self.assertEqual(output, "expression\tresult\n3 + 5\t8\n")
+
+    def test_stream_options_in_any_position(self):
+        args, _parser = main.parse_args(["--workers", "4", "--stdin", "--format", "table"])
+        self.assertTrue(args.stdin)
+        self.assertEqual((args.workers, args.format, args.expression), (4, "table", []))
+
+    def test_expression_arguments(self):
+        args, _parser = main.parse_args(["-3", "+", "5"])
+        self.assertFalse(args.stdin or args.file)
+        self.assertEqual(args.expression, ["-3", "+", "5"])
+
 
 if __name__ == "__main__":
     unittest.main()
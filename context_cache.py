@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+import weakref
+
+from google.genai import errors, types
+
+from backends import _dump, as_backend
+from tracing import span
+
+# How long a cached prefix lives, in seconds; it is extended while in use.
+DEFAULT_TTL_SECONDS = 900
+
+# A cache this close to expiry is extended before the next request uses it.
+REFRESH_MARGIN_SECONDS = 120
+
+# Errors on a request that references a cache, after which the request is
+# resent with the full prefix: invalid for this model, forbidden, or gone.
+FALLBACK_ERROR_CODES = (400, 403, 404)
+
+DISPLAY_NAME = "ai-agent-static-prefix"
+
+_MISSING = object()
+
+
+def prefix_key(model, config):
+    """sha256 of the static part of a request: model, system instruction, tools and tool config."""
+    prefix = types.GenerateContentConfig(
+        system_instruction=config.system_instruction,
+        tools=config.tools,
+        tool_config=config.tool_config,
+    )
+    encoded = json.dumps([model, _dump(prefix)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ContextCachingBackend:
+    """
+    Sends the system instruction and tool declarations once per process as
+    cached content and references it from every request instead.
+
+    The cache is created on the first request for a given model and prefix,
+    extended when it is within REFRESH_MARGIN_SECONDS of expiring, and shared
+    by every session using this backend. When caching is unavailable (the
+    client has no cache API, the prefix is too small for the model, or a
+    request using the cache is rejected) requests go out with the full
+    prefix, as they would without this backend.
+    """
+
+    def __init__(self, client, inner=None, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.client = client
+        self.inner = as_backend(inner if inner is not None else client)
+        self.ttl_seconds = ttl_seconds
+        # prefix key -> {"name", "expires_at", "tokens"}, or None once caching
+        # failed for that prefix.
+        self._handles = {}
+        self._lock = threading.Lock()
+        # Sessions on one event loop wait for each other's create/refresh.
+        self._loop_locks = weakref.WeakKeyDictionary()
+
+    def _loop_lock(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._loop_locks.get(loop)
+            if lock is None:
+                lock = self._loop_locks[loop] = asyncio.Lock()
+            return lock
+
+    def _remember(self, key, cached):
+        expires_at = time.time() + self.ttl_seconds
+        if cached.expire_time is not None:
+            expires_at = cached.expire_time.timestamp()
+        tokens = cached.usage_metadata.total_token_count if cached.usage_metadata else None
+        handle = {"name": cached.name, "expires_at": expires_at, "tokens": tokens}
+        with self._lock:
+            self._handles[key] = handle
+        return handle
+
+    async def _create(self, key, model, config):
+        with span("context_cache.create", model=model) as create_span:
+            try:
+                cached = await self.client.aio.caches.create(
+                    model=model,
+                    config=types.CreateCachedContentConfig(
+                        system_instruction=config.system_instruction,
+                        tools=config.tools,
+                        tool_config=config.tool_config,
+                        ttl=f"{int(self.ttl_seconds)}s",
+                        display_name=DISPLAY_NAME,
+                    ),
+                )
+            except (AttributeError, errors.APIError) as e:
+                create_span.set(error=f"{type(e).__name__}: {e}")
+                with self._lock:
+                    self._handles[key] = None
+                return None
+            handle = self._remember(key, cached)
+            create_span.set(cached_tokens=handle["tokens"])
+            return handle
+
+    async def _refresh(self, key, handle):
+        # Returns None if the cache can't be extended; it is then recreated.
+        with span("context_cache.refresh", cache=handle["name"]) as refresh_span:
+            try:
+                cached = await self.client.aio.caches.update(
+                    name=handle["name"],
+                    config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl_seconds)}s"),
+                )
+            except errors.APIError as e:
+                refresh_span.set(error=f"{type(e).__name__}: {e}")
+                return None
+            return self._remember(key, cached.model_copy(update={"name": handle["name"]}))
+
+    async def cached_content_name(self, model, config):
+        """Name of the live cache for this request's prefix, or None if it can't be cached."""
+        if config is None or config.cached_content:
+            return None
+        if not (config.system_instruction or config.tools):
+            return None
+        key = prefix_key(model, config)
+        async with self._loop_lock():
+            with self._lock:
+                handle = self._handles.get(key, _MISSING)
+            if handle is None:
+                return None
+            if handle is not _MISSING:
+                remaining = handle["expires_at"] - time.time()
+                if remaining <= 0:
+                    handle = _MISSING
+                elif remaining < REFRESH_MARGIN_SECONDS:
+                    handle = await self._refresh(key, handle) or _MISSING
+            if handle is _MISSING:
+                handle = await self._create(key, model, config)
+            return handle["name"] if handle else None
+
+    def _forget(self, model, config, code):
+        key = prefix_key(model, config)
+        with self._lock:
+            if code == 404:
+                # Deleted or expired early; make a new one next time.
+                self._handles.pop(key, None)
+            else:
+                self._handles[key] = None
+
+    async def generate_stream(self, model, contents, config):
+        name = await self.cached_content_name(model, config)
+        if name is None:
+            async for chunk in self.inner.generate_stream(model, contents, config):
+                yield chunk
+            return
+
+        cached_config = config.model_copy(
+            update={
+                "system_instruction": None,
+                "tools": None,
+                "tool_config": None,
+                "cached_content": name,
+            }
+        )
+        started = False
+        try:
+            async for chunk in self.inner.generate_stream(model, contents, cached_config):
+                started = True
+                yield chunk
+        except errors.APIError as e:
+            if started or e.code not in FALLBACK_ERROR_CODES:
+                raise
+            with span("context_cache.fallback", cache=name, code=e.code):
+                self._forget(model, config, e.code)
+        else:
+            return
+
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            yield chunk
+
+    def close(self):
+        """Deletes the caches this backend created; they would otherwise live out their TTL."""
+        with self._lock:
+            handles = [handle for handle in self._handles.values() if handle]
+            self._handles.clear()
+        for handle in handles:
+            try:
+                self.client.caches.delete(name=handle["name"])
+            except Exception:
+                pass  # Best effort: the cache expires on its own.
@@ -1,15 +1,32 @@
+import asyncio
+import os
+
 from google.genai import types
 
-# Import all the tool functions that the agent can call
-from get_files_info import get_files_info
-from get_file_content import get_file_content
-from run_python import run_python_file
-from write_file import write_file
+# Import every tool module so its @tool decorator registers it.
+import get_files_info  # noqa: F401
+import get_file_content  # noqa: F401
+import read_files  # noqa: F401
+import run_python  # noqa: F401
+import run_tests  # noqa: F401
+import search_files  # noqa: F401
+import write_file  # noqa: F401
+import write_files  # noqa: F401
+from read_files import glob_base
+from registry import registry
+from tool_cache import tool_cache
+from tracing import span, tracer
 
 # Define the fixed working directory for all tool calls
 # CRITICAL FIX Set to '.' (the project root) to align with LLM's relative path understanding.
 AGENT_WORKING_DIRECTORY = "."
 
+# Upper bound on how many function calls from a single model turn run at once.
+MAX_PARALLEL_CALLS = 4
+
+# Tools that may change the working directory. Anything else is treated as read-only.
+MUTATING_FUNCTIONS = {"write_file", "write_files", "run_python_file", "run_tests"}
+
 
 def call_function(
     function_call_part: types.FunctionCall, verbose: bool = False
@@ -26,16 +43,25 @@ def call_function(
         A types.Content object containing the result of the function call,
         formatted as a tool response.
     """
+    with span("tool_call", tool=function_call_part.name) as current_span:
+        result = _dispatch(function_call_part, verbose, current_span)
+        if tracer.enabled:
+            response = result.parts[0].function_response.response
+            current_span.set(
+                result_chars=len(str(response.get("result", response.get("error")))),
+                error="error" in response,
+            )
+        return result
+
+
+def _dispatch(function_call_part, verbose, current_span):
+    """Runs one function call for call_function; see its docstring."""
     function_name = function_call_part.name
     function_args = dict(function_call_part.args)  # Convert to a mutable dict
 
-    # Dictionary mapping function names (strings) to the actual function objects
-    available_functions = {
-        "get_files_info": get_files_info,
-        "get_file_content": get_file_content,
-        "run_python_file": run_python_file,
-        "write_file": write_file,
-    }
+    # Dictionary mapping function names (strings) to the actual function objects.
+    # Built once by the registry when the tool modules are imported.
+    available_functions = registry.functions
 
     # Add the hardcoded working_directory to the arguments.
     # The LLM doesn't control this for security and consistency.
@@ -63,11 +89,28 @@ def call_function(
     # Get the actual function object
     func_to_call = available_functions[function_name]
 
+    # Serve read-only calls from the cache when the file or directory is unchanged.
+    function_result = tool_cache.lookup(function_name, function_args)
+    current_span.set(cache_hit=function_result is not None)
+    if function_result is not None:
+        if verbose:
+            print(f"Cache hit: {function_name}({function_args})")
+        return types.Content(
+            role="tool",
+            parts=[
+                types.Part.from_function_response(
+                    name=function_name,
+                    response={"result": function_result},
+                )
+            ],
+        )
+
     # Call the function and capture its result
     try:
         # The ** operator unpacks the dictionary into keyword arguments
         function_result = func_to_call(**function_args)
     except Exception as e:
+        tool_cache.invalidate_after(function_name, function_args)
         # Catch any unexpected errors during function execution and return them
         return types.Content(
             role="tool",
@@ -79,6 +122,9 @@ def call_function(
             ],
         )
 
+    tool_cache.store(function_name, function_args, function_result)
+    tool_cache.invalidate_after(function_name, function_args)
+
     # Return the result as a types.Content object from a function response.
     # The assignment specifies shoving the string result into a "result" field.
     return types.Content(
@@ -90,3 +136,126 @@ def call_function(
             )
         ],
     )
+
+
+def _claimed_paths(function_name, function_args):
+    """
+    Returns the absolute paths that a call reads or writes, or None if they
+    can't be worked out from its arguments (the call then conflicts with
+    everything). Relative paths are resolved against the call's working
+    directory. run_python_file and run_tests claim the whole working directory
+    because the code they run can touch any file in it.
+    """
+    working_directory = function_args.get("working_directory") or AGENT_WORKING_DIRECTORY
+    try:
+        if function_name in ("get_files_info", "search_files"):
+            targets = [function_args.get("directory") or "."]
+        elif function_name in ("get_file_content", "write_file"):
+            targets = [function_args.get("file_path") or "."]
+        elif function_name in ("run_python_file", "run_tests"):
+            targets = ["."]
+        elif function_name == "read_files":
+            # A glob claims the directory it starts from.
+            targets = [glob_base(path) for path in function_args.get("paths") or []]
+        elif function_name == "write_files":
+            targets = [item.get("file_path") or "." for item in function_args.get("files") or []]
+        else:
+            return []
+        return [os.path.abspath(os.path.join(working_directory, target)) for target in targets]
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _paths_overlap(path_a, path_b):
+    """True if one path is the same as, or nested inside, the other."""
+    try:
+        return os.path.commonpath([path_a, path_b]) in (path_a, path_b)
+    except ValueError:
+        # Paths commonpath can't compare (e.g. on different drives) may overlap.
+        return True
+
+
+def calls_conflict(call_a: types.FunctionCall, call_b: types.FunctionCall) -> bool:
+    """
+    Decides whether two function calls must run in the order the model gave them.
+
+    Read-only calls never conflict with each other. A call to one of the
+    MUTATING_FUNCTIONS conflicts with any other call touching an overlapping
+    path, or whose paths can't be determined.
+    """
+    if (
+        call_a.name not in MUTATING_FUNCTIONS
+        and call_b.name not in MUTATING_FUNCTIONS
+    ):
+        return False
+
+    paths_a = _claimed_paths(call_a.name, dict(call_a.args or {}))
+    paths_b = _claimed_paths(call_b.name, dict(call_b.args or {}))
+    if paths_a is None or paths_b is None:
+        return True
+    return any(_paths_overlap(a, b) for a in paths_a for b in paths_b)
+
+
+class AsyncCallBatch:
+    """
+    Collects the function calls of one model turn as they stream in and starts
+    each one as soon as it arrives.
+
+    Calls run through asyncio.to_thread so the event loop stays free to serve
+    other sessions. Independent calls run concurrently, but a call waits for
+    every earlier call it conflicts with (see calls_conflict), so writes and
+    script runs keep the order the model planned them in. At most
+    MAX_PARALLEL_CALLS calls from the batch run at the same time.
+    """
+
+    def __init__(self, verbose: bool = False):
+        self.verbose = verbose
+        self._calls = []
+        self._tasks = []
+        self._started = set()
+        self._slots = asyncio.Semaphore(MAX_PARALLEL_CALLS)
+
+    def __len__(self):
+        return len(self._calls)
+
+    def submit(self, function_call_part: types.FunctionCall):
+        """Schedules a function call. Must be called from within the event loop."""
+        earlier = [
+            task
+            for call, task in zip(self._calls, self._tasks)
+            if calls_conflict(call, function_call_part)
+        ]
+        task = asyncio.ensure_future(self._run(function_call_part, earlier))
+        self._calls.append(function_call_part)
+        self._tasks.append(task)
+
+    async def _run(self, function_call_part, earlier):
+        if earlier:
+            await asyncio.wait(earlier)
+        async with self._slots:
+            self._started.add(asyncio.current_task())
+            return await asyncio.to_thread(
+                call_function, function_call_part, verbose=self.verbose
+            )
+
+    async def gather(self) -> types.Content:
+        """
+        Waits for every submitted call and returns their responses as a single
+        tool Content, in submission order.
+        """
+        results = await asyncio.gather(*self._tasks)
+        parts = []
+        for result in results:
+            parts.extend(result.parts)
+        return types.Content(role="tool", parts=parts)
+
+    async def cancel(self):
+        """
+        Cancels the calls that haven't started and waits for the ones already
+        running in a thread, which can't be interrupted, so no call outlives a
+        turn that failed or was cancelled. Does nothing once gather() returned.
+        """
+        for task in self._tasks:
+            if task not in self._started:
+                task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
@@ -0,0 +1,203 @@
+import difflib
+import re
+
+# Diff lines shown in an edit's summary before the rest are elided.
+MAX_SUMMARY_DIFF_LINES = 40
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER_MARKER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+_HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+class EditConflictError(ValueError):
+    """Raised when an edit doesn't apply cleanly to the file's current content."""
+
+
+def detect_newline(text):
+    """The file's line ending: "\r\n" if its first line ends that way, else "\n"."""
+    first = text.find("\n")
+    return "\r\n" if first > 0 and text[first - 1] == "\r" else "\n"
+
+
+def parse_search_replace(edits):
+    """
+    Parses SEARCH/REPLACE blocks into a list of (search, replace) strings:
+
+        <<<<<<< SEARCH
+        exact lines currently in the file
+        =======
+        lines to put in their place
+        >>>>>>> REPLACE
+    """
+    blocks = []
+    lines = edits.split("\n")
+    position = 0
+    while position < len(lines):
+        if lines[position].strip() != SEARCH_MARKER:
+            if lines[position].strip():
+                raise EditConflictError(
+                    f"Unexpected text outside a SEARCH/REPLACE block: {lines[position]!r}"
+                )
+            position += 1
+            continue
+
+        search, replace, section = [], [], "search"
+        position += 1
+        while position < len(lines):
+            line = lines[position]
+            if section == "search" and line.strip() == DIVIDER_MARKER:
+                section = "replace"
+            elif section == "replace" and line.strip() == REPLACE_MARKER:
+                break
+            else:
+                (search if section == "search" else replace).append(line)
+            position += 1
+        else:
+            raise EditConflictError(f"SEARCH/REPLACE block {len(blocks) + 1} is not closed")
+
+        blocks.append(("\n".join(search), "\n".join(replace)))
+        position += 1
+
+    if not blocks:
+        raise EditConflictError("No SEARCH/REPLACE blocks found")
+    return blocks
+
+
+def apply_search_replace(text, blocks):
+    """
+    Applies (search, replace) blocks in order. Each search text must occur
+    exactly once in the file as it stands after the previous blocks; an empty
+    search is only allowed against an empty (or new) file.
+    """
+    newline = detect_newline(text)
+    for number, (search, replace) in enumerate(blocks, start=1):
+        search = search.replace("\n", newline)
+        replace = replace.replace("\n", newline)
+        if not search:
+            if text:
+                raise EditConflictError(
+                    f"Block {number} has an empty SEARCH section but the file is not empty"
+                )
+            text = replace
+            continue
+
+        occurrences = text.count(search)
+        if occurrences == 0:
+            first_line = search.split(newline, 1)[0]
+            raise EditConflictError(
+                f"Block {number}: SEARCH text not found in the file (first line: {first_line!r}). "
+                "Re-read the file and copy the lines exactly."
+            )
+        if occurrences > 1:
+            raise EditConflictError(
+                f"Block {number}: SEARCH text matches {occurrences} places; "
+                "include more surrounding lines so it is unique."
+            )
+        text = text.replace(search, replace, 1)
+    return text
+
+
+def _parse_hunks(diff):
+    """Returns [(old start line, old lines, new lines)] for each hunk of a unified diff."""
+    hunks = []
+    current = None
+    # Old and new lines still expected in the current hunk, per its header.
+    old_remaining = new_remaining = 0
+    for line in diff.splitlines():
+        header = _HUNK_HEADER.match(line)
+        if header:
+            current = (int(header.group(1)), [], [])
+            hunks.append(current)
+            old_remaining = int(header.group(2) or 1)
+            new_remaining = int(header.group(4) or 1)
+            continue
+        if current is None or line.startswith("\\"):
+            # Text before the first hunk, and "\ No newline" markers.
+            continue
+        if old_remaining <= 0 and new_remaining <= 0:
+            # The hunk is complete. Blank lines and file headers may follow it;
+            # inside a hunk, "--- x" would be a removed line.
+            if line == "" or line.startswith(("--- ", "+++ ", "diff ", "index ")):
+                continue
+            raise EditConflictError(
+                f"Line after a complete hunk (check the counts in its @@ header): {line!r}"
+            )
+        if line.startswith("-"):
+            current[1].append(line[1:])
+            old_remaining -= 1
+        elif line.startswith("+"):
+            current[2].append(line[1:])
+            new_remaining -= 1
+        elif line.startswith(" ") or (line == "" and old_remaining > 0 and new_remaining > 0):
+            # Some tools strip the space from blank context lines.
+            current[1].append(line[1:])
+            current[2].append(line[1:])
+            old_remaining -= 1
+            new_remaining -= 1
+        else:
+            raise EditConflictError(f"Unexpected line in diff hunk: {line!r}")
+    if not hunks:
+        raise EditConflictError("No hunks (lines starting with '@@') found in the diff")
+    return hunks
+
+
+def _find_hunk(lines, old_lines, expected_index):
+    """Index where old_lines occur in lines, preferring the one nearest expected_index."""
+    matches = [
+        index
+        for index in range(len(lines) - len(old_lines) + 1)
+        if lines[index : index + len(old_lines)] == old_lines
+    ]
+    if not matches:
+        return None
+    return min(matches, key=lambda index: abs(index - expected_index))
+
+
+def apply_unified_diff(text, diff):
+    """
+    Applies a unified diff. Each hunk's context and removed lines must match the
+    file exactly; a hunk may have moved from its stated line (the nearest
+    match wins), as after earlier edits to the file.
+    """
+    newline = detect_newline(text)
+    lines = text.split(newline)
+    shift = 0  # How far earlier hunks have moved later line numbers.
+    for number, (old_start, old_lines, new_lines) in enumerate(_parse_hunks(diff), start=1):
+        expected_index = max(old_start - 1, 0) + shift
+        if not old_lines:
+            index = min(old_start + shift, len(lines))
+        else:
+            index = _find_hunk(lines, old_lines, expected_index)
+        if index is None:
+            raise EditConflictError(
+                f"Hunk {number} (@@ -{old_start}) does not match the file: expected "
+                f"{old_lines[0]!r} near line {old_start}. Re-read the file and regenerate the diff."
+            )
+        lines[index : index + len(old_lines)] = new_lines
+        shift += len(new_lines) - len(old_lines)
+    return newline.join(lines)
+
+
+def summarize_diff(old_text, new_text, display_path):
+    """
+    Returns (lines added, lines removed, short unified diff) between two
+    versions of a file, with the diff cut to MAX_SUMMARY_DIFF_LINES lines.
+    """
+    diff_lines = list(
+        difflib.unified_diff(
+            old_text.splitlines(),
+            new_text.splitlines(),
+            fromfile=f"a/{display_path}",
+            tofile=f"b/{display_path}",
+            n=1,
+            lineterm="",
+        )
+    )[2:]  # Drop the ---/+++ file headers; the path is in the summary line.
+    added = sum(1 for line in diff_lines if line.startswith("+"))
+    removed = sum(1 for line in diff_lines if line.startswith("-"))
+    if len(diff_lines) > MAX_SUMMARY_DIFF_LINES:
+        hidden = len(diff_lines) - MAX_SUMMARY_DIFF_LINES
+        diff_lines = diff_lines[:MAX_SUMMARY_DIFF_LINES] + [f"[... {hidden} more diff lines]"]
+    return added, removed, "\n".join(diff_lines)
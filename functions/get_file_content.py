@@ -1,5 +1,22 @@
+import mmap
 import os
 
+from registry import tool
+from text_files import BINARY_SNIFF_BYTES, is_binary
+from tracing import span
+from workspace_index import current_index
+
+# Most characters returned by one call; ask for a later range to see more.
+MAX_CHARS = 10000
+
+# Files at least this large are mapped instead of read, so a window deep into
+# the file is sliced out of the mapping without reading the prefix.
+MMAP_THRESHOLD = 1024 * 1024
+
+# Newlines are counted in blocks of this many bytes when scanning a mapping;
+# only one block is copied out of it at a time.
+COUNT_BLOCK_BYTES = 64 * 1024
+
 
 # Helper function to resolve paths and check scope
 def _resolve_and_check_scope(working_directory, target_path_str):
@@ -22,43 +39,255 @@ def _resolve_and_check_scope(working_directory, target_path_str):
     return abs_resolved_path  # Return the valid absolute path.
 
 
-# Main function for this assignment: Gets the content of a specified file.
-def get_file_content(working_directory, file_path):
+def _count_newlines(data, start, end):
+    """Counts b"\n" in data[start:end]; works for bytes and mmap alike."""
+    count = 0
+    for block_start in range(start, end, COUNT_BLOCK_BYTES):
+        count += data[block_start : min(end, block_start + COUNT_BLOCK_BYTES)].count(b"\n")
+    return count
+
+
+def _total_lines(data, size):
+    """Lines in the file; a last line without a trailing newline still counts."""
+    if not size:
+        return 0
+    return _count_newlines(data, 0, size) + (data[size - 1 : size] != b"\n")
+
+
+def _line_offset(data, size, line_number):
+    """Byte offset where 1-based line_number starts, or None if past the end."""
+    # Skip whole blocks by counting their newlines, then find the line in the
+    # block that holds it directly in data.
+    remaining = line_number - 1
+    offset = 0
+    while remaining:
+        if offset >= size:
+            return None
+        block_end = min(size, offset + COUNT_BLOCK_BYTES)
+        newlines = _count_newlines(data, offset, block_end)
+        if newlines < remaining:
+            remaining -= newlines
+            offset = block_end
+            continue
+        for _ in range(remaining):
+            offset = data.find(b"\n", offset, block_end) + 1
+        remaining = 0
+    return offset if offset < size or line_number == 1 else None
+
+
+def _char_boundary(data, offset, size):
+    """Moves offset forward past UTF-8 continuation bytes to the next character start."""
+    while 0 < offset < size and data[offset] & 0xC0 == 0x80:
+        offset += 1
+    return offset
+
+
+class FileReadError(Exception):
+    """Raised by read_file_content; the message is the error get_file_content returns."""
+
+
+def read_file_content(
+    working_directory: str,
+    file_path: str,
+    start_line: int | None = None,
+    line_count: int | None = None,
+    byte_offset: int | None = None,
+    byte_count: int | None = None,
+) -> str:
+    """
+    Reads a file, or a window of it, for get_file_content.
+
+    Returns the text get_file_content shows (with a range header for partial
+    reads) and raises FileReadError, whose message starts with "Error:", when
+    the file can't be read as requested.
+    """
     # Step 1: Resolve the file_path relative to the working_directory and check scope.
     # The helper function handles initial path normalization and the 'outside working directory' check.
-    resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
+    with span("get_file_content.resolve_path"):
+        resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
 
     # **CRITICAL FIX HERE:**
     # Check if the helper function returned an ERROR string (one that starts with "Error:").
     if isinstance(resolved_path_or_error, str) and resolved_path_or_error.startswith(
         "Error:"
     ):
-        return resolved_path_or_error  # Propagate the error immediately.
+        raise FileReadError(resolved_path_or_error)
 
     # If it's not an error string, it must be the valid absolute path.
     resolved_file_full_path = resolved_path_or_error
 
     # Step 2: Verify that the resolved path actually points to a regular file.
-    if not os.path.isfile(resolved_file_full_path):
-        return f'Error: File not found or is not a regular file: "{file_path}"'
+    # The workspace index answers without a stat when it knows the path.
+    index = current_index(resolved_file_full_path)
+    index_entry = index.lookup(resolved_file_full_path) if index is not None else None
+    if index_entry is not None:
+        if index_entry.is_dir:
+            raise FileReadError(f'Error: File not found or is not a regular file: "{file_path}"')
+    elif not os.path.isfile(resolved_file_full_path):
+        raise FileReadError(f'Error: File not found or is not a regular file: "{file_path}"')
 
-    # Step 3: Read the file content, with truncation and error handling.
-    MAX_CHARS = 10000
-    file_content_string = ""
+    # Step 3: Validate the requested range.
+    by_line = start_line is not None or line_count is not None
+    by_byte = byte_offset is not None or byte_count is not None
+    if by_line and by_byte:
+        raise FileReadError("Error: Use either start_line/line_count or byte_offset/byte_count, not both")
+    for name, value, minimum in (
+        ("start_line", start_line, 1),
+        ("line_count", line_count, 1),
+        ("byte_offset", byte_offset, 0),
+        ("byte_count", byte_count, 1),
+    ):
+        if value is not None and value < minimum:
+            raise FileReadError(f"Error: {name} must be at least {minimum}, got {value}")
 
-    try:
-        with open(resolved_file_full_path, "r") as f:
-            file_content_string = f.read(MAX_CHARS)
+    # Step 4: Read the requested window, with truncation and error handling.
+    with span("get_file_content.read", by_line=by_line, by_byte=by_byte) as read_span:
+        try:
+            with open(resolved_file_full_path, "rb") as f:
+                stat_result = os.fstat(f.fileno())
+                size = stat_result.st_size
+                if is_binary(f.read(BINARY_SNIFF_BYTES)):
+                    raise FileReadError(
+                        f'Error: "{file_path}" appears to be a binary file ({size} bytes) '
+                        "and can't be shown as text"
+                    )
+                if size >= MMAP_THRESHOLD:
+                    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                else:
+                    f.seek(0)
+                    data = f.read()
+        except OSError as e:
+            raise FileReadError(f'Error: Could not read file "{file_path}": {e}')
+
+        try:
+            # Window [start, end) in bytes of the file on disk.
+            start, end = 0, size
+            if by_line:
+                start = _line_offset(data, size, start_line or 1)
+                if start is None:
+                    # Finding the line already scanned the whole file.
+                    total = _total_lines(data, size)
+                    raise FileReadError(f"Error: start_line {start_line} is past the end of the file ({total} lines)")
+                if line_count is not None:
+                    # The window ends after line_count newlines, or at EOF.
+                    end = start
+                    for _ in range(line_count):
+                        newline = data.find(b"\n", end)
+                        if newline < 0:
+                            end = size
+                            break
+                        end = newline + 1
+            elif by_byte:
+                if (byte_offset or 0) >= size and size:
+                    raise FileReadError(f"Error: byte_offset {byte_offset} is past the end of the file ({size} bytes)")
+                start = _char_boundary(data, byte_offset or 0, size)
+                if byte_count is not None:
+                    end = _char_boundary(data, min(size, (byte_offset or 0) + byte_count), size)
+
+            # UTF-8 needs at most 4 bytes per character, so this is enough to fill
+            # MAX_CHARS. surrogateescape keeps invalid bytes countable, so byte
+            # offsets below always match the file on disk.
+            window = bytes(data[start : min(end, start + MAX_CHARS * 4)])
+            text = window.decode("utf-8", errors="surrogateescape")
+            if len(text) > MAX_CHARS or start + len(window) < end:
+                text = text[:MAX_CHARS]
+                if not by_byte and not text.endswith("\n") and "\n" in text:
+                    # Prefer stopping at the end of a whole line.
+                    text = text[: text.rindex("\n") + 1]
+            shown_end = start + len(text.encode("utf-8", errors="surrogateescape"))
+            truncated = shown_end < end
+
+            file_content_string = text.encode("utf-8", errors="surrogateescape").decode(
+                "utf-8", errors="replace"
+            )
 
-        actual_file_size = os.path.getsize(resolved_file_full_path)
+            # Whole file in one piece: return it as-is, without a header.
+            if start == 0 and shown_end == size:
+                read_span.set(chars=len(file_content_string), bytes=size)
+                return file_content_string
 
-        if actual_file_size > MAX_CHARS:
+            # A ranged read of a mapped file only touches the pages around the
+            # window, so the header leaves out what would take a scan of the
+            # whole file: the total line count (unless the index has it) and,
+            # for byte ranges, line numbers.
+            mapped = isinstance(data, mmap.mmap)
+            if (
+                index_entry is not None
+                and index_entry.line_count is not None
+                and index_entry.size == size
+                and index_entry.mtime_ns == stat_result.st_mtime_ns
+            ):
+                total_lines = index_entry.line_count
+            elif not mapped:
+                total_lines = _total_lines(data, size)
+            else:
+                total_lines = None
+
+            if by_line:
+                first_line = start_line or 1
+            elif not (by_byte and mapped):
+                first_line = _count_newlines(data, 0, start) + 1
+            else:
+                first_line = None
+            if first_line is not None:
+                last_line = first_line + _count_newlines(data, start, max(start, shown_end - 1))
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+        location = [f"bytes {start}-{shown_end} of {size}"]
+        if first_line is not None:
+            lines = f"lines {first_line}-{last_line}"
+            if total_lines is not None:
+                lines += f" of {total_lines}"
+            location.insert(0, lines)
+        header = f'[File "{file_path}": {", ".join(location)}]\n'
+        file_content_string = header + file_content_string
+        if truncated:
+            next_hint = (
+                f"start_line={last_line + 1}"
+                if first_line is not None and not by_byte and text.endswith("\n")
+                else f"byte_offset={shown_end}"
+            )
             file_content_string += (
-                f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters]'
+                f'\n[...File "{file_path}" truncated at {MAX_CHARS} characters; '
+                f"call again with {next_hint} to continue]"
             )
 
-    except OSError as e:
-        return f'Error: Could not read file "{file_path}": {e}'
+        read_span.set(chars=len(file_content_string), bytes=shown_end - start)
 
-    # Step 4: Return the file's content (potentially truncated).
+    # Step 5: Return the file's content (potentially a partial window).
     return file_content_string
+
+
+# Main function for this assignment: Gets the content of a specified file.
+@tool(
+    description=(
+        "Reads the content of a specified file, constrained to the working directory. "
+        f"Returns at most {MAX_CHARS} characters per call. When only part of the file is "
+        "returned, a header gives the range shown and the file's size (and total lines, when known); "
+        "request later parts with start_line/line_count or byte_offset/byte_count. "
+        "Text is decoded as UTF-8 (invalid bytes shown as U+FFFD); binary files are refused."
+    ),
+    parameters={
+        "file_path": "The path to the file to read, relative to the working directory.",
+        "start_line": "1-based line to start reading at. Cannot be combined with byte_offset/byte_count.",
+        "line_count": "Number of lines to return, starting at start_line (or line 1).",
+        "byte_offset": "0-based byte offset to start reading at; moved forward to the next character boundary if needed.",
+        "byte_count": "Number of bytes to return, starting at byte_offset (or byte 0).",
+    },
+)
+def get_file_content(
+    working_directory: str,
+    file_path: str,
+    start_line: int | None = None,
+    line_count: int | None = None,
+    byte_offset: int | None = None,
+    byte_count: int | None = None,
+) -> str:
+    try:
+        return read_file_content(
+            working_directory, file_path, start_line, line_count, byte_offset, byte_count
+        )
+    except FileReadError as e:
+        return str(e)
@@ -1,21 +1,244 @@
+import base64
+import fnmatch
+import hashlib
+import json
 import os
 
+from registry import tool
+from tracing import span
+from workspace_index import current_index
 
-def get_files_info(working_directory, directory=None):
+# Default cap on the number of entries returned by one call.
+DEFAULT_MAX_ENTRIES = 500
+
+# Directories that are never worth showing the model: VCS metadata, virtualenvs,
+# dependency folders and caches. Skipped even without a .gitignore.
+ALWAYS_PRUNED = {
+    ".git",
+    ".hg",
+    ".svn",
+    "node_modules",
+    "__pycache__",
+    ".venv",
+    "venv",
+    ".tox",
+    ".nox",
+    ".mypy_cache",
+    ".pytest_cache",
+    ".ruff_cache",
+}
+
+
+def _parse_gitignore(gitignore_path):
+    """
+    Reads a .gitignore file into a list of (pattern, negated, dir_only, anchored)
+    rules. Supports the common subset of the format: comments, blank lines,
+    "!" negation, trailing "/" for directories and leading "/" anchoring.
+    """
+    rules = []
+    try:
+        with open(gitignore_path, "r", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        # A slash anywhere but the end anchors the pattern to the .gitignore's directory.
+        anchored = "/" in line
+        line = line.lstrip("/")
+        if line.startswith("**/"):
+            line, anchored = line[3:], False
+        if line:
+            rules.append((line, negated, dir_only, anchored))
+    return rules
+
+
+class GitignoreMatcher:
+    """
+    Decides whether paths under the working directory are ignored, using every
+    .gitignore from the working directory down to the path being checked.
+    Parsed files are cached per directory for the lifetime of the matcher.
+    """
+
+    def __init__(self, abs_working_dir):
+        self.abs_working_dir = abs_working_dir
+        self._rules_by_dir = {}
+
+    def _rules_for(self, abs_dir):
+        if abs_dir not in self._rules_by_dir:
+            self._rules_by_dir[abs_dir] = _parse_gitignore(
+                os.path.join(abs_dir, ".gitignore")
+            )
+        return self._rules_by_dir[abs_dir]
+
+    def is_ignored(self, abs_path, is_dir):
+        name = os.path.basename(abs_path)
+        if is_dir and name in ALWAYS_PRUNED:
+            return True
+
+        ignored = False
+        # Walk from the working directory down to the entry's parent directory;
+        # later (deeper) rules override earlier ones, as in git.
+        rel_parent = os.path.relpath(os.path.dirname(abs_path), self.abs_working_dir)
+        ancestors = [self.abs_working_dir]
+        if rel_parent != ".":
+            for component in rel_parent.split(os.sep):
+                ancestors.append(os.path.join(ancestors[-1], component))
+
+        for abs_dir in ancestors:
+            rel_path = os.path.relpath(abs_path, abs_dir).replace(os.sep, "/")
+            for pattern, negated, dir_only, anchored in self._rules_for(abs_dir):
+                if dir_only and not is_dir:
+                    continue
+                candidate = rel_path if anchored else name
+                if fnmatch.fnmatchcase(candidate, pattern):
+                    ignored = not negated
+        return ignored
+
+
+def _matches_any(rel_path, patterns):
+    name = rel_path.rsplit("/", 1)[-1]
+    return any(
+        fnmatch.fnmatchcase(rel_path, pattern) or fnmatch.fnmatchcase(name, pattern)
+        for pattern in patterns
+    )
+
+
+def _query_fingerprint(*args):
+    """Short hash tying a continuation token to the arguments it was issued for."""
+    return hashlib.sha1(json.dumps(args, default=str).encode()).hexdigest()[:12]
+
+
+def _encode_token(offset, fingerprint):
+    payload = json.dumps({"offset": offset, "query": fingerprint}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def _decode_token(token, fingerprint):
+    """Returns the offset stored in a continuation token, or None if it is invalid."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(payload, dict) or payload.get("query") != fingerprint:
+        return None
+    offset = payload.get("offset")
+    return offset if isinstance(offset, int) and offset >= 0 else None
+
+
+def _scan_dir(abs_dir, index):
+    """
+    Returns [(name, absolute path, is_dir, size)] for a directory, sorted by
+    name. Served from the workspace index when it covers the directory (size
+    and type already known); otherwise from os.scandir, with size None so it
+    is only stat'ed if the entry is actually listed.
+    """
+    listing = index.list_dir(abs_dir) if index is not None else None
+    if listing is not None:
+        return [(name, path, entry.is_dir, entry.size) for name, path, entry in listing]
+    with os.scandir(abs_dir) as iterator:
+        entries = sorted(iterator, key=lambda entry: entry.name)
+    return [(entry.name, entry.path, entry, None) for entry in entries]
+
+
+def _walk(abs_target_dir, max_depth, include, exclude, gitignore, index=None):
+    """
+    Yields (relative path, size, is_dir, error) for every entry under
+    abs_target_dir in a stable order: each directory's entries sorted by name,
+    followed by its subdirectories' contents in the same order.
+
+    Directories covered by the workspace index are listed from it without
+    touching the disk. Others use os.scandir so the type and stat information
+    comes from the DirEntry (one stat per entry at most, none for the type on
+    most platforms). Entries that can't be read are reported with an error
+    instead of aborting the walk.
+    """
+    # Stack of (absolute directory, relative prefix, depth).
+    stack = [(abs_target_dir, "", 0)]
+    while stack:
+        abs_dir, rel_prefix, depth = stack.pop()
+        try:
+            entries = _scan_dir(abs_dir, index)
+        except OSError as e:
+            yield rel_prefix.rstrip("/") or ".", 0, True, str(e)
+            continue
+
+        subdirectories = []
+        for name, abs_path, is_directory, item_size in entries:
+            rel_path = rel_prefix + name
+            try:
+                if item_size is None:
+                    # A DirEntry from os.scandir; the index has already
+                    # applied the .gitignore rules to its own entries.
+                    dir_entry = is_directory
+                    is_directory = dir_entry.is_dir()
+                    if gitignore.is_ignored(abs_path, is_directory):
+                        continue
+                if exclude and _matches_any(rel_path, exclude):
+                    continue
+                if item_size is None:
+                    item_size = dir_entry.stat().st_size
+            except OSError as e:
+                yield rel_path, 0, False, str(e)
+                continue
+
+            # Include patterns filter files only, so matching files in
+            # subdirectories can still be reached.
+            if not include or is_directory or _matches_any(rel_path, include):
+                yield rel_path, item_size, is_directory, None
+
+            if is_directory and (max_depth is None or depth + 1 < max_depth):
+                subdirectories.append((abs_path, rel_path + "/", depth + 1))
+
+        # Push in reverse so the walk visits subdirectories in name order.
+        stack.extend(reversed(subdirectories))
+
+
+@tool(
+    description="Lists files in the specified directory along with their sizes, constrained to the working directory. Can walk subdirectories recursively; .gitignore'd paths, .git, virtualenvs and node_modules are skipped. Long listings are paginated.",
+    parameters={
+        "directory": "The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
+        "recursive": "If true, also lists the contents of subdirectories. Defaults to false.",
+        "max_depth": "When recursive, how many directory levels to descend (1 lists only the directory itself). Defaults to unlimited.",
+        "include": "Optional glob patterns (e.g. '*.py'); only files matching one of them are listed. Directories are always listed.",
+        "exclude": "Optional glob patterns; matching files and directories are skipped entirely.",
+        "max_entries": f"Maximum number of entries to return in this call. Defaults to {DEFAULT_MAX_ENTRIES}.",
+        "continuation_token": "Token from a previous truncated listing, to fetch the next page of the same listing.",
+    },
+)
+def get_files_info(
+    working_directory: str,
+    directory: str | None = None,
+    recursive: bool = False,
+    max_depth: int | None = None,
+    include: list[str] | None = None,
+    exclude: list[str] | None = None,
+    max_entries: int = DEFAULT_MAX_ENTRIES,
+    continuation_token: str | None = None,
+) -> str:
     # Set base variables
     # Ensure working_directory is absolute from the start, as this defines the permission root.
-    abs_working_dir = os.path.abspath(working_directory)
-    abs_target_dir = None
-
-    # Determine the absolute path of the target directory to list.
-    # If 'directory' is None, it implies listing the 'working_directory' itself.
-    if directory is None:
-        abs_target_dir = abs_working_dir
-    else:
-        combined_path = os.path.join(abs_working_dir, directory)
-        abs_target_dir = os.path.abspath(
-            combined_path
-        )  # Then normalize to absolute path
+    with span("get_files_info.resolve_path"):
+        abs_working_dir = os.path.abspath(working_directory)
+        abs_target_dir = None
+
+        # Determine the absolute path of the target directory to list.
+        # If 'directory' is None, it implies listing the 'working_directory' itself.
+        if directory is None:
+            abs_target_dir = abs_working_dir
+        else:
+            combined_path = os.path.join(abs_working_dir, directory)
+            abs_target_dir = os.path.abspath(
+                combined_path
+            )  # Then normalize to absolute path
 
     # Check if target directory is outside the permitted working directory.
     # This uses os.path.commonpath to ensure that abs_target_dir is a subpath of abs_working_dir.
@@ -29,45 +252,60 @@ def get_files_info(working_directory, directory=None):
 
     # If all initial checks pass, the abs_target_dir is valid and permitted.
 
-    # Initialize contents list in case os.listdir fails.
-    contents = []
+    # A plain listing is one level deep; a recursive one defaults to unlimited depth.
+    if not recursive:
+        max_depth = 1
+    elif max_depth is not None and max_depth < 1:
+        return f"Error: max_depth must be at least 1, got {max_depth}"
+    max_entries = max(1, max_entries or DEFAULT_MAX_ENTRIES)
 
-    # Try to list the contents of the target directory.
-    # This handles potential PermissionError, FileNotFoundError, etc., for the directory itself.
-    try:
-        contents = os.listdir(abs_target_dir)
-    except OSError as e:
-        return f'Error: Could not list directory "{directory}": {e}'
+    # Continuation tokens only apply to the exact listing they were issued for.
+    fingerprint = _query_fingerprint(abs_target_dir, max_depth, include, exclude)
+    offset = 0
+    if continuation_token:
+        offset = _decode_token(continuation_token, fingerprint)
+        if offset is None:
+            return "Error: Invalid continuation_token for this listing. Start again without one."
 
-    # List to hold formatted strings for each item found.
-    output_lines = []
+    with span("get_files_info.list", recursive=recursive) as list_span:
+        gitignore = GitignoreMatcher(abs_working_dir)
 
-    # Loop through each item (file or subdirectory name) in the contents list.
-    for item_name in contents:
-        # Try to get information for each individual item.
-        # This handles errors if an item is deleted or permissions change mid-listing.
-        try:
-            # Construct the full absolute path to the current item.
-            item_full_path = os.path.join(abs_target_dir, item_name)
+        # List to hold formatted strings for each item found.
+        output_lines = []
+        listed = 0
+        has_more = False
 
-            # Get the size of the item in bytes.
-            item_size = os.path.getsize(item_full_path)
+        index = current_index(abs_target_dir)
+        list_span.set(indexed=index is not None)
 
-            # Check if the item is a directory.
-            is_directory = os.path.isdir(item_full_path)
+        for rel_path, item_size, is_directory, error in _walk(
+            abs_target_dir, max_depth, include, exclude, gitignore, index
+        ):
+            listed += 1
+            if listed <= offset:
+                continue
+            if len(output_lines) >= max_entries:
+                has_more = True
+                break
 
-            # Format the item's information into the required string format.
-            output_line = (
-                f"- {item_name}: file_size={item_size} bytes, is_dir={is_directory}"
-            )
-            output_lines.append(output_line)
-        except OSError as e:
-            # If an error occurs for an individual item, return an error string
-            # indicating which item caused the problem.
-            return f'Error: Could not access item "{item_name}" in directory "{directory}": {e}'
+            if error is not None:
+                # Report the unreadable item and keep going with the rest.
+                output_lines.append(f"- {rel_path}: Error: {error}")
+            else:
+                output_lines.append(
+                    f"- {rel_path}: file_size={item_size} bytes, is_dir={is_directory}"
+                )
+
+        list_span.set(entries=len(output_lines), truncated=has_more)
+
+    if has_more:
+        next_token = _encode_token(offset + len(output_lines), fingerprint)
+        output_lines.append(
+            f"[Listing truncated after {len(output_lines)} entries. "
+            f'Call again with continuation_token="{next_token}" for the next page.]'
+        )
 
     # Join all the formatted item strings with newlines to form the final output string.
     final_output_string = "\n".join(output_lines)
 
     return final_output_string
-
@@ -0,0 +1,174 @@
+import glob
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from get_file_content import MAX_CHARS, FileReadError, read_file_content
+from get_files_info import GitignoreMatcher
+from registry import tool
+from tracing import span
+
+# Most files one call can return, after glob expansion.
+MAX_BATCH_FILES = 50
+
+# Default cap on the characters returned across all files of one call.
+DEFAULT_MAX_TOTAL_CHARS = 40000
+
+# Threads reading files concurrently.
+READ_WORKERS = 8
+
+GLOB_CHARACTERS = "*?["
+
+
+def glob_base(pattern):
+    """The part of a glob before its first wildcard: 'calculator' for 'calculator/**/*.py'."""
+    if not any(character in pattern for character in GLOB_CHARACTERS):
+        return pattern
+    static = []
+    for component in pattern.replace(os.sep, "/").split("/"):
+        if any(character in component for character in GLOB_CHARACTERS):
+            break
+        static.append(component)
+    return "/".join(static) or "."
+
+
+def _is_ignored(abs_path, abs_working_dir, gitignore):
+    """True if the file or any directory between it and the working directory is ignored."""
+    rel_parts = os.path.relpath(abs_path, abs_working_dir).split(os.sep)
+    current = abs_working_dir
+    for position, part in enumerate(rel_parts):
+        current = os.path.join(current, part)
+        if gitignore.is_ignored(current, position < len(rel_parts) - 1):
+            return True
+    return False
+
+
+def expand_paths(abs_working_dir, paths):
+    """
+    Expands globs (matched relative to the working directory, '**' included)
+    into sorted file paths and drops duplicates, keeping the given order.
+    Returns a list of (path, error) where error is None for paths to read.
+    """
+    gitignore = GitignoreMatcher(abs_working_dir)
+    expanded = []
+    seen = set()
+    for path in paths:
+        if not any(character in path for character in GLOB_CHARACTERS):
+            candidates = [(path, None)]
+        else:
+            abs_pattern = os.path.join(abs_working_dir, path)
+            if os.path.commonpath(
+                [abs_working_dir, os.path.abspath(os.path.join(abs_working_dir, glob_base(path)))]
+            ) != abs_working_dir:
+                candidates = [
+                    (path, f'Error: Cannot read "{path}" as it is outside the permitted working directory')
+                ]
+            else:
+                matches = sorted(
+                    os.path.relpath(match, abs_working_dir)
+                    for match in glob.glob(abs_pattern, recursive=True)
+                    if os.path.isfile(match)
+                    and not _is_ignored(os.path.abspath(match), abs_working_dir, gitignore)
+                )
+                candidates = [(match, None) for match in matches] or [
+                    (path, f'Error: No files match "{path}"')
+                ]
+
+        for candidate, error in candidates:
+            key = os.path.normpath(candidate)
+            if key not in seen:
+                seen.add(key)
+                expanded.append((candidate, error))
+    return expanded
+
+
+def _estimated_chars(abs_working_dir, path):
+    """Upper bound on the characters get_file_content returns (UTF-8 never has fewer bytes)."""
+    try:
+        return min(os.path.getsize(os.path.join(abs_working_dir, path)), MAX_CHARS)
+    except OSError:
+        return 0
+
+
+def _read_one(working_directory, path):
+    """(content, None) for a file read as get_file_content would, or (None, error)."""
+    try:
+        return read_file_content(working_directory, path), None
+    except FileReadError as e:
+        return None, str(e)
+
+
+@tool(
+    description=(
+        "Reads several files in one call, constrained to the working directory. Takes a list of "
+        "paths and/or glob patterns (e.g. 'calculator/**/*.py') and returns one result per file, "
+        "with its content or an error. Each file is limited as in get_file_content, and the whole "
+        "batch to max_total_chars characters; files beyond the budget are listed as skipped."
+    ),
+    parameters={
+        "paths": "File paths or glob patterns, relative to the working directory.",
+        "max_total_chars": f"Maximum characters of content to return across all files. Defaults to {DEFAULT_MAX_TOTAL_CHARS}.",
+    },
+)
+def read_files(
+    working_directory: str,
+    paths: list[str],
+    max_total_chars: int = DEFAULT_MAX_TOTAL_CHARS,
+) -> list[dict]:
+    abs_working_dir = os.path.abspath(working_directory)
+    if not paths:
+        return [{"error": "Error: paths must list at least one file or glob"}]
+    max_total_chars = max(1, max_total_chars or DEFAULT_MAX_TOTAL_CHARS)
+
+    with span("read_files.expand", paths=len(paths)) as expand_span:
+        expanded = expand_paths(abs_working_dir, paths)
+        expand_span.set(files=len(expanded))
+
+    # Plan the batch from file sizes first, so files that can't fit the budget
+    # are never read.
+    results = []
+    to_read = []
+    planned_chars = 0
+    for position, (path, error) in enumerate(expanded):
+        if error is not None:
+            results.append({"path": path, "error": error})
+        elif position >= MAX_BATCH_FILES:
+            results.append(
+                {"path": path, "skipped": f"More than {MAX_BATCH_FILES} files; read it separately"}
+            )
+        elif planned_chars >= max_total_chars:
+            results.append(
+                {"path": path, "skipped": "Total size budget used up; read it separately"}
+            )
+        else:
+            planned_chars += _estimated_chars(abs_working_dir, path)
+            results.append({"path": path})
+            to_read.append(results[-1])
+
+    with span("read_files.read", files=len(to_read)) as read_span:
+        with ThreadPoolExecutor(max_workers=READ_WORKERS) as executor:
+            contents = list(
+                executor.map(
+                    lambda result: _read_one(working_directory, result["path"]),
+                    to_read,
+                )
+            )
+
+        total_chars = 0
+        for result, (content, error) in zip(to_read, contents):
+            if error is not None:
+                result["error"] = error
+                continue
+            remaining = max_total_chars - total_chars
+            if remaining <= 0:
+                result["skipped"] = "Total size budget used up; read it separately"
+                continue
+            if len(content) > remaining:
+                content = content[:remaining] + (
+                    f'\n[...Batch budget reached; read the rest of "{result["path"]}" '
+                    "with get_file_content]"
+                )
+            result["content"] = content
+            total_chars += len(content)
+        read_span.set(chars=total_chars)
+
+    return results
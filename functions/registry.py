@@ -0,0 +1,137 @@
+import inspect
+import types as python_types
+import typing
+
+from google.genai import types
+
+# Arguments filled in by call_function rather than by the model. They are left
+# out of the generated schemas.
+INJECTED_ARGUMENTS = {"working_directory"}
+
+# Python annotations and the Gemini schema types they map to.
+_SCALAR_SCHEMA_TYPES = {
+    str: types.Type.STRING,
+    int: types.Type.INTEGER,
+    float: types.Type.NUMBER,
+    bool: types.Type.BOOLEAN,
+}
+
+
+def _strip_optional(annotation):
+    """Turns Optional[X] / X | None into X."""
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union or origin is python_types.UnionType:
+        members = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(members) == 1:
+            return members[0]
+    return annotation
+
+
+def _schema_for(annotation, description=None):
+    """Builds a types.Schema for a parameter annotation."""
+    annotation = _strip_optional(annotation)
+
+    if annotation in _SCALAR_SCHEMA_TYPES:
+        return types.Schema(
+            type=_SCALAR_SCHEMA_TYPES[annotation], description=description
+        )
+
+    if typing.get_origin(annotation) is list:
+        (item_annotation,) = typing.get_args(annotation) or (str,)
+        return types.Schema(
+            type=types.Type.ARRAY,
+            description=description,
+            items=_schema_for(item_annotation),
+        )
+
+    if typing.is_typeddict(annotation):
+        # Objects with a fixed set of keys; NotRequired keys are optional.
+        return types.Schema(
+            type=types.Type.OBJECT,
+            description=description,
+            properties={
+                key: _schema_for(value)
+                for key, value in typing.get_type_hints(annotation).items()
+            },
+            required=sorted(annotation.__required_keys__) or None,
+        )
+
+    raise TypeError(f"Unsupported tool parameter annotation: {annotation!r}")
+
+
+class ToolRegistry:
+    """
+    Keeps the tools the agent can call.
+
+    Each tool is registered once with the @tool decorator. Its
+    FunctionDeclaration is generated from the function signature and type
+    hints at registration time, so the schema the model sees always matches
+    what the function accepts, and the dispatch table and types.Tool are built
+    once per process instead of once per call.
+    """
+
+    def __init__(self):
+        self.functions = {}
+        self.declarations = {}
+        self._tool = None
+
+    def register(self, description, parameters=None):
+        """
+        Decorator that registers a function as a tool.
+
+        Args:
+            description: What the tool does, as shown to the model.
+            parameters: Optional mapping of parameter name to its description.
+
+        Returns:
+            The decorator, which returns the function unchanged.
+        """
+        parameter_descriptions = parameters or {}
+
+        def decorator(func):
+            self.declarations[func.__name__] = self._declare(
+                func, description, parameter_descriptions
+            )
+            self.functions[func.__name__] = func
+            self._tool = None  # Rebuilt on next use to include the new tool.
+            return func
+
+        return decorator
+
+    def _declare(self, func, description, parameter_descriptions):
+        signature = inspect.signature(func)
+        hints = typing.get_type_hints(func)
+
+        properties = {}
+        required = []
+        for name, parameter in signature.parameters.items():
+            if name in INJECTED_ARGUMENTS:
+                continue
+            properties[name] = _schema_for(
+                hints.get(name, str), parameter_descriptions.get(name)
+            )
+            if parameter.default is inspect.Parameter.empty:
+                required.append(name)
+
+        return types.FunctionDeclaration(
+            name=func.__name__,
+            description=description,
+            parameters=types.Schema(
+                type=types.Type.OBJECT,
+                properties=properties,
+                required=required or None,
+            ),
+        )
+
+    def tool(self) -> types.Tool:
+        """Returns a types.Tool holding every registered declaration."""
+        if self._tool is None:
+            self._tool = types.Tool(
+                function_declarations=list(self.declarations.values())
+            )
+        return self._tool
+
+
+# Process-wide registry that every tool module registers itself with.
+registry = ToolRegistry()
+tool = registry.register
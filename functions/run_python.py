@@ -1,6 +1,221 @@
+import json
 import os
+import resource
+import selectors
+import signal
 import subprocess
 import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from registry import tool
+from tracing import span
+from warm_pool import WarmPool
+
+# Seconds a script may run before it is killed, unless the call asks for
+# another timeout (up to MAX_TIMEOUT_SECONDS).
+DEFAULT_TIMEOUT_SECONDS = 30
+MAX_TIMEOUT_SECONDS = 600
+
+# Bytes of each output stream kept for the model: the first and last half of
+# this much. Anything in between is counted and dropped as it arrives, so
+# memory stays bounded however much a script prints.
+DEFAULT_OUTPUT_CAP_BYTES = 32 * 1024
+
+# Prefix for script output echoed live to the console.
+LIVE_OUTPUT_PREFIX = "    | "
+
+# Scripts allowed to run at once across every session and parallel tool call;
+# the rest wait their turn.
+DEFAULT_MAX_CONCURRENT_SCRIPTS = max(2, os.cpu_count() or 1)
+
+# Per-script resource caps applied in the child with setrlimit, by
+# resource.RLIMIT_* name. Values above the agent's own hard limits are lowered
+# to them.
+DEFAULT_LIMITS = {
+    "RLIMIT_CPU": 60,  # CPU seconds.
+    "RLIMIT_AS": 4 * 1024**3,  # Address space, bytes.
+    "RLIMIT_NOFILE": 256,  # Open file descriptors.
+    "RLIMIT_FSIZE": 256 * 1024**2,  # Largest file the script can write, bytes.
+}
+
+# Fork server used instead of a fresh interpreter once enable_warm_pool() has run.
+_warm_pool = None
+
+# Set with configure_output().
+_output_cap_bytes = DEFAULT_OUTPUT_CAP_BYTES
+_live_output = False
+_echo_lock = threading.Lock()
+
+# Set with configure_limits().
+_limits = dict(DEFAULT_LIMITS)
+
+
+def enable_warm_pool():
+    """Starts the warm interpreter pool; run_python_file uses it from now on."""
+    global _warm_pool
+    if _warm_pool is None or not _warm_pool.running:
+        _warm_pool = WarmPool().start()
+    return _warm_pool
+
+
+def configure_output(output_cap_bytes=None, live_output=None):
+    """Sets the per-stream output cap and whether output is echoed to the console as it arrives."""
+    global _output_cap_bytes, _live_output
+    if output_cap_bytes is not None:
+        _output_cap_bytes = max(2, output_cap_bytes)
+    if live_output is not None:
+        _live_output = live_output
+
+
+def configure_limits(max_concurrent=None, **limits):
+    """
+    Sets how many scripts may run at once and overrides per-script resource
+    caps, e.g. configure_limits(4, RLIMIT_CPU=10). A cap of None removes it.
+    """
+    if max_concurrent is not None:
+        scheduler.resize(max_concurrent)
+    for name, value in limits.items():
+        if not hasattr(resource, name):
+            raise ValueError(f"Unknown resource limit: {name}")
+        if value is None:
+            _limits.pop(name, None)
+        else:
+            _limits[name] = value
+
+
+def _effective_limits():
+    """
+    The configured caps as (soft, hard) pairs, each lowered to the current hard
+    limit so setrlimit can't fail. The CPU hard limit sits a second above the
+    soft one, so a runaway script first gets SIGXCPU, which says why it died.
+    """
+    effective = {}
+    for name, value in _limits.items():
+        _soft, hard = resource.getrlimit(getattr(resource, name))
+        wanted = value + 1 if name == "RLIMIT_CPU" else value
+        if hard != resource.RLIM_INFINITY:
+            value, wanted = min(value, hard), min(wanted, hard)
+        effective[name] = (value, wanted)
+    return effective
+
+
+class ScriptScheduler:
+    """Lets at most max_concurrent scripts run at once; other callers queue in arrival order."""
+
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max(1, max_concurrent)
+        self.running = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._now_serving = 0
+
+    def resize(self, max_concurrent):
+        with self._condition:
+            self.max_concurrent = max(1, max_concurrent)
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Blocks until a slot is free; yields the seconds spent waiting for it."""
+        with self.slots(1) as (queue_wait, _held):
+            yield queue_wait
+
+    @contextmanager
+    def slots(self, wanted):
+        """
+        Like slot(), then also takes up to wanted - 1 more slots if they are
+        free and nobody is queued, without waiting for them; yields
+        (seconds spent waiting, slots held).
+        """
+        queued_at = time.monotonic()
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self.waiting += 1
+            while ticket != self._now_serving or self.running >= self.max_concurrent:
+                self._condition.wait()
+            self._now_serving += 1
+            self.waiting -= 1
+            held = 1
+            if not self.waiting:
+                held += max(0, min(wanted - 1, self.max_concurrent - self.running - 1))
+            self.running += held
+            self._condition.notify_all()
+        try:
+            yield time.monotonic() - queued_at, held
+        finally:
+            with self._condition:
+                self.running -= held
+                self._condition.notify_all()
+
+
+# Process-wide scheduler shared by every session.
+scheduler = ScriptScheduler(DEFAULT_MAX_CONCURRENT_SCRIPTS)
+
+
+class HeadTailBuffer:
+    """
+    Keeps the first and last cap/2 bytes written to it and counts the rest.
+    The tail is trimmed in batches, so each write costs amortized O(len(data)).
+    """
+
+    def __init__(self, cap):
+        self.head_limit = cap // 2
+        self.tail_limit = cap - self.head_limit
+        self.head = bytearray()
+        self.tail = bytearray()
+        self.total = 0
+
+    def write(self, data):
+        self.total += len(data)
+        room = self.head_limit - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+        if data:
+            self.tail += data
+            if len(self.tail) > 2 * self.tail_limit:
+                del self.tail[: len(self.tail) - self.tail_limit]
+
+    @property
+    def dropped(self):
+        return self.total - len(self.head) - min(len(self.tail), self.tail_limit)
+
+    def text(self):
+        head = self.head.decode("utf-8", errors="replace")
+        tail = self.tail[-self.tail_limit :].decode("utf-8", errors="replace")
+        if not self.dropped:
+            return head + tail
+        return f"{head}\n[... {self.dropped} bytes dropped ...]\n{tail}"
+
+
+class _LiveEcho:
+    """Echoes one stream's output to the console line by line, with a prefix."""
+
+    def __init__(self, label):
+        self.label = label
+        self.pending = b""
+
+    def write(self, data):
+        self.pending += data
+        *lines, self.pending = self.pending.split(b"\n")
+        self._emit(lines)
+
+    def flush(self):
+        if self.pending:
+            self._emit([self.pending])
+            self.pending = b""
+
+    def _emit(self, lines):
+        if not lines:
+            return
+        with _echo_lock:
+            for line in lines:
+                text = line.decode("utf-8", errors="replace")
+                print(f"{LIVE_OUTPUT_PREFIX}{self.label}{text}", flush=True)
 
 
 # Helper function to resolve paths and check scope for execution operations.
@@ -21,9 +236,165 @@ def _resolve_and_check_scope(working_directory, target_path_str):
     return abs_resolved_path
 
 
-def run_python_file(working_directory, file_path):
+def _capture(streams, deadline):
+    """
+    Reads non-blocking pipes until every one reaches EOF or the deadline
+    passes. `streams` maps each read fd to a list of sinks (objects with
+    write(bytes)). Returns True if the deadline passed first.
+    """
+    selector = selectors.DefaultSelector()
+    for fd in streams:
+        os.set_blocking(fd, False)
+        selector.register(fd, selectors.EVENT_READ)
+    try:
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            for key, _ in selector.select(remaining):
+                try:
+                    data = os.read(key.fd, 65536)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    selector.unregister(key.fd)
+                    continue
+                for sink in streams[key.fd]:
+                    sink.write(data)
+    finally:
+        selector.close()
+    return False
+
+
+# Run with `python -c`: applies the rlimits given as JSON in argv[1], then
+# replaces itself with the interpreter running the script and its arguments.
+_LIMITS_BOOTSTRAP = (
+    "import json, os, resource, sys\n"
+    "for name, value in json.loads(sys.argv[1]).items():\n"
+    "    resource.setrlimit(getattr(resource, name), tuple(value))\n"
+    "os.execv(sys.executable, [sys.executable, *sys.argv[2:]])\n"
+)
+
+
+def _launch(abs_file_full_path, argv, cwd, limits):
+    """
+    Starts the script in its own session with `limits` applied, in the warm
+    pool if it is running, else in a fresh interpreter. Returns (process,
+    stdout fd, stderr fd, warm); the caller closes the fds.
+    """
+    if _warm_pool is not None and _warm_pool.running:
+        stdout_read, stdout_write = os.pipe()
+        stderr_read, stderr_write = os.pipe()
+        stdin_fd = os.open(os.devnull, os.O_RDONLY)
+        try:
+            process = _warm_pool.run(
+                abs_file_full_path, argv, cwd, stdin_fd, stdout_write, stderr_write, limits
+            )
+            return process, stdout_read, stderr_read, True
+        except OSError:
+            # The fork server is gone; fall back to a fresh interpreter.
+            os.close(stdout_read)
+            os.close(stderr_read)
+        finally:
+            # The child has its own copies now; keeping ours would hide EOF.
+            for fd in (stdin_fd, stdout_write, stderr_write):
+                os.close(fd)
+
+    # The limits are applied by a bootstrap that then execs the script, not
+    # by preexec_fn, which can deadlock the child of a multithreaded process.
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-I",
+            "-S",
+            "-c",
+            _LIMITS_BOOTSTRAP,
+            json.dumps(limits),
+            abs_file_full_path,
+            *argv,
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        cwd=cwd,
+        start_new_session=True,  # Own process group, so a timeout can kill everything it starts.
+    )
+    # Take the fds over from the Popen file objects; they are closed by the caller.
+    stdout_fd = os.dup(process.stdout.fileno())
+    stderr_fd = os.dup(process.stderr.fileno())
+    process.stdout.close()
+    process.stderr.close()
+    return process, stdout_fd, stderr_fd, False
+
+
+def _wait(process, timeout):
+    """
+    Waits for a Popen or WarmProcess. Returns (exit code, rusage dict or None),
+    or raises TimeoutError.
+    """
+    if not isinstance(process, subprocess.Popen):
+        returncode = process.wait(timeout)
+        return returncode, process.rusage
+
+    # Reap with wait4 rather than Popen.wait, to get the child's resource usage.
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.001
+    while True:
+        pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+        if pid:
+            process.returncode = os.waitstatus_to_exitcode(status)
+            rusage = {
+                "utime": usage.ru_utime,
+                "stime": usage.ru_stime,
+                "maxrss_kb": usage.ru_maxrss,
+            }
+            return process.returncode, rusage
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+
+def _kill_group(process):
+    """Kills the script and every process it started (it leads its own session)."""
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _describe_run(queue_wait, elapsed, rusage):
+    """One line on how long the script queued and ran, and what it used."""
+    text = f"[Queued {queue_wait:.2f} s, ran {elapsed:.2f} s"
+    if rusage is not None:
+        text += (
+            f"; CPU {rusage['utime']:.2f} s user + {rusage['stime']:.2f} s system, "
+            f"peak memory {rusage['maxrss_kb'] / 1024:.1f} MB"
+        )
+    return text + "]"
+
+
+@tool(
+    description=(
+        "Executes a Python file within the working directory, with a "
+        f"{DEFAULT_TIMEOUT_SECONDS}-second timeout by default and capped CPU time, memory, "
+        "open files and file size. Captures stdout and stderr; very long output is cut to its "
+        "beginning and end. Reports time spent queued behind other scripts and resources used."
+    ),
+    parameters={
+        "file_path": "The path to the Python file to execute, relative to the working directory.",
+        "args": "Optional list of string arguments to pass to the Python script.",
+        "timeout": f"Seconds to let the script run before killing it. Defaults to {DEFAULT_TIMEOUT_SECONDS}, at most {MAX_TIMEOUT_SECONDS}.",
+    },
+)
+def run_python_file(
+    working_directory: str,
+    file_path: str,
+    args: list[str] | None = None,
+    timeout: int | None = None,
+) -> str:
     # Step 1: Resolve the file_path and perform initial security scope check.
-    resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
+    with span("run_python_file.resolve_path"):
+        resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
 
     if isinstance(resolved_path_or_error, str) and resolved_path_or_error.startswith(
         "Error:"
@@ -42,48 +413,102 @@ def run_python_file(working_directory, file_path):
     if not file_path.endswith(".py"):
         return f'Error: "{file_path}" is not a Python file.'
 
-    # Step 3: Execute the Python file using subprocess.run.
-    output_lines = []
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT_SECONDS
+    elif not 1 <= timeout <= MAX_TIMEOUT_SECONDS:
+        return f"Error: timeout must be between 1 and {MAX_TIMEOUT_SECONDS} seconds, got {timeout}"
+
+    # Step 3: Execute the Python file, capturing its output as it arrives.
+    argv = [str(arg) for arg in args or []]
+    stdout = HeadTailBuffer(_output_cap_bytes)
+    stderr = HeadTailBuffer(_output_cap_bytes)
+    echoes = [_LiveEcho(""), _LiveEcho("stderr: ")] if _live_output else []
 
+    rusage = None
     try:
-        command = [sys.executable, abs_file_full_path]
-
-        process_result = subprocess.run(
-            command,
-            capture_output=True,
-            text=True,
-            timeout=30,
-            cwd=abs_working_dir_for_subprocess,
-        )
+        with scheduler.slot() as queue_wait, span(
+            "run_python_file.subprocess", queue_wait=round(queue_wait, 6)
+        ) as subprocess_span:
+            started = time.monotonic()
+            process, stdout_fd, stderr_fd, warm = _launch(
+                abs_file_full_path, argv, abs_working_dir_for_subprocess, _effective_limits()
+            )
+            deadline = started + timeout
+            try:
+                timed_out = _capture(
+                    {
+                        stdout_fd: [stdout, *echoes[:1]],
+                        stderr_fd: [stderr, *echoes[1:]],
+                    },
+                    deadline,
+                )
+                if not timed_out:
+                    try:
+                        returncode, rusage = _wait(
+                            process, max(0.0, deadline - time.monotonic())
+                        )
+                    except TimeoutError:
+                        timed_out = True
+                if timed_out:
+                    _kill_group(process)
+                    returncode, rusage = _wait(process, None)
+            finally:
+                os.close(stdout_fd)
+                os.close(stderr_fd)
+                for echo in echoes:
+                    echo.flush()
+            elapsed = time.monotonic() - started
+
+            subprocess_span.set(
+                warm=warm,
+                returncode=returncode,
+                timed_out=timed_out,
+                stdout_bytes=stdout.total,
+                stderr_bytes=stderr.total,
+                dropped_bytes=stdout.dropped + stderr.dropped,
+            )
+            if rusage is not None:
+                subprocess_span.set(**rusage)
+
+    except OSError as e:
+        return f"Error: executing Python file: {e}"
 
-        if process_result.stdout:
-            output_lines.append("STDOUT:")
-            output_lines.append(process_result.stdout.strip())
+    except Exception as e:
+        return f"Error: an unexpected error occurred: {e}"
 
-        if process_result.stderr:
-            output_lines.append("STDERR:")
-            output_lines.append(process_result.stderr.strip())
+    output_lines = []
+    if timed_out:
+        output_lines.append(f"Error: Process timed out after {timeout} seconds.")
+    suffix = " (before timeout)" if timed_out else ""
 
-        if process_result.returncode != 0:
-            output_lines.append(f"Process exited with code {process_result.returncode}")
+    stdout_text = stdout.text().strip()
+    if stdout_text:
+        output_lines.append(f"STDOUT{suffix}:")
+        output_lines.append(stdout_text)
 
-        if not output_lines:
-            return "No output produced."
+    stderr_text = stderr.text().strip()
+    if stderr_text:
+        output_lines.append(f"STDERR{suffix}:")
+        output_lines.append(stderr_text)
 
-        return "\n".join(output_lines)
+    if not timed_out and returncode < 0:
+        try:
+            signal_name = signal.Signals(-returncode).name
+        except ValueError:
+            signal_name = f"signal {-returncode}"
+        output_lines.append(f"Process killed by {signal_name}")
+    elif not timed_out and returncode != 0:
+        output_lines.append(f"Process exited with code {returncode}")
 
-    except subprocess.TimeoutExpired as e:
-        output_lines.append("Error: Process timed out after 30 seconds.")
-        if e.stdout:
-            output_lines.append("STDOUT (before timeout):")
-            output_lines.append(e.stdout.strip())
-        if e.stderr:
-            output_lines.append("STDERR (before timeout):")
-            output_lines.append(e.stderr.strip())
-        return "\n".join(output_lines)
+    if stdout.dropped or stderr.dropped:
+        output_lines.append(
+            f"[Output capped at {_output_cap_bytes} bytes per stream: dropped "
+            f"{stdout.dropped} of {stdout.total} stdout bytes and "
+            f"{stderr.dropped} of {stderr.total} stderr bytes from the middle]"
+        )
 
-    except OSError as e:
-        return f"Error: executing Python file: {e}"
+    if not output_lines:
+        output_lines.append("No output produced.")
 
-    except Exception as e:
-        return f"Error: an unexpected error occurred: {e}"
+    output_lines.append(_describe_run(queue_wait, elapsed, rusage))
+    return "\n".join(output_lines)
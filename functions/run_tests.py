@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from registry import tool
+from run_python import (
+    DEFAULT_TIMEOUT_SECONDS,
+    MAX_TIMEOUT_SECONDS,
+    HeadTailBuffer,
+    _capture,
+    _effective_limits,
+    _kill_group,
+    _launch,
+    _resolve_and_check_scope,
+    _wait,
+    scheduler,
+)
+from tracing import span
+from workspace_index import current_index
+
+# Most worker processes running the tests of one call. Each one holds a
+# run_python scheduler slot, so fewer start when other scripts are running.
+TEST_WORKERS = max(2, min(os.cpu_count() or 1, 8))
+
+# Test runs remembered across calls, most recently used last.
+MAX_CACHED_RUNS = 32
+
+# Each worker is a fresh interpreter running this script, started like any
+# script from run_python_file, so tests never see modules the agent has loaded.
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test_worker.py")
+
+# Output kept from each worker's stdout and stderr, for reporting crashes.
+WORKER_OUTPUT_CAP_BYTES = 4096
+
+_TEST_DEFINITION = re.compile(rb"^\s*(?:async\s+)?def\s+test", re.MULTILINE)
+
+# (abs test file, selected test names) -> (sources, result); sources maps every
+# local file the run imported, test file included, to its sha1.
+_results_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _source_hash(abs_path):
+    """sha1 of a file, from the workspace index when its entry is still current."""
+    try:
+        stat_result = os.stat(abs_path)
+    except OSError:
+        return None
+    index = current_index(abs_path)
+    entry = index.lookup(abs_path) if index is not None else None
+    if (
+        entry is not None
+        and entry.sha1 is not None
+        and entry.size == stat_result.st_size
+        and entry.mtime_ns == stat_result.st_mtime_ns
+    ):
+        return entry.sha1
+    digest = hashlib.sha1()
+    try:
+        with open(abs_path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def _cached_result(key):
+    with _cache_lock:
+        cached = _results_cache.get(key)
+        if cached is None:
+            return None
+        _results_cache.move_to_end(key)
+    sources, result = cached
+    if any(_source_hash(path) != sha1 for path, sha1 in sources.items()):
+        return None
+    return result
+
+
+def _store_result(key, sources, result):
+    with _cache_lock:
+        _results_cache[key] = (sources, result)
+        _results_cache.move_to_end(key)
+        while len(_results_cache) > MAX_CACHED_RUNS:
+            _results_cache.popitem(last=False)
+
+
+def _worker_count(abs_test_path, test_names):
+    """
+    Workers worth starting: one per test at most. The tests aren't known
+    until a worker imports the module, so count test method definitions.
+    """
+    if test_names:
+        wanted = len(test_names)
+    else:
+        try:
+            with open(abs_test_path, "rb") as f:
+                wanted = len(_TEST_DEFINITION.findall(f.read()))
+        except OSError:
+            wanted = 1
+    return max(1, min(TEST_WORKERS, wanted))
+
+
+def _run_workers(abs_test_path, abs_working_dir, names, workers, deadline):
+    """
+    Runs the workers concurrently; returns (outcomes, timed_out), with one
+    outcome dict per worker as written by test_worker.py.
+    """
+    result_directory = tempfile.mkdtemp(prefix="run_tests-")
+    limits = _effective_limits()
+    launched = []  # (process, stdout fd, stderr fd, output, result path)
+    try:
+        for index in range(workers):
+            result_path = os.path.join(result_directory, f"{index}.json")
+            argv = [abs_test_path, abs_working_dir, str(index), str(workers), result_path, *names]
+            process, stdout_fd, stderr_fd, _warm = _launch(
+                WORKER_SCRIPT, argv, os.path.dirname(abs_test_path), limits
+            )
+            output = HeadTailBuffer(WORKER_OUTPUT_CAP_BYTES)
+            launched.append((process, stdout_fd, stderr_fd, output, result_path))
+
+        streams = {}
+        for _process, stdout_fd, stderr_fd, output, _result_path in launched:
+            streams[stdout_fd] = [output]
+            streams[stderr_fd] = [output]
+        if _capture(streams, deadline):
+            return [], True
+
+        outcomes = []
+        for process, _stdout_fd, _stderr_fd, output, result_path in launched:
+            try:
+                returncode, _rusage = _wait(process, max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                return [], True
+            try:
+                with open(result_path, "r") as f:
+                    outcomes.append(json.load(f))
+            except (OSError, ValueError):
+                outcomes.append(
+                    {"error": f"worker exited with code {returncode}: {output.text().strip()}"}
+                )
+        return outcomes, False
+    finally:
+        for process, stdout_fd, stderr_fd, _output, _result_path in launched:
+            if process.returncode is None:
+                _kill_group(process)
+                _wait(process, None)
+            os.close(stdout_fd)
+            os.close(stderr_fd)
+        shutil.rmtree(result_directory, ignore_errors=True)
+
+
+@tool(
+    description=(
+        "Runs the unittest tests in a Python test file within the working directory, in "
+        "parallel worker processes, and returns a structured result: counts of passed, failed, "
+        "errored and skipped tests plus each test's name, status, duration and failure "
+        "message. Results are reused when neither the test file nor the local sources it "
+        "imports have changed."
+    ),
+    parameters={
+        "file_path": "The test file to run, relative to the working directory (e.g. 'calculator/tests.py').",
+        "test_names": "Optional list of tests to run, as 'TestClass' or 'TestClass.test_method'. Defaults to all.",
+        "timeout": f"Seconds to let the whole run take. Defaults to {DEFAULT_TIMEOUT_SECONDS}, at most {MAX_TIMEOUT_SECONDS}.",
+    },
+)
+def run_tests(
+    working_directory: str,
+    file_path: str,
+    test_names: list[str] | None = None,
+    timeout: int | None = None,
+) -> dict:
+    abs_test_path = _resolve_and_check_scope(working_directory, file_path)
+    if abs_test_path.startswith("Error:"):
+        return {"error": abs_test_path.replace("execute", "test", 1)}
+    if not os.path.isfile(abs_test_path):
+        return {"error": f'Error: File "{file_path}" not found.'}
+    if not file_path.endswith(".py"):
+        return {"error": f'Error: "{file_path}" is not a Python file.'}
+
+    if timeout is None:
+        timeout = DEFAULT_TIMEOUT_SECONDS
+    elif not 1 <= timeout <= MAX_TIMEOUT_SECONDS:
+        return {"error": f"Error: timeout must be between 1 and {MAX_TIMEOUT_SECONDS} seconds, got {timeout}"}
+
+    abs_working_dir = os.path.abspath(working_directory)
+    key = (abs_test_path, tuple(test_names or ()))
+
+    with span("run_tests.cache_lookup") as lookup_span:
+        cached = _cached_result(key)
+        lookup_span.set(hit=cached is not None)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    names = list(test_names or ())
+    # Each worker is a script like any other: it needs its own scheduler slot.
+    with scheduler.slots(_worker_count(abs_test_path, names)) as (queue_wait, workers), span(
+        "run_tests.run", queue_wait=round(queue_wait, 6), workers=workers
+    ) as run_span:
+        started = time.monotonic()
+        try:
+            outcomes, timed_out = _run_workers(
+                abs_test_path, abs_working_dir, names, workers, started + timeout
+            )
+        except OSError as e:
+            return {"error": f"Error: Could not run tests in \"{file_path}\": {e}"}
+        if timed_out:
+            return {"error": f"Error: Tests timed out after {timeout} seconds."}
+
+        sources = {abs_test_path}
+        records = []
+        for outcome in outcomes:
+            if "error" in outcome:
+                # E.g. the test module failed to import.
+                return {"error": f"Error: Could not run tests in \"{file_path}\": {outcome['error']}"}
+            records.extend(outcome["records"])
+            sources.update(outcome["sources"])
+
+        duration = time.monotonic() - started
+        counts = {status: 0 for status in ("passed", "failed", "error", "skipped")}
+        for record in records:
+            counts[record["status"]] += 1
+        run_span.set(tests=len(records), **counts)
+
+    result = {
+        "file": file_path,
+        "passed": counts["passed"],
+        "failed": counts["failed"],
+        "errors": counts["error"],
+        "skipped": counts["skipped"],
+        "duration": round(duration, 3),
+        "tests": records,
+    }
+    _store_result(key, {path: _source_hash(path) for path in sources}, result)
+    return {**result, "cached": False}
@@ -0,0 +1,217 @@
+import mmap
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from get_files_info import GitignoreMatcher, _walk
+from registry import tool
+from text_files import BINARY_SNIFF_BYTES, is_binary
+from tracing import span
+from workspace_index import current_index
+
+# Default cap on the number of matching lines returned by one call.
+DEFAULT_MAX_MATCHES = 100
+
+# Threads scanning files concurrently.
+SEARCH_WORKERS = 8
+
+# Files at least this large are searched through mmap instead of being read in.
+MMAP_THRESHOLD = 256 * 1024
+
+# Long lines (minified code, data files) are cut to this many characters.
+MAX_LINE_CHARS = 200
+
+
+def _line_text(data, start, end):
+    text = bytes(data[start:end]).decode("utf-8", errors="replace").rstrip("\r")
+    if len(text) > MAX_LINE_CHARS:
+        text = text[:MAX_LINE_CHARS] + "..."
+    return text
+
+
+def _search_buffer(data, regex, context_lines, max_matches, stop):
+    """
+    Returns [(line number, is_match, text)] for matching lines of a bytes-like
+    buffer, with up to context_lines of context around each. A line with
+    several matches is reported once.
+    """
+    hits = []  # (line number, start offset, end offset) of each matching line
+    line_number = 1
+    counted_to = 0
+    last_line_start = -1
+    for match in regex.finditer(data):
+        line_start = data.rfind(b"\n", 0, match.start()) + 1
+        if line_start == last_line_start:
+            continue
+        # mmap has no count(); counting each gap once copies the file at most once.
+        line_number += bytes(data[counted_to:line_start]).count(b"\n")
+        counted_to = line_start
+        line_end = data.find(b"\n", match.start())
+        hits.append((line_number, line_start, len(data) if line_end < 0 else line_end))
+        last_line_start = line_start
+        if len(hits) >= max_matches or stop.is_set():
+            break
+
+    if not context_lines:
+        return [(number, True, _line_text(data, start, end)) for number, start, end in hits]
+
+    # Walk outwards from each hit for its context, skipping lines already emitted.
+    emitted = {}
+    for number, start, end in hits:
+        emitted[number] = (True, _line_text(data, start, end))
+        before_end = start - 1
+        for offset in range(1, context_lines + 1):
+            if before_end < 0:
+                break
+            before_start = data.rfind(b"\n", 0, before_end) + 1
+            emitted.setdefault(number - offset, (False, _line_text(data, before_start, before_end)))
+            before_end = before_start - 1
+        after_start = end + 1
+        for offset in range(1, context_lines + 1):
+            if after_start > len(data) or (after_start == len(data) and data[-1:] == b"\n"):
+                break
+            after_end = data.find(b"\n", after_start)
+            after_end = len(data) if after_end < 0 else after_end
+            emitted.setdefault(number + offset, (False, _line_text(data, after_start, after_end)))
+            after_start = after_end + 1
+    return [(number, *emitted[number]) for number in sorted(emitted)]
+
+
+def _search_file(abs_path, regex, context_lines, max_matches, stop):
+    """Searches one file; returns its result lines, or None for binary/unreadable files."""
+    if stop.is_set():
+        return None
+    try:
+        with open(abs_path, "rb") as f:
+            head = f.read(BINARY_SNIFF_BYTES)
+            if not head or is_binary(head):
+                return None
+            size = os.fstat(f.fileno()).st_size
+            if size < MMAP_THRESHOLD:
+                f.seek(0)
+                return _search_buffer(f.read(), regex, context_lines, max_matches, stop)
+            # Large files: let the regex engine scan the mapped pages directly.
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return _search_buffer(mapped, regex, context_lines, max_matches, stop)
+    except (OSError, ValueError):
+        return None
+
+
+@tool(
+    description="Searches the contents of files under a directory for a regular expression (or literal text), constrained to the working directory. Returns matching lines as 'path:line: text', with optional surrounding context lines. Binary files and .gitignore'd paths are skipped.",
+    parameters={
+        "pattern": "The regular expression to search for (Python syntax), or the exact text if literal is true.",
+        "directory": "The directory to search, relative to the working directory. Defaults to the working directory itself.",
+        "literal": "If true, pattern is matched as plain text rather than a regular expression. Defaults to false.",
+        "include": "Optional glob patterns (e.g. '*.py'); only files matching one of them are searched.",
+        "context_lines": "Number of lines of context to show before and after each match. Defaults to 0.",
+        "ignore_case": "If true, matching is case-insensitive. Defaults to false.",
+        "max_matches": f"Maximum number of matching lines to return. Defaults to {DEFAULT_MAX_MATCHES}.",
+    },
+)
+def search_files(
+    working_directory: str,
+    pattern: str,
+    directory: str | None = None,
+    literal: bool = False,
+    include: list[str] | None = None,
+    context_lines: int = 0,
+    ignore_case: bool = False,
+    max_matches: int = DEFAULT_MAX_MATCHES,
+) -> str:
+    with span("search_files.resolve_path"):
+        abs_working_dir = os.path.abspath(working_directory)
+        abs_target_dir = os.path.abspath(os.path.join(abs_working_dir, directory or "."))
+
+    if os.path.commonpath([abs_working_dir, abs_target_dir]) != abs_working_dir:
+        return f'Error: Cannot search "{directory}" as it is outside the permitted working directory'
+    elif not os.path.isdir(abs_target_dir):
+        return f'Error: "{directory}" is not a directory'
+
+    if not pattern:
+        return "Error: pattern must not be empty"
+    try:
+        source = re.escape(pattern) if literal else pattern
+        regex = re.compile(source.encode("utf-8"), re.IGNORECASE if ignore_case else 0)
+    except re.error as e:
+        return f'Error: Invalid regular expression "{pattern}": {e}'
+    context_lines = max(0, context_lines or 0)
+    max_matches = max(1, max_matches or DEFAULT_MAX_MATCHES)
+
+    with span("search_files.scan") as scan_span:
+        gitignore = GitignoreMatcher(abs_working_dir)
+        index = current_index(abs_target_dir)
+        files = [
+            rel_path
+            for rel_path, _size, is_directory, error in _walk(
+                abs_target_dir, None, include, None, gitignore, index
+            )
+            if error is None and not is_directory
+        ]
+        # Paths in the output are relative to the working directory, like tool arguments.
+        rel_target = os.path.relpath(abs_target_dir, abs_working_dir)
+
+        output_lines = []
+        match_count = 0
+        files_with_matches = 0
+        truncated = False
+        stop = threading.Event()
+
+        with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    _search_file,
+                    os.path.join(abs_target_dir, rel_path),
+                    regex,
+                    context_lines,
+                    max_matches + 1,
+                    stop,
+                )
+                for rel_path in files
+            ]
+            # Collect in walk order so the output is deterministic.
+            for position, (rel_path, future) in enumerate(zip(files, futures)):
+                results = future.result()
+                if not results:
+                    continue
+                display_path = os.path.normpath(os.path.join(rel_target, rel_path))
+                if context_lines and output_lines:
+                    output_lines.append("--")
+                files_with_matches += 1
+                previous_number = None
+                for number, is_match, text in results:
+                    if is_match and match_count >= max_matches:
+                        truncated = True
+                        break
+                    # "--" separates non-adjacent groups of lines, as in grep.
+                    gap = previous_number is not None and number > previous_number + 1
+                    if context_lines and gap:
+                        output_lines.append("--")
+                    separator = ":" if is_match else "-"
+                    output_lines.append(f"{display_path}{separator}{number}{separator} {text}")
+                    match_count += is_match
+                    previous_number = number
+                if match_count >= max_matches:
+                    # Cap reached: skip files not started yet, stop the rest early.
+                    truncated = truncated or position + 1 < len(files)
+                    stop.set()
+                    for pending in futures[position + 1 :]:
+                        pending.cancel()
+                    break
+
+        scan_span.set(
+            files=len(files),
+            files_with_matches=files_with_matches,
+            matches=match_count,
+            truncated=truncated,
+        )
+
+    if not output_lines:
+        return f'No matches for "{pattern}" in {len(files)} files.'
+    if truncated:
+        output_lines.append(
+            f"[Stopped after {max_matches} matching lines. Narrow the pattern, directory "
+            "or include globs to see the rest.]"
+        )
+    return "\n".join(output_lines)
@@ -0,0 +1,154 @@
+"""
+Runs a share of a unittest file's tests in a fresh interpreter, for run_tests.
+
+Usage:
+    python test_worker.py TEST_FILE WORKING_DIR INDEX WORKERS RESULT_PATH [TEST_NAME ...]
+
+The module's tests (or the named ones) are split into WORKERS runs of
+neighbouring tests, so classes stay together, and this worker runs run number
+INDEX. It writes {"records": [...], "sources": [...]} as JSON to RESULT_PATH,
+where sources lists every .py file under WORKING_DIR it imported, or
+{"error": "..."} if the test module can't be loaded.
+"""
+
+import importlib.util
+import json
+import os
+import sys
+import time
+import unittest
+
+# Characters of each failure's traceback returned to the model.
+MAX_MESSAGE_CHARS = 2000
+
+
+class _RecordingResult(unittest.TestResult):
+    """Records the status, duration and failure text of every test it sees."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = True  # Attach what a failing test printed to its message.
+        self.records = []
+        self._started = None
+
+    def startTest(self, test):
+        super().startTest(test)
+        self._started = time.perf_counter()
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        self._started = None
+
+    def _record(self, test, status, message=None):
+        duration = time.perf_counter() - self._started if self._started else 0.0
+        record = {"name": _test_name(test), "status": status, "duration": round(duration, 6)}
+        if message:
+            record["message"] = message[-MAX_MESSAGE_CHARS:]
+        self.records.append(record)
+
+    def addSuccess(self, test):
+        super().addSuccess(test)
+        self._record(test, "passed")
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self._record(test, "failed", self.failures[-1][1])
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        # setUpClass and friends fail outside any one test.
+        self._record(test, "error", self.errors[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self._record(test, "skipped", reason)
+
+    def addExpectedFailure(self, test, err):
+        super().addExpectedFailure(test, err)
+        self._record(test, "passed")
+
+    def addUnexpectedSuccess(self, test):
+        super().addUnexpectedSuccess(test)
+        self._record(test, "failed", "Unexpected success")
+
+
+def _test_name(test):
+    """'TestCalculator.test_addition' for a test in the module under test."""
+    if not isinstance(test, unittest.TestCase):
+        return str(test)  # A class or module fixture, e.g. 'setUpClass (tests.TestCalculator)'.
+    test_id = test.id()
+    return test_id.split(".", 1)[1] if "." in test_id else test_id
+
+
+def _flatten(suite):
+    for item in suite:
+        if isinstance(item, unittest.TestSuite):
+            yield from _flatten(item)
+        else:
+            yield item
+
+
+def share(names, index, workers):
+    """The `index`-th of `workers` runs of neighbouring names; some may be empty."""
+    size, extra = divmod(len(names), workers)
+    start = index * size + min(index, extra)
+    return names[start : start + size + (1 if index < extra else 0)]
+
+
+def _load_module(abs_test_path):
+    name = os.path.splitext(os.path.basename(abs_test_path))[0]
+    spec = importlib.util.spec_from_file_location(name, abs_test_path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _local_sources(abs_working_dir):
+    """Every .py file under the working directory that this interpreter has imported."""
+    sources = []
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path and path.endswith(".py"):
+            path = os.path.abspath(path)
+            if os.path.commonpath([abs_working_dir, path]) == abs_working_dir:
+                sources.append(path)
+    return sources
+
+
+def run(abs_test_path, abs_working_dir, index, workers, names):
+    # Set up like `python tests.py` run from the test's directory.
+    test_dir = os.path.dirname(abs_test_path)
+    sys.path[0] = test_dir
+    os.chdir(test_dir)
+    try:
+        module = _load_module(abs_test_path)
+        if not names:
+            suite = unittest.defaultTestLoader.loadTestsFromModule(module)
+            names = [_test_name(test) for test in _flatten(suite)]
+        names = share(names, index, workers)
+        suite = unittest.defaultTestLoader.loadTestsFromNames(names, module)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+    result = _RecordingResult()
+    suite.run(result)
+    # The worker itself lives in the working directory too; only count what
+    # loading and running the tests imported.
+    sources = [
+        path
+        for path in _local_sources(abs_working_dir)
+        if path != os.path.abspath(__file__)
+    ]
+    return {"records": result.records, "sources": sources}
+
+
+def main():
+    abs_test_path, abs_working_dir, index, workers, result_path, *names = sys.argv[1:]
+    outcome = run(abs_test_path, abs_working_dir, int(index), int(workers), names)
+    with open(result_path, "w") as f:
+        json.dump(outcome, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+# Files with a NUL byte in this many leading bytes are treated as binary.
+BINARY_SNIFF_BYTES = 8192
+
+
+def is_binary(head):
+    """True if a file's leading bytes look binary, i.e. contain a NUL byte."""
+    return b"\0" in head[:BINARY_SNIFF_BYTES]
@@ -0,0 +1,209 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Default upper bound on the total size of cached results, in bytes.
+DEFAULT_MAX_BYTES = 8 * 1024 * 1024
+
+# Read-only tools whose results can be cached, mapped to the argument that names
+# the path they look at (and the default when the argument is omitted).
+CACHEABLE_FUNCTIONS = {
+    "get_files_info": ("directory", "."),
+    "get_file_content": ("file_path", None),
+}
+
+# Tools that change the working directory, mapped to the argument naming the
+# path they write (or a list of {"file_path": ...} objects). None means the
+# call may touch any path.
+INVALIDATING_FUNCTIONS = {
+    "write_file": "file_path",
+    "write_files": "files",
+    "run_python_file": None,
+    "run_tests": None,
+}
+
+
+def _fingerprint(abs_path):
+    """Returns (mtime_ns, size) for a path, or None if it cannot be stat'ed."""
+    try:
+        stat_result = os.stat(abs_path)
+    except OSError:
+        return None
+    return (stat_result.st_mtime_ns, stat_result.st_size)
+
+
+def _is_same_or_ancestor(ancestor, path):
+    return os.path.commonpath([ancestor, path]) == ancestor
+
+
+class ToolResultCache:
+    """
+    LRU cache for the results of read-only tool calls.
+
+    Entries are keyed on (function name, normalized args, working directory) and
+    remember the mtime and size of the file or directory they were built from.
+    A lookup only hits if that fingerprint is unchanged. (A directory's mtime
+    changes when entries are added, removed or renamed, not when a file inside
+    it is edited in place.) Writes made through write_file(s) drop entries for the
+    written path and for every directory listing that contains it;
+    run_python_file and run_tests drop everything, since the code they run
+    can write anywhere.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (abs_path, fingerprint, result, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key_and_path(self, function_name, function_args):
+        """Returns (cache key, absolute target path), or (None, None) if uncacheable."""
+        if function_name not in CACHEABLE_FUNCTIONS:
+            return None, None
+        # A recursive listing depends on every subdirectory, which a single
+        # mtime/size fingerprint of the top directory can't vouch for.
+        if function_args.get("recursive"):
+            return None, None
+
+        path_arg, default = CACHEABLE_FUNCTIONS[function_name]
+        target = function_args.get(path_arg) or default
+        if target is None:
+            return None, None
+
+        abs_working_dir = os.path.abspath(function_args.get("working_directory", "."))
+        abs_path = os.path.abspath(os.path.join(abs_working_dir, target))
+
+        other_args = {
+            name: value
+            for name, value in function_args.items()
+            if name not in (path_arg, "working_directory")
+        }
+        key = (
+            function_name,
+            os.path.relpath(abs_path, abs_working_dir),
+            json.dumps(other_args, sort_keys=True, default=str),
+            abs_working_dir,
+        )
+        return key, abs_path
+
+    def lookup(self, function_name, function_args):
+        """Returns the cached result for a call, or None on a miss."""
+        key, abs_path = self._key_and_path(function_name, function_args)
+        if key is None:
+            return None
+
+        fingerprint = _fingerprint(abs_path)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or fingerprint is None or entry[1] != fingerprint:
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def store(self, function_name, function_args, result):
+        """Caches a successful result. Error strings are never cached."""
+        if not isinstance(result, str) or result.startswith("Error:"):
+            return
+
+        key, abs_path = self._key_and_path(function_name, function_args)
+        if key is None:
+            return
+
+        fingerprint = _fingerprint(abs_path)
+        if fingerprint is None:
+            return
+
+        size = len(result.encode("utf-8", errors="replace"))
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (abs_path, fingerprint, result, size)
+            self._total_bytes += size
+
+            # Evict least recently used entries until we fit the byte budget.
+            while self._total_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._drop(oldest_key)
+
+    def invalidate_after(self, function_name, function_args):
+        """Drops entries made stale by a call to one of INVALIDATING_FUNCTIONS."""
+        if function_name not in INVALIDATING_FUNCTIONS:
+            return
+
+        path_arg = INVALIDATING_FUNCTIONS[function_name]
+        if path_arg is None or not function_args.get(path_arg):
+            self.clear()
+            return
+
+        written = function_args[path_arg]
+        if not isinstance(written, str):
+            written = [item.get("file_path") or "." for item in written]
+        else:
+            written = [written]
+
+        abs_working_dir = os.path.abspath(function_args.get("working_directory", "."))
+        for path in written:
+            self.invalidate_path(os.path.abspath(os.path.join(abs_working_dir, path)))
+
+    def invalidate_path(self, abs_path):
+        """Drops entries for abs_path and for any directory listing containing it."""
+        with self._lock:
+            stale = [
+                key
+                for key, entry in self._entries.items()
+                if _is_same_or_ancestor(entry[0], abs_path)
+            ]
+            for key in stale:
+                self._drop(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """Returns a snapshot of the cache counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+            }
+
+    def _drop(self, key):
+        # Caller must hold self._lock.
+        entry = self._entries.pop(key)
+        self._total_bytes -= entry[3]
+
+
+def format_stats(before, after):
+    """Summarizes cache activity between two stats() snapshots."""
+    hits = after["hits"] - before["hits"]
+    misses = after["misses"] - before["misses"]
+    lookups = hits + misses
+    hit_rate = (hits / lookups * 100) if lookups else 0.0
+    return (
+        f"Tool cache: {hits} hits / {lookups} lookups ({hit_rate:.0f}% hit rate), "
+        f"{after['invalidations'] - before['invalidations']} invalidated, "
+        f"{after['entries']} entries ({after['bytes']} bytes)"
+    )
+
+
+# Process-wide cache shared by every session and iteration.
+tool_cache = ToolResultCache()
@@ -0,0 +1,171 @@
+import atexit
+import contextvars
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# The span currently open in this thread/task, used to link children to parents.
+# asyncio tasks and asyncio.to_thread copy context, so tool spans started from
+# the agent loop are parented correctly.
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation. Attributes can be added while it is open with set()."""
+
+    __slots__ = ("name", "span_id", "parent_id", "attributes", "start", "end")
+
+    def __init__(self, name, span_id, parent_id, attributes):
+        self.name = name
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = time.time()
+        self.end = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.time()) - self.start) * 1000
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": round(self.start, 6),
+            "duration_ms": round(self.duration_ms, 3),
+            "thread": threading.current_thread().name,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stands in for Span when tracing is off, so instrumented code stays cheap."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class Tracer:
+    """
+    Records spans as JSON lines and keeps per-name durations for a summary.
+
+    Tracing is off until configure() gives it a destination or add_hook()
+    registers a callback; until then span() returns a shared no-op span.
+    Hooks receive every finished span as a dict, so spans can be forwarded to
+    another collector.
+    """
+
+    def __init__(self):
+        self._sink = None
+        self._owns_sink = False
+        self._hooks = []
+        self._durations = defaultdict(list)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.enabled = False
+
+    def configure(self, destination):
+        """
+        Starts writing spans to `destination`, a file path or "-" for stderr,
+        and prints a summary to stderr when the process exits.
+        """
+        if destination == "-":
+            self._sink = sys.stderr
+        else:
+            self._sink = open(destination, "a", buffering=1)
+            self._owns_sink = True
+        self.enabled = True
+        atexit.register(self._print_summary_at_exit)
+
+    def add_hook(self, hook):
+        """Registers hook(span_dict), called for every finished span."""
+        self._hooks.append(hook)
+        self.enabled = True
+
+    @contextmanager
+    def span(self, name, **attributes):
+        if not self.enabled:
+            yield _NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        current = Span(
+            name, next(self._ids), parent.span_id if parent else None, attributes
+        )
+        token = _current_span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.set(error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            current.end = time.time()
+            _current_span.reset(token)
+            self._finish(current)
+
+    def _finish(self, span):
+        record = span.to_dict()
+        key = span.name
+        if span.name == "tool_call" and "tool" in span.attributes:
+            key = f"tool_call:{span.attributes['tool']}"
+
+        with self._lock:
+            self._durations[key].append(span.duration_ms)
+            if self._sink is not None:
+                self._sink.write(json.dumps(record, default=str) + "\n")
+
+        for hook in self._hooks:
+            try:
+                hook(record)
+            except Exception as e:
+                print(f"Error: span hook {hook!r} failed: {e}", file=sys.stderr)
+
+    def summary(self):
+        """Returns p50/p95 per span name and total model vs tool time, as text."""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+
+        lines = ["Trace summary:"]
+        for name in sorted(durations):
+            values = durations[name]
+            lines.append(
+                f"  {name:<36} n={len(values):<4} p50={_percentile(values, 0.5):9.1f} ms"
+                f"  p95={_percentile(values, 0.95):9.1f} ms  total={sum(values):10.1f} ms"
+            )
+        model_ms = sum(durations.get("model_call", []))
+        tool_ms = sum(
+            sum(values) for name, values in durations.items() if name.startswith("tool_call:")
+        )
+        lines.append(f"  Total model time: {model_ms:.1f} ms, total tool time: {tool_ms:.1f} ms")
+        return "\n".join(lines)
+
+    def _print_summary_at_exit(self):
+        if self._durations:
+            print(self.summary(), file=sys.stderr)
+        if self._owns_sink:
+            self._sink.close()
+
+
+# Process-wide tracer used by main.py, call_function and the tools.
+tracer = Tracer()
+span = tracer.span
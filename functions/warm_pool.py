@@ -0,0 +1,303 @@
+"""
+A fork server for running Python scripts without paying interpreter startup.
+
+WarmPool starts one long-lived server interpreter that imports common stdlib
+modules up front and then waits on a Unix socket. Each run request makes the
+server fork a child, which redirects its stdio to the file descriptors sent
+with the request, changes to the requested cwd, sets sys.argv and runs the
+script as __main__. The server itself never runs script code, so every
+script starts from the same clean, warm state.
+
+The child reports its pid when it starts and its exit code and resource
+usage when it finishes, over the request's connection. A child killed by a
+signal reports nothing; the closed connection says it died.
+"""
+
+import atexit
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Imported by the server before it forks, so scripts find them already loaded.
+PRELOADED_MODULES = (
+    "argparse",
+    "collections",
+    "dataclasses",
+    "datetime",
+    "decimal",
+    "doctest",
+    "fractions",
+    "functools",
+    "io",
+    "itertools",
+    "json",
+    "math",
+    "pathlib",
+    "random",
+    "re",
+    "shutil",
+    "statistics",
+    "string",
+    "subprocess",
+    "tempfile",
+    "textwrap",
+    "traceback",
+    "typing",
+    "unittest",
+    "unittest.mock",
+)
+
+# Seconds to wait for a freshly started server to accept connections.
+STARTUP_TIMEOUT = 10.0
+
+_MAX_REQUEST_BYTES = 1024 * 1024
+
+
+def _read_message(connection, buffer, deadline=None):
+    """Reads one newline-terminated JSON message; returns (message or None at EOF, rest)."""
+    while b"\n" not in buffer:
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError
+            connection.settimeout(remaining)
+        try:
+            data = connection.recv(4096)
+        except socket.timeout:
+            raise TimeoutError from None
+        if not data:
+            return None, buffer
+        buffer += data
+    line, _, buffer = buffer.partition(b"\n")
+    return json.loads(line), buffer
+
+
+class WarmProcess:
+    """A script running in a child of the fork server."""
+
+    def __init__(self, connection, pid):
+        self._connection = connection
+        self._buffer = b""
+        self.pid = pid
+        self.returncode = None
+        self.rusage = None  # Dict of the child's getrusage(RUSAGE_SELF) fields, if it reported them.
+
+    def wait(self, timeout=None):
+        """Waits for the script to finish; returns its exit code, or raises TimeoutError."""
+        if self.returncode is not None:
+            return self.returncode
+        deadline = None if timeout is None else time.monotonic() + timeout
+        message, self._buffer = _read_message(self._connection, self._buffer, deadline)
+        self._connection.close()
+        if message is None:
+            # The child died without reporting, e.g. killed by a signal.
+            self.returncode = -signal.SIGKILL
+        else:
+            self.returncode = message["returncode"]
+            self.rusage = message.get("rusage")
+        return self.returncode
+
+    def kill(self):
+        """Kills the script and every process it started (it leads its own session)."""
+        try:
+            os.killpg(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+
+class WarmPool:
+    """Client side of the fork server. start() launches it; run() runs a script in it."""
+
+    def __init__(self, preload=PRELOADED_MODULES):
+        self.preload = tuple(preload)
+        self._server = None
+        self._directory = None
+        self.socket_path = None
+
+    @property
+    def running(self):
+        return self._server is not None and self._server.poll() is None
+
+    def start(self):
+        self._directory = tempfile.mkdtemp(prefix="warm-python-")
+        self.socket_path = os.path.join(self._directory, "server.sock")
+        self._server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", self.socket_path, *self.preload],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while not os.path.exists(self.socket_path):
+            if self._server.poll() is not None or time.monotonic() > deadline:
+                self.close()
+                raise OSError("warm Python server failed to start")
+            time.sleep(0.01)
+        atexit.register(self.close)
+        return self
+
+    def run(self, script_path, argv, cwd, stdin_fd, stdout_fd, stderr_fd, limits=None):
+        """
+        Starts script_path with sys.argv = [script_path, *argv] in cwd, with its
+        stdio on the given file descriptors. `limits` maps resource.RLIMIT_*
+        names to (soft, hard) pairs applied in the child. Returns a WarmProcess.
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.socket_path)
+            request = {"script": script_path, "argv": list(argv), "cwd": cwd, "limits": limits or {}}
+            socket.send_fds(
+                connection, [json.dumps(request).encode()], [stdin_fd, stdout_fd, stderr_fd]
+            )
+            message, buffer = _read_message(connection, b"", time.monotonic() + STARTUP_TIMEOUT)
+        except (OSError, TimeoutError):
+            connection.close()
+            raise OSError("warm Python server did not start the script")
+        if message is None:
+            connection.close()
+            raise OSError("warm Python server closed the connection")
+        process = WarmProcess(connection, message["pid"])
+        process._buffer = buffer
+        return process
+
+    def close(self):
+        if self._server is not None and self._server.poll() is None:
+            self._server.terminate()
+            try:
+                self._server.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self._server.kill()
+        if self.socket_path and os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        if self._directory and os.path.isdir(self._directory):
+            os.rmdir(self._directory)
+        self._server = self._directory = self.socket_path = None
+
+
+# --- Server and child side --------------------------------------------------
+
+
+def _report_signal(connection, signum):
+    """Reports death by signal, as a fresh interpreter's exit status would show it."""
+    try:
+        connection.sendall(json.dumps({"returncode": -signum}).encode() + b"\n")
+    finally:
+        os._exit(128 + signum)
+
+
+def _run_child(connection, request, fds):
+    """Runs in the forked child: sets up the process like `python script args` and runs it."""
+    import resource
+    import runpy
+    import traceback
+
+    returncode = 1
+    try:
+        os.setsid()  # Own process group, so a timeout can kill everything it starts.
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGXCPU, lambda signum, frame: _report_signal(connection, signum))
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, errors="backslashreplace", closefd=False)
+        sys.__stdin__, sys.__stdout__, sys.__stderr__ = sys.stdin, sys.stdout, sys.stderr
+        connection.sendall(json.dumps({"pid": os.getpid()}).encode() + b"\n")
+
+        for name, (soft, hard) in request.get("limits", {}).items():
+            resource.setrlimit(getattr(resource, name), (soft, hard))
+        os.chdir(request["cwd"])
+        script = request["script"]
+        sys.argv = [script, *request["argv"]]
+        sys.path[0] = os.path.dirname(script)
+        if "random" in sys.modules:
+            sys.modules["random"].seed()  # Don't share the server's random state.
+
+        try:
+            runpy.run_path(script, run_name="__main__")
+            returncode = 0
+        except SystemExit as e:
+            if e.code is None:
+                returncode = 0
+            elif isinstance(e.code, int):
+                returncode = int(e.code)  # unittest.main() exits with a bool.
+            else:
+                print(e.code, file=sys.stderr)
+        atexit._run_exitfuncs()
+    except BaseException as e:
+        # Start the traceback at the script, as `python script.py` would.
+        tb = e.__traceback__
+        while tb is not None and tb.tb_frame.f_code.co_filename != request.get("script"):
+            tb = tb.tb_next
+        traceback.print_exception(type(e), e, tb or e.__traceback__)
+    finally:
+        # Never return into the server loop, whatever happened above.
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            rusage = {
+                "utime": usage.ru_utime,
+                "stime": usage.ru_stime,
+                "maxrss_kb": usage.ru_maxrss,
+            }
+            connection.sendall(
+                json.dumps({"returncode": returncode, "rusage": rusage}).encode() + b"\n"
+            )
+        finally:
+            os._exit(returncode & 0xFF)
+
+
+def _serve(socket_path, preload):
+    import importlib
+
+    for name in preload:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+    # Children are never waited for here; let the kernel reap them.
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    parent = os.getppid()
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path + ".tmp")
+    # start() treats the socket appearing as ready, so it must already accept.
+    listener.listen(64)
+    os.rename(socket_path + ".tmp", socket_path)
+    listener.settimeout(1.0)
+
+    # Exit with the agent process that started us.
+    while os.getppid() == parent:
+        try:
+            connection, _ = listener.accept()
+        except socket.timeout:
+            continue
+        try:
+            connection.settimeout(STARTUP_TIMEOUT)
+            message, fds, _flags, _address = socket.recv_fds(connection, _MAX_REQUEST_BYTES, 3)
+            request = json.loads(message)
+        except (OSError, ValueError):
+            connection.close()
+            continue
+        connection.settimeout(None)
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        if os.fork() == 0:
+            listener.close()
+            _run_child(connection, request, fds)
+        for fd in fds:
+            os.close(fd)
+        connection.close()
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--serve"]:
+    _serve(sys.argv[2], sys.argv[3:])
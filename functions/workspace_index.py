@@ -0,0 +1,455 @@
+import atexit
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import threading
+
+# Files up to this size get a content hash and line count while indexing.
+# Larger files are indexed by size and mtime only.
+DETAIL_MAX_BYTES = 4 * 1024 * 1024
+
+# Seconds between rescans when inotify is unavailable.
+DEFAULT_POLL_INTERVAL = 2.0
+
+SNAPSHOT_VERSION = 1
+
+# inotify event flags, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class IndexEntry:
+    """What the index knows about one file or directory."""
+
+    __slots__ = ("size", "mtime_ns", "is_dir", "sha1", "line_count")
+
+    def __init__(self, size, mtime_ns, is_dir, sha1=None, line_count=None):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.is_dir = is_dir
+        self.sha1 = sha1
+        self.line_count = line_count
+
+    def to_list(self):
+        return [self.size, self.mtime_ns, self.is_dir, self.sha1, self.line_count]
+
+
+def _file_details(abs_path):
+    """Returns (sha1 hex digest, line count) for a file, reading it in blocks."""
+    digest = hashlib.sha1()
+    line_count = 0
+    last_block = b""
+    with open(abs_path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+            line_count += block.count(b"\n")
+            last_block = block
+    # A final line without a trailing newline still counts as a line.
+    if last_block and not last_block.endswith(b"\n"):
+        line_count += 1
+    return digest.hexdigest(), line_count
+
+
+class _Inotify:
+    """Minimal ctypes wrapper around Linux inotify."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not sys.platform.startswith("linux") or not libc_name:
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, abs_path):
+        wd = self._libc.inotify_add_watch(
+            self.fd, os.fsencode(abs_path), ctypes.c_uint32(WATCH_MASK)
+        )
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {abs_path}")
+        return wd
+
+    def read_events(self, timeout):
+        """Yields (wd, mask, name) for pending events, waiting up to timeout seconds."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + name_length].rstrip(b"\0")
+            offset += name_length
+            yield wd, mask, os.fsdecode(name)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class WorkspaceIndex:
+    """
+    In-memory index of the files under a root directory.
+
+    The index is built in a background thread (from a saved snapshot when one
+    is available) and then kept current with inotify on Linux, or by polling
+    every poll_interval seconds elsewhere. Paths pruned by get_files_info
+    (.gitignore'd files, .git, virtualenvs, ...) are not indexed, so a miss
+    means "unknown", not "missing": callers fall back to the filesystem.
+
+    Updates from the watcher arrive shortly after the change; writes made by
+    the agent itself are applied synchronously through update_path().
+    """
+
+    def __init__(self, root, snapshot_path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.root = os.path.abspath(root)
+        self.snapshot_path = snapshot_path
+        self.poll_interval = poll_interval
+        self.ready = threading.Event()
+        self.watch_mode = None  # "inotify" or "poll" once watching starts.
+
+        self._entries = {}  # relative path -> IndexEntry ("." is the root)
+        self._children = {}  # relative directory -> set of child names
+        self._lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._gitignore = self._load_gitignore()
+        self._inotify = None
+        # Both guarded by _lock: the watcher thread and update_path() add to them.
+        self._watch_dirs = {}  # inotify watch descriptor -> relative directory
+        self._watched = set()  # relative directories with a watch
+
+    # --- Public API -----------------------------------------------------
+
+    def start(self):
+        """Builds the index and starts watching, in a daemon thread."""
+        self._thread = threading.Thread(
+            target=self._run, name="workspace-index", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._stop_watching()
+
+    def lookup(self, abs_path):
+        """Returns the IndexEntry for abs_path, or None if not (yet) indexed."""
+        rel_path = self._relative(abs_path)
+        if rel_path is None or not self.ready.is_set():
+            return None
+        with self._lock:
+            return self._entries.get(rel_path)
+
+    def list_dir(self, abs_dir):
+        """
+        Returns [(name, abs_path, IndexEntry)] for a directory's indexed
+        children, sorted by name, or None if the directory isn't indexed.
+        """
+        rel_dir = self._relative(abs_dir)
+        if rel_dir is None or not self.ready.is_set():
+            return None
+        with self._lock:
+            names = self._children.get(rel_dir)
+            if names is None:
+                return None
+            listing = []
+            for name in sorted(names):
+                rel_path = name if rel_dir == "." else os.path.join(rel_dir, name)
+                entry = self._entries.get(rel_path)
+                if entry is not None:
+                    listing.append((name, os.path.join(self.root, rel_path), entry))
+            return listing
+
+    def update_path(self, abs_path):
+        """Refreshes one path (and its parent's child list) right away."""
+        rel_path = self._relative(abs_path)
+        if rel_path is None or rel_path == ".":
+            return
+        # Make sure every parent directory is known first, e.g. after makedirs.
+        parent = os.path.dirname(rel_path) or "."
+        if parent != "." and parent not in self._entries:
+            self.update_path(os.path.join(self.root, parent))
+        self._refresh(rel_path, recurse=True)
+
+    def save(self, snapshot_path=None):
+        """Writes the index to a JSON snapshot so the next start can skip re-hashing."""
+        snapshot_path = snapshot_path or self.snapshot_path
+        if not snapshot_path or not self.ready.is_set():
+            return
+        with self._lock:
+            payload = {
+                "version": SNAPSHOT_VERSION,
+                "root": self.root,
+                "entries": {path: entry.to_list() for path, entry in self._entries.items()},
+            }
+        temp_path = f"{snapshot_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(temp_path, snapshot_path)
+
+    # --- Building -------------------------------------------------------
+
+    def _run(self):
+        # Start watching before the first scan so changes made while it runs
+        # are picked up; _scan adds a watch for each directory it lists.
+        try:
+            self._inotify = _Inotify()
+        except OSError:
+            self._inotify = None
+
+        snapshot = self._load_snapshot()
+        self._scan(".", snapshot)
+        self.ready.set()
+
+        if self._inotify is not None:
+            self.watch_mode = "inotify"
+            self._watch_loop()
+        if self._inotify is None:
+            # No inotify (or it ran out of watches): fall back to periodic rescans.
+            self.watch_mode = "poll"
+            while not self._stop.wait(self.poll_interval):
+                self._scan(".", None)
+
+    def _load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return None
+        try:
+            with open(self.snapshot_path, "r") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("version") != SNAPSHOT_VERSION or payload.get("root") != self.root:
+            return None
+        return {
+            path: IndexEntry(*values) for path, values in payload.get("entries", {}).items()
+        }
+
+    def _scan(self, rel_dir, known):
+        """
+        (Re)indexes rel_dir and everything under it. `known` maps relative paths
+        to previous entries; files whose size and mtime are unchanged keep
+        their hash and line count instead of being re-read.
+        """
+        known = known if known is not None else dict(self._entries)
+        stack = [rel_dir]
+        while stack and not self._stop.is_set():
+            current = stack.pop()
+            abs_dir = os.path.join(self.root, current)
+            # Watch new directories before listing them so nothing created
+            # in between is missed.
+            try:
+                self._watch(current)
+            except OSError:
+                self._stop_watching()
+            try:
+                with os.scandir(abs_dir) as iterator:
+                    dir_entries = list(iterator)
+            except OSError:
+                self._forget(current)
+                continue
+
+            names = set()
+            for dir_entry in dir_entries:
+                rel_path = (
+                    dir_entry.name if current == "." else os.path.join(current, dir_entry.name)
+                )
+                try:
+                    is_directory = dir_entry.is_dir()
+                    if self._gitignore.is_ignored(dir_entry.path, is_directory):
+                        continue
+                    stat_result = dir_entry.stat()
+                except OSError:
+                    continue
+                names.add(dir_entry.name)
+                entry = self._make_entry(rel_path, stat_result, is_directory, known.get(rel_path))
+                with self._lock:
+                    self._entries[rel_path] = entry
+                if is_directory:
+                    stack.append(rel_path)
+
+            with self._lock:
+                previous = self._children.get(current, set())
+                self._children[current] = names
+                for removed in previous - names:
+                    removed_path = removed if current == "." else os.path.join(current, removed)
+                    self._forget(removed_path)
+                if current == ".":
+                    self._entries["."] = IndexEntry(0, 0, True)
+
+    def _make_entry(self, rel_path, stat_result, is_directory, previous):
+        if is_directory:
+            return IndexEntry(stat_result.st_size, stat_result.st_mtime_ns, True)
+        if (
+            previous is not None
+            and previous.size == stat_result.st_size
+            and previous.mtime_ns == stat_result.st_mtime_ns
+        ):
+            return previous
+        sha1 = line_count = None
+        if stat_result.st_size <= DETAIL_MAX_BYTES:
+            try:
+                sha1, line_count = _file_details(os.path.join(self.root, rel_path))
+            except OSError:
+                pass
+        return IndexEntry(stat_result.st_size, stat_result.st_mtime_ns, False, sha1, line_count)
+
+    def _load_gitignore(self):
+        # Imported here because get_files_info itself consults the index.
+        from get_files_info import GitignoreMatcher
+
+        return GitignoreMatcher(self.root)
+
+    def _refresh(self, rel_path, recurse=False):
+        """Re-stats one path, updating or removing its entry."""
+        abs_path = os.path.join(self.root, rel_path)
+        parent = os.path.dirname(rel_path) or "."
+        name = os.path.basename(rel_path)
+        if name == ".gitignore":
+            # The matcher caches parsed rules, and new rules can hide or reveal
+            # anything under this directory: reload them and rescan it.
+            self._gitignore = self._load_gitignore()
+            self._scan(parent, None)
+            return
+        try:
+            stat_result = os.stat(abs_path)
+        except OSError:
+            with self._lock:
+                self._children.get(parent, set()).discard(name)
+                self._forget(rel_path)
+            return
+
+        is_directory = os.path.isdir(abs_path)
+        if self._gitignore.is_ignored(abs_path, is_directory):
+            return
+        with self._lock:
+            previous = self._entries.get(rel_path)
+            self._entries[rel_path] = self._make_entry(
+                rel_path, stat_result, is_directory, previous
+            )
+            self._children.setdefault(parent, set()).add(name)
+        if is_directory and recurse:
+            self._scan(rel_path, None)
+
+    def _forget(self, rel_path):
+        with self._lock:
+            self._entries.pop(rel_path, None)
+            for child in self._children.pop(rel_path, set()):
+                self._forget(os.path.join(rel_path, child) if rel_path != "." else child)
+
+    # --- Watching -------------------------------------------------------
+
+    def _watch(self, rel_dir):
+        """Adds an inotify watch for rel_dir unless watching is off or it has one."""
+        with self._lock:
+            if self._inotify is None or rel_dir in self._watched:
+                return
+            wd = self._inotify.add_watch(os.path.join(self.root, rel_dir))
+            self._watch_dirs[wd] = rel_dir
+            self._watched.add(rel_dir)
+
+    def _stop_watching(self):
+        """Drops inotify (e.g. out of watches); the run loop switches to polling."""
+        with self._lock:
+            inotify, self._inotify = self._inotify, None
+            if inotify is not None:
+                inotify.close()
+            self._watch_dirs.clear()
+            self._watched.clear()
+
+    def _watch_loop(self):
+        while not self._stop.is_set() and self._inotify is not None:
+            try:
+                events = list(self._inotify.read_events(timeout=0.5))
+            except (OSError, ValueError):
+                # The descriptor was closed under us by _stop_watching().
+                break
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped; only a rescan can recover.
+                    self._scan(".", None)
+                    continue
+                with self._lock:
+                    if mask & IN_IGNORED:
+                        self._watched.discard(self._watch_dirs.pop(wd, None))
+                        continue
+                    rel_dir = self._watch_dirs.get(wd)
+                if rel_dir is None or not name:
+                    continue
+                rel_path = name if rel_dir == "." else os.path.join(rel_dir, name)
+                created_dir = mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO)
+                self._refresh(rel_path, recurse=bool(created_dir))
+
+    def _relative(self, abs_path):
+        abs_path = os.path.abspath(abs_path)
+        if os.path.commonpath([self.root, abs_path]) != self.root:
+            return None
+        return os.path.relpath(abs_path, self.root)
+
+
+# The index consulted by the tools, if one has been started.
+_active_index = None
+
+
+def start_index(root, snapshot_path=None, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Starts the process-wide index for root; saves a snapshot at exit if asked."""
+    global _active_index
+    if _active_index is not None:
+        _active_index.stop()
+    _active_index = WorkspaceIndex(root, snapshot_path, poll_interval).start()
+    if snapshot_path:
+        atexit.register(_active_index.save)
+    return _active_index
+
+
+def notify_write(abs_path):
+    """Applies a write made by the agent to the index before the tool returns."""
+    index = _active_index
+    if index is not None and index._relative(abs_path) is not None:
+        index.update_path(abs_path)
+
+
+def current_index(abs_path=None):
+    """
+    Returns the active index if it is ready (and covers abs_path, when given),
+    otherwise None so the caller reads the filesystem directly.
+    """
+    index = _active_index
+    if index is None or not index.ready.is_set():
+        return None
+    if abs_path is not None and index._relative(abs_path) is None:
+        return None
+    return index
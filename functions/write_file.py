@@ -1,4 +1,16 @@
 import os
+import tempfile
+
+from edits import (
+    EditConflictError,
+    apply_search_replace,
+    apply_unified_diff,
+    parse_search_replace,
+    summarize_diff,
+)
+from registry import tool
+from tracing import span
+from workspace_index import notify_write
 
 
 # Helper function to resolve paths and check scope for write operations.
@@ -21,9 +33,159 @@ def _resolve_and_check_scope(working_directory, target_path_str):
     return abs_resolved_path
 
 
-def write_file(working_directory, file_path, content):
+# The process umask, read once at import: os.umask() can only be read by
+# setting it, which isn't safe once tool calls run on several threads.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def stage_write(abs_path, data, fsync=False):
+    """
+    Writes `data` (bytes) to a new temporary file next to abs_path and returns
+    its path, ready to be os.replace()d over abs_path. The temporary file gets
+    the target's current permissions, or the usual umask-based mode for a new
+    file. With fsync, the data is flushed to disk first.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(abs_path),
+        prefix=f".{os.path.basename(abs_path)}.",
+        suffix=".tmp",
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        try:
+            os.chmod(temp_path, os.stat(abs_path).st_mode & 0o7777)
+        except FileNotFoundError:
+            # mkstemp creates files 0600.
+            os.chmod(temp_path, 0o666 & ~_UMASK)
+    except BaseException:
+        discard_staged(temp_path)
+        raise
+    return temp_path
+
+
+def discard_staged(temp_path):
+    try:
+        os.remove(temp_path)
+    except OSError:
+        pass
+
+
+def fsync_directory(directory):
+    """Flushes a directory's entries (e.g. a rename into it) to disk."""
+    directory_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(directory_fd)
+    finally:
+        os.close(directory_fd)
+
+
+def atomic_write(abs_path, data, fsync=False):
+    """
+    Replaces abs_path with `data` (bytes) atomically: writes a temporary file
+    in the same directory, then os.replace()s it over the target, so readers
+    see either the old or the new file, never a partial one. With fsync, the
+    data and the directory entry are flushed to disk before returning.
+    """
+    temp_path = stage_write(abs_path, data, fsync)
+    try:
+        os.replace(temp_path, abs_path)
+    except BaseException:
+        discard_staged(temp_path)
+        raise
+    if fsync:
+        fsync_directory(os.path.dirname(abs_path))
+
+
+def prepare_write(abs_file_full_path, file_path, content=None, edits=None, diff=None):
+    """
+    Works out the new content of a file from exactly one of content, edits or
+    diff. Edits apply to the file as it is on disk now.
+
+    Returns (old content, new content, description of the edits applied) --
+    old content and description are None for a plain content write -- or an
+    "Error: ..." string if nothing should be written.
+    """
+    given = [
+        name
+        for name, value in (("content", content), ("edits", edits), ("diff", diff))
+        if value is not None
+    ]
+    if len(given) != 1:
+        return "Error: Provide exactly one of content, edits or diff"
+    if content is not None:
+        return None, content, None
+
+    try:
+        with open(abs_file_full_path, "rb") as f:
+            old_content = f.read().decode("utf-8")
+    except FileNotFoundError:
+        old_content = ""
+    except UnicodeDecodeError:
+        return f'Error: "{file_path}" is not valid UTF-8 text; rewrite it with content instead'
+    except OSError as e:
+        return f'Error: Could not read file "{file_path}": {e}'
+
+    with span("write_file.apply_edits", mode=given[0]):
+        try:
+            if edits is not None:
+                blocks = parse_search_replace(edits)
+                new_content = apply_search_replace(old_content, blocks)
+                applied = f"{len(blocks)} SEARCH/REPLACE block{'s' if len(blocks) != 1 else ''}"
+            else:
+                new_content = apply_unified_diff(old_content, diff)
+                applied = "diff"
+        except EditConflictError as e:
+            return f'Error: Edit to "{file_path}" not applied: {e}'
+    return old_content, new_content, applied
+
+
+def describe_write(file_path, old_content, new_content, applied):
+    """The success message for a write prepared by prepare_write."""
+    if applied is None:
+        return f'Successfully wrote to "{file_path}" ({len(new_content)} characters written)'
+    # For edits, return a short diff so the model can confirm the change
+    # without reading the file back.
+    added, removed, diff_summary = summarize_diff(old_content, new_content, file_path)
+    return (
+        f'Successfully edited "{file_path}" ({applied} applied, +{added} -{removed} lines)\n'
+        f"{diff_summary}"
+    )
+
+
+@tool(
+    description=(
+        "Writes or overwrites content to a file, creating parent directories if necessary, "
+        "constrained to the working directory. To change part of an existing file, pass "
+        "'edits' (SEARCH/REPLACE blocks) or 'diff' (a unified diff) instead of the whole "
+        "'content'; edits are checked against the current file and applied atomically."
+    ),
+    parameters={
+        "file_path": "The path to the file to write to, relative to the working directory.",
+        "content": "The full content to write to the file. Omit when using edits or diff.",
+        "edits": (
+            "One or more blocks of the form '<<<<<<< SEARCH\n<exact existing lines>\n=======\n"
+            "<replacement lines>\n>>>>>>> REPLACE'. Each SEARCH text must appear exactly once."
+        ),
+        "diff": "A unified diff (with '@@ -a,b +c,d @@' hunks) to apply to the file's current content.",
+        "fsync": "If true, flush the file to disk before returning. Defaults to false.",
+    },
+)
+def write_file(
+    working_directory: str,
+    file_path: str,
+    content: str | None = None,
+    edits: str | None = None,
+    diff: str | None = None,
+    fsync: bool = False,
+) -> str:
     # Use the helper function to resolve the path and perform the initial scope check.
-    resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
+    with span("write_file.resolve_path"):
+        resolved_path_or_error = _resolve_and_check_scope(working_directory, file_path)
 
     # If the helper function returned an error string, propagate it immediately.
     if isinstance(resolved_path_or_error, str) and resolved_path_or_error.startswith(
@@ -35,7 +197,13 @@ def write_file(working_directory, file_path, content):
     # We'll assign it to a more descriptive variable for clarity.
     abs_file_full_path = resolved_path_or_error
 
-    # Step 2: Implement file creation/overwrite logic within a try-except block.
+    # Step 2: Work out the new content. If edits don't match the file, nothing is written.
+    prepared = prepare_write(abs_file_full_path, file_path, content, edits, diff)
+    if isinstance(prepared, str):
+        return prepared
+    old_content, content, applied = prepared
+
+    # Step 3: Implement file creation/overwrite logic within a try-except block.
     try:
         # Get the directory part of the absolute file path.
         # This is where the file will reside, and its parent directories might need to be created.
@@ -46,18 +214,18 @@ def write_file(working_directory, file_path, content):
         if not os.path.exists(file_directory):
             os.makedirs(file_directory, exist_ok=True)
 
-        # Open the file in 'write' mode ("w").
-        # This mode will create the file if it doesn't exist, or overwrite it if it does.
-        # The 'with' statement ensures the file is properly closed after writing.
-        with open(abs_file_full_path, "w") as f:
-            f.write(content)  # Write the provided content to the file.
+        # Write through a temporary file and rename it into place, so an
+        # interrupted write never leaves a half-written file behind.
+        with span("write_file.write", chars=len(content), fsync=fsync):
+            atomic_write(abs_file_full_path, content.encode("utf-8"), fsync=fsync)
 
-        # If the write operation was successful, return the specified success message.
-        return (
-            f'Successfully wrote to "{file_path}" ({len(content)} characters written)'
-        )
+        # Update the workspace index now, so the next listing or read sees this write.
+        notify_write(abs_file_full_path)
 
     # Catch any OSError (e.g., PermissionError, IOError) that might occur during directory creation or file writing.
     except OSError as e:
         # Return a specific error message indicating the file and the nature of the error.
         return f'Error: Could not write to file "{file_path}": {e}'
+
+    # If the write operation was successful, return the specified success message.
+    return describe_write(file_path, old_content, content, applied)
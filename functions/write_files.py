@@ -0,0 +1,205 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NotRequired, TypedDict
+
+from registry import tool
+from tracing import span
+from workspace_index import notify_write
+from write_file import (
+    _resolve_and_check_scope,
+    atomic_write,
+    describe_write,
+    discard_staged,
+    fsync_directory,
+    prepare_write,
+    stage_write,
+)
+
+# Most files one call can write.
+MAX_BATCH_FILES = 50
+
+# Threads preparing and staging files concurrently.
+WRITE_WORKERS = 8
+
+
+class FileWrite(TypedDict):
+    """One file of a write_files batch: a path plus content, edits or diff, as for write_file."""
+
+    file_path: str
+    content: NotRequired[str]
+    edits: NotRequired[str]
+    diff: NotRequired[str]
+
+
+def _prepare(working_directory, file_write):
+    """Scope-checks and prepares one file. Returns a dict describing the pending write."""
+    file_path = file_write.get("file_path") or ""
+    abs_path = _resolve_and_check_scope(working_directory, file_path)
+    if abs_path.startswith("Error:"):
+        return {"path": file_path, "error": abs_path}
+    if os.path.isdir(abs_path):
+        return {"path": file_path, "error": f'Error: "{file_path}" is a directory'}
+
+    prepared = prepare_write(
+        abs_path,
+        file_path,
+        file_write.get("content"),
+        file_write.get("edits"),
+        file_write.get("diff"),
+    )
+    if isinstance(prepared, str):
+        return {"path": file_path, "error": prepared}
+    old_content, new_content, applied = prepared
+
+    # Keep the current bytes so the batch can be rolled back.
+    try:
+        with open(abs_path, "rb") as f:
+            original = f.read()
+    except FileNotFoundError:
+        original = None
+    except OSError as e:
+        return {"path": file_path, "error": f'Error: Could not read file "{file_path}": {e}'}
+
+    return {
+        "path": file_path,
+        "abs_path": abs_path,
+        "old_content": old_content,
+        "new_content": new_content,
+        "applied": applied,
+        "original": original,
+    }
+
+
+def _missing_directories(abs_path):
+    """Parent directories of abs_path that don't exist yet, outermost first."""
+    missing = []
+    directory = os.path.dirname(abs_path)
+    while not os.path.exists(directory):
+        missing.append(directory)
+        directory = os.path.dirname(directory)
+    return list(reversed(missing))
+
+
+def _rollback(replaced, created_directories):
+    """Restores files already replaced in a failed batch and removes new directories."""
+    for pending in reversed(replaced):
+        try:
+            if pending["original"] is None:
+                os.remove(pending["abs_path"])
+            else:
+                atomic_write(pending["abs_path"], pending["original"])
+        except OSError:
+            pass
+    for directory in reversed(created_directories):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+
+@tool(
+    description=(
+        "Writes several files in one call, constrained to the working directory. Each entry "
+        "has a file_path and exactly one of content, edits or diff, as for write_file. The "
+        "batch is all-or-nothing: if any file fails its checks or can't be written, no file "
+        "is changed. Returns one result per file."
+    ),
+    parameters={
+        "files": "The files to write: objects with file_path and one of content, edits or diff.",
+        "fsync": "If true, flush every file to disk before returning. Defaults to false.",
+    },
+)
+def write_files(
+    working_directory: str, files: list[FileWrite], fsync: bool = False
+) -> list[dict]:
+    if not files:
+        return [{"error": "Error: files must list at least one file"}]
+    if len(files) > MAX_BATCH_FILES:
+        return [{"error": f"Error: At most {MAX_BATCH_FILES} files can be written in one call"}]
+
+    normalized = [os.path.normpath(f.get("file_path") or "") for f in files]
+    duplicates = {path for path in normalized if normalized.count(path) > 1}
+    if duplicates:
+        return [
+            {"error": f"Error: Each file may appear once per batch; repeated: {sorted(duplicates)}"}
+        ]
+
+    # Step 1: check and prepare every file. Nothing is written yet.
+    with span("write_files.prepare", files=len(files)):
+        with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+            pending = list(
+                executor.map(lambda f: _prepare(working_directory, f), files)
+            )
+
+    if any("error" in p for p in pending):
+        return [
+            {"path": p["path"], "error": p["error"]}
+            if "error" in p
+            else {"path": p["path"], "error": "Error: Not written because another file in the batch failed"}
+            for p in pending
+        ]
+
+    # Step 2: stage every file as a temporary file next to its target, then
+    # rename them all into place. If anything fails, undo the renames done so far.
+    created_directories = []
+    staged = []
+    replaced = []
+    with span("write_files.write", files=len(pending), fsync=fsync) as write_span:
+        try:
+            for p in pending:
+                missing = _missing_directories(p["abs_path"])
+                if missing:
+                    os.makedirs(missing[-1], exist_ok=True)
+                    created_directories.extend(missing)
+
+            with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+                futures = [
+                    executor.submit(
+                        stage_write, p["abs_path"], p["new_content"].encode("utf-8"), fsync
+                    )
+                    for p in pending
+                ]
+                # Wait for every staging write, so none is left behind on failure.
+                outcomes = []
+                for future in futures:
+                    try:
+                        outcomes.append(future.result())
+                    except OSError as e:
+                        outcomes.append(e)
+            staged = [o for o in outcomes if isinstance(o, str)]
+            failures = [
+                (p, o) for p, o in zip(pending, outcomes) if not isinstance(o, str)
+            ]
+            if failures:
+                p, error = failures[0]
+                raise OSError(f'Could not write to file "{p["path"]}": {error}')
+
+            for p, temp_path in zip(pending, staged):
+                os.replace(temp_path, p["abs_path"])
+                replaced.append(p)
+
+            if fsync:
+                for directory in {os.path.dirname(p["abs_path"]) for p in pending}:
+                    fsync_directory(directory)
+        except OSError as e:
+            # Staged files that were never renamed into place are still lying around.
+            for temp_path in staged[len(replaced) :]:
+                discard_staged(temp_path)
+            _rollback(replaced, created_directories)
+            write_span.set(rolled_back=True)
+            return [
+                {"path": p["path"], "error": f"Error: Batch not written, all changes undone: {e}"}
+                for p in pending
+            ]
+
+    # Update the workspace index now, so the next listing or read sees these writes.
+    for p in pending:
+        notify_write(p["abs_path"])
+
+    return [
+        {
+            "path": p["path"],
+            "result": describe_write(p["path"], p["old_content"], p["new_content"], p["applied"]),
+        }
+        for p in pending
+    ]
@@ -0,0 +1,227 @@
+import json
+import os
+
+from google.genai import types
+
+# Rough conversion used to estimate prompt tokens without calling the API.
+# Gemini averages about four characters per token for English text and code.
+CHARS_PER_TOKEN = 4
+
+# Default prompt-token budget for the conversation history (estimated tokens).
+DEFAULT_TOKEN_BUDGET = 30000
+
+# Number of most recent model/tool turns that are always sent verbatim.
+KEEP_RECENT_TURNS = 2
+
+# Tool results shorter than this are cheap enough to always keep verbatim.
+MIN_ELIDED_CHARS = 200
+
+# Tools whose results are snapshots of the working directory. A later call with
+# the same arguments makes an earlier result redundant.
+DEDUPLICATED_FUNCTIONS = {"get_files_info", "get_file_content"}
+
+
+def _part_chars(part: types.Part) -> int:
+    """Returns the number of characters a part contributes to the prompt."""
+    if part.text:
+        return len(part.text)
+    if part.function_call:
+        return len(part.function_call.name or "") + len(
+            json.dumps(part.function_call.args or {}, default=str)
+        )
+    if part.function_response:
+        return len(part.function_response.name or "") + len(
+            json.dumps(part.function_response.response or {}, default=str)
+        )
+    return 0
+
+
+def estimate_tokens(content: types.Content) -> int:
+    """Estimates how many prompt tokens a message costs."""
+    chars = sum(_part_chars(part) for part in content.parts or [])
+    return max(1, chars // CHARS_PER_TOKEN)
+
+
+def estimate_prefix_tokens(system_instruction, tools) -> int:
+    """Estimates how many prompt tokens a system instruction and tool declarations cost."""
+    chars = len(str(system_instruction)) if system_instruction else 0
+    for tool in tools or []:
+        chars += len(json.dumps(tool.model_dump(mode="json", exclude_none=True)))
+    return chars // CHARS_PER_TOKEN
+
+
+def _call_key(function_call: types.FunctionCall):
+    """Builds a hashable key from a function call's name and normalized args."""
+    args = {}
+    for name, value in (function_call.args or {}).items():
+        if name in ("file_path", "directory") and isinstance(value, str):
+            value = os.path.normpath(value)
+        args[name] = value
+    return (function_call.name, json.dumps(args, sort_keys=True, default=str))
+
+
+def _describe_call(function_call: types.FunctionCall) -> str:
+    args = ", ".join(
+        f"{name}={value!r}" for name, value in (function_call.args or {}).items()
+    )
+    return f"{function_call.name}({args})"
+
+
+class ConversationHistory:
+    """
+    Holds the messages of one agent session and decides what gets resent to
+    the model on every iteration.
+
+    Messages are stored exactly as appended. contents() returns a compacted
+    view of them:
+      - A get_files_info/get_file_content result is replaced by a short stub
+        once the same call has been made again later in the conversation.
+      - While the estimated prompt size is over token_budget, the oldest tool
+        results outside the last KEEP_RECENT_TURNS turns are replaced by a
+        one-line summary, oldest first.
+    The most recent turns are never touched, and function responses are kept
+    (with a smaller payload) so every function call still has its response.
+    """
+
+    def __init__(
+        self, token_budget=DEFAULT_TOKEN_BUDGET, keep_recent_turns=KEEP_RECENT_TURNS
+    ):
+        # A budget of None or 0 disables elision; deduplication always applies.
+        self.token_budget = token_budget or None
+        self.keep_recent_turns = keep_recent_turns
+        self.messages = []
+        self.tokens_saved = 0
+
+        # Per-message estimated token cost, as stored and as last sent.
+        self._raw_costs = []
+        self._sent_costs = []
+        # Compacted replacements, keyed by message index then part index.
+        self._replacements = {}
+        # Latest (message index, part index) seen for each deduplicated call key.
+        self._latest_result = {}
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, content: types.Content):
+        """Adds a message to the conversation."""
+        index = len(self.messages)
+        self.messages.append(content)
+        cost = estimate_tokens(content)
+        self._raw_costs.append(cost)
+        self._sent_costs.append(cost)
+
+        if content.role == "tool":
+            self._deduplicate(index)
+
+    @property
+    def raw_tokens(self) -> int:
+        """Estimated prompt tokens if every message were sent verbatim."""
+        return sum(self._raw_costs)
+
+    @property
+    def sent_tokens(self) -> int:
+        """Estimated prompt tokens of the compacted conversation."""
+        return sum(self._sent_costs)
+
+    def contents(self) -> list[types.Content]:
+        """
+        Returns the messages to send to the model on this iteration and adds
+        the tokens saved by compaction to tokens_saved.
+        """
+        if self.token_budget and self.sent_tokens > self.token_budget:
+            self._elide_until_within_budget()
+
+        contents = [self._compacted(index) for index in range(len(self.messages))]
+        self.tokens_saved += self.raw_tokens - self.sent_tokens
+        return contents
+
+    def _function_calls_for(self, tool_index):
+        """Returns the function calls a tool message answers, in order."""
+        if tool_index == 0:
+            return []
+        model_message = self.messages[tool_index - 1]
+        return [
+            part.function_call
+            for part in model_message.parts or []
+            if part.function_call
+        ]
+
+    def _deduplicate(self, tool_index):
+        function_calls = self._function_calls_for(tool_index)
+        parts = self.messages[tool_index].parts or []
+
+        for part_index, (part, function_call) in enumerate(zip(parts, function_calls)):
+            if function_call.name not in DEDUPLICATED_FUNCTIONS:
+                continue
+            if not part.function_response:
+                continue
+
+            key = _call_key(function_call)
+            previous = self._latest_result.get(key)
+            self._latest_result[key] = (tool_index, part_index)
+
+            if previous is not None:
+                self._replace(
+                    *previous,
+                    f"[Superseded: {_describe_call(function_call)} was called again "
+                    "later in the conversation; see the newer result.]",
+                )
+
+    def _elide_until_within_budget(self):
+        # Tool messages inside the recent window are kept verbatim.
+        protected_from = max(0, len(self.messages) - 2 * self.keep_recent_turns)
+
+        for tool_index in range(protected_from):
+            if self.sent_tokens <= self.token_budget:
+                return
+            message = self.messages[tool_index]
+            if message.role != "tool":
+                continue
+
+            function_calls = self._function_calls_for(tool_index)
+            for part_index, part in enumerate(message.parts or []):
+                if not part.function_response:
+                    continue
+                if part_index in self._replacements.get(tool_index, {}):
+                    continue
+
+                response = part.function_response.response or {}
+                payload = str(response.get("result", response.get("error", "")))
+                if len(payload) < MIN_ELIDED_CHARS:
+                    continue
+
+                if part_index < len(function_calls):
+                    described = _describe_call(function_calls[part_index])
+                else:
+                    described = part.function_response.name
+                lines = payload.strip().splitlines() or [""]
+                self._replace(
+                    tool_index,
+                    part_index,
+                    f"[Elided {len(payload)} characters ({len(lines)} lines) of output "
+                    f"from {described}; first line: {lines[0][:120]!r}. "
+                    "Call the tool again if you need it.]",
+                )
+
+    def _replace(self, message_index, part_index, summary):
+        """Swaps one function response for a short summary and updates its cost."""
+        original_part = self.messages[message_index].parts[part_index]
+        self._replacements.setdefault(message_index, {})[part_index] = (
+            types.Part.from_function_response(
+                name=original_part.function_response.name,
+                response={"result": summary},
+            )
+        )
+        self._sent_costs[message_index] = estimate_tokens(self._compacted(message_index))
+
+    def _compacted(self, index):
+        replacements = self._replacements.get(index)
+        message = self.messages[index]
+        if not replacements:
+            return message
+        parts = [
+            replacements.get(part_index, part)
+            for part_index, part in enumerate(message.parts)
+        ]
+        return types.Content(role=message.role, parts=parts)
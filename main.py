@@ -1,4 +1,9 @@
+import argparse
+import asyncio
+import atexit
+import json
 import sys
+import time
 import os
 from google import genai
 from google.genai import types
@@ -9,126 +14,48 @@ sys.path.insert(
     0, os.path.abspath(os.path.join(os.path.dirname(__file__), "functions"))
 )
 
-# Import the new call_function from your functions directory
-from call_function import call_function
-
-
-def main():
-    load_dotenv()
-
-    verbose = "--verbose" in sys.argv
-    prompt_parts = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
-
-    if not prompt_parts:
-        print("AI Code Assistant")
-        print('\nUsage: python main.py "your prompt here" [--verbose]')
-        print('Example: python main.py "How do I build a calculator app?"')
-        sys.exit(1)
-
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr)
-        sys.exit(1)
-
-    client = genai.Client(api_key=api_key)
-
-    user_prompt = " ".join(prompt_parts)
-
-    process_ai_interaction(client, user_prompt, verbose)
-
-
-def process_ai_interaction(client, user_prompt: str, verbose: bool):
-    if verbose:
-        print(f"User prompt: {user_prompt}\n")
-
-    # Define the schema for all available functions.
-    schema_get_files_info = types.FunctionDeclaration(
-        name="get_files_info",
-        description="Lists files in the specified directory along with their sizes, constrained to the working directory.",
-        parameters=types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "directory": types.Schema(
-                    type=types.Type.STRING,
-                    description="The directory to list files from, relative to the working directory. If not provided, lists files in the working directory itself.",
-                ),
-            },
-        ),
-    )
-
-    schema_get_file_content = types.FunctionDeclaration(
-        name="get_file_content",
-        description="Reads the content of a specified file, constrained to the working directory.",
-        parameters=types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "file_path": types.Schema(
-                    type=types.Type.STRING,
-                    description="The path to the file to read, relative to the working directory.",
-                ),
-            },
-            required=["file_path"],
-        ),
-    )
-
-    schema_run_python_file = types.FunctionDeclaration(
-        name="run_python_file",
-        description="Executes a Python file within the working directory with a 30-second timeout. Captures stdout and stderr.",
-        parameters=types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "file_path": types.Schema(
-                    type=types.Type.STRING,
-                    description="The path to the Python file to execute, relative to the working directory.",
-                ),
-                "args": types.Schema(
-                    type=types.Type.ARRAY,
-                    description="Optional list of string arguments to pass to the Python script.",
-                    items=types.Schema(type=types.Type.STRING),
-                ),
-            },
-            required=["file_path"],
-        ),
-    )
+# Import the function-call dispatcher from your functions directory
+from call_function import AGENT_WORKING_DIRECTORY, AsyncCallBatch
+from history import DEFAULT_TOKEN_BUDGET, ConversationHistory
+from backends import RecordingBackend, ReplayBackend, as_backend
+from context_cache import ContextCachingBackend
+from rate_limit import (
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_REQUESTS_PER_MINUTE,
+    DEFAULT_TOKENS_PER_MINUTE,
+    RateLimitedBackend,
+)
+from response_cache import DEFAULT_TTL_SECONDS, CachingBackend, ResponseCache
+from tool_cache import format_stats, tool_cache
+from registry import registry
+from tracing import span, tracer
+from workspace_index import start_index
+from run_python import (
+    DEFAULT_MAX_CONCURRENT_SCRIPTS,
+    DEFAULT_OUTPUT_CAP_BYTES,
+    configure_limits,
+    configure_output,
+    enable_warm_pool,
+)
 
-    schema_write_file = types.FunctionDeclaration(
-        name="write_file",
-        description="Writes or overwrites content to a file, creating parent directories if necessary, constrained to the working directory.",
-        parameters=types.Schema(
-            type=types.Type.OBJECT,
-            properties={
-                "file_path": types.Schema(
-                    type=types.Type.STRING,
-                    description="The path to the file to write to, relative to the working directory.",
-                ),
-                "content": types.Schema(
-                    type=types.Type.STRING,
-                    description="The content string to write to the file.",
-                ),
-            },
-            required=["file_path", "content"],
-        ),
-    )
+MODEL_NAME = "gemini-2.0-flash-001"
 
-    available_tools = types.Tool(
-        function_declarations=[
-            schema_get_files_info,
-            schema_get_file_content,
-            schema_run_python_file,
-            schema_write_file,
-        ]
-    )
+# Batch mode defaults: concurrent sessions and seconds allowed per session.
+DEFAULT_BATCH_WORKERS = 4
+DEFAULT_SESSION_TIMEOUT = 300.0
 
-    # --- CRITICAL FIX: Further refined system prompt for structured final response ---
-    system_prompt = """
+# --- CRITICAL FIX: Further refined system prompt for structured final response ---
+SYSTEM_PROMPT = """
 You are a helpful AI coding agent.
 
 When a user asks a question or makes a request, your primary goal is to make a direct and relevant function call plan without unnecessary preliminary steps (like listing files if the intent is clearly to act on one). You can perform the following operations:
 
 - List files and directories
-- Read file contents
+- Read file contents (several files at once with `read_files`)
+- Search file contents for a pattern
 - Execute Python files with optional arguments
-- Write or overwrite files
+- Run a file's unittest tests and get per-test results (`run_tests`)
+- Write or overwrite files, or edit part of a file (several files at once with `write_files`)
 
 **IMPORTANT PATH GUIDANCE:** All paths you provide in function calls MUST be relative to the **project root** (the directory where main.py resides).
 
@@ -136,6 +63,8 @@ When a user asks a question or makes a request, your primary goal is to make a d
 - The following files are located directly in the project root: `main.py`, `requirements.txt`, `.env`, `README.md`, `tests.py`, `.gitignore`
 - The `calculator` subdirectory contains files like `main.py`, `README.md`, `tests.py`, and the `pkg` subdirectory (which holds `lorem.txt`, `calculator.py`, and `render.py` within `calculator/pkg/`).
 
+**Finding code:** To find where something is defined or used, call `search_files` once instead of reading candidate files one by one, e.g. `search_files(pattern='def render', directory='calculator')`.
+
 **When analyzing code (e.g., how something is rendered):**
 1.  Start by reading the `main.py` file of the relevant application (e.g., `calculator/main.py`).
 2.  Examine its imports and function calls. If it imports or calls a function related to the task (like a 'render' function), identify the module/file where that function is defined.
@@ -151,111 +80,490 @@ When asked "what files are in the root?", you must provide a comprehensive list
 - To read 'lorem.txt' (which is in 'calculator/'): `get_file_content(file_path='calculator/lorem.txt')`
 - To read 'main.py' (which is in 'calculator/'): `get_file_content(file_path='calculator/main.py')`
 - To read 'pkg/render.py' (which is in 'calculator/pkg/'): `get_file_content(file_path='calculator/pkg/render.py')`
-- To run 'tests.py' (which is in 'calculator/'): `run_python_file(file_path='calculator/tests.py')`
+- To read every Python file of the calculator in one call: `read_files(paths=['calculator/main.py', 'calculator/pkg/*.py'])`
+- To read the next part of a long file after a truncated read: `get_file_content(file_path='calculator/pkg/calculator.py', start_line=200, line_count=100)`
+- To run 'tests.py' (which is in 'calculator/'): `run_tests(file_path='calculator/tests.py')`
 - To run the main project tests.py file: `run_python_file(file_path='tests.py')`
 - To write to 'new_file.txt' in the root: `write_file(file_path='new_file.txt', content='some text')`
 - To write to 'pkg/another_file.txt' (within 'calculator/pkg/'): `write_file(file_path='calculator/pkg/another_file.txt', content='more text')`
+- To change a few lines of an existing file, send only the change: `write_file(file_path='calculator/pkg/render.py', edits='<<<<<<< SEARCH\\n<the exact current lines>\\n=======\\n<the new lines>\\n>>>>>>> REPLACE')`
 
 You do not need to specify the top-level 'working_directory' argument in your function calls, as it is automatically injected for security reasons.
 """
-    # --- END CRITICAL FIX ---
+# --- END CRITICAL FIX ---
+
+# Request config shared by every session and iteration. The tool declarations
+# come from the registry, which generates them from the tool signatures.
+GENERATE_CONTENT_CONFIG = types.GenerateContentConfig(
+    tools=[registry.tool()],
+    system_instruction=SYSTEM_PROMPT,
+    temperature=0.0,
+)
 
-    # Initialize messages list ONLY with the user's initial prompt.
-    messages = [
-        types.Content(role="user", parts=[types.Part(text=user_prompt)]),
-    ]
 
-    # AGENTIC LOOP START
-    for i in range(20):
-        if verbose:
-            print(f"\n--- Agent Iteration {i+1} ---")
-            print(f"Current messages in conversation: {len(messages)}")
-
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-001",
-            contents=messages,
-            config=types.GenerateContentConfig(
-                tools=[available_tools],
-                system_instruction=system_prompt,
-                temperature=0.0,
-            ),
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("prompt", nargs="*")
+    parser.add_argument("--verbose", action="store_true")
+    parser.add_argument(
+        "--history-budget", type=int, default=DEFAULT_TOKEN_BUDGET
+    )  # Estimated prompt tokens of history to resend; 0 disables elision.
+    parser.add_argument("--batch")  # JSONL file of prompts to run concurrently.
+    parser.add_argument("--workers", type=int, default=DEFAULT_BATCH_WORKERS)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_SESSION_TIMEOUT)
+    parser.add_argument("--record")  # Save model requests/responses to a cassette.
+    parser.add_argument("--replay")  # Answer from a cassette instead of the API.
+    parser.add_argument("--trace")  # Write JSON-line spans to a file, or "-" for stderr.
+    parser.add_argument("--index-cache")  # Load/save the workspace index snapshot here.
+    parser.add_argument("--no-index", action="store_true")  # Always read the disk.
+    parser.add_argument(
+        "--warm-python", action="store_true"
+    )  # Run scripts in children of a pre-warmed interpreter.
+    parser.add_argument(
+        "--output-cap", type=int, default=DEFAULT_OUTPUT_CAP_BYTES
+    )  # Bytes of each script output stream kept for the model.
+    parser.add_argument(
+        "--max-scripts", type=int, default=DEFAULT_MAX_CONCURRENT_SCRIPTS
+    )  # Scripts run at once across all sessions; the rest queue.
+    parser.add_argument("--response-cache")  # Reuse model responses stored in this directory.
+    parser.add_argument(
+        "--response-cache-ttl", type=float, default=DEFAULT_TTL_SECONDS
+    )  # Seconds a stored response stays usable.
+    parser.add_argument(
+        "--no-context-cache", action="store_true"
+    )  # Resend the system prompt and tools with every request.
+    parser.add_argument(
+        "--rpm", type=int, default=DEFAULT_REQUESTS_PER_MINUTE
+    )  # Model requests per minute across all sessions; 0 for no limit.
+    parser.add_argument(
+        "--tpm", type=int, default=DEFAULT_TOKENS_PER_MINUTE
+    )  # Prompt tokens per minute across all sessions; 0 for no limit.
+    parser.add_argument(
+        "--max-retries", type=int, default=DEFAULT_MAX_RETRIES
+    )  # Retries of a model call after a 429, 5xx or network error.
+    args = parser.parse_args()
+
+    verbose = args.verbose
+    prompt_parts = args.prompt
+
+    if not prompt_parts and not args.batch:
+        print("AI Code Assistant")
+        print(
+            '\nUsage: python main.py "your prompt here" [--verbose] [--history-budget TOKENS]'
+        )
+        print(
+            "       python main.py --batch prompts.jsonl [--workers N] [--timeout SECONDS]"
         )
+        print(
+            "       (either form also takes --record CASSETTE, --replay CASSETTE, --trace FILE|-)"
+        )
+        print(
+            "       (and --index-cache FILE to persist the workspace index, or --no-index,"
+        )
+        print("        --warm-python to run scripts from a pre-warmed interpreter,")
+        print("        --output-cap BYTES to limit the script output kept per stream,")
+        print("        --max-scripts N to limit how many scripts run at once,")
+        print("        --response-cache DIR [--response-cache-ttl SECONDS] to reuse")
+        print("        responses to identical requests, --no-context-cache to resend")
+        print("        the system prompt and tools instead of caching them, and")
+        print("        --rpm N, --tpm N and --max-retries N to pace and retry model calls)")
+        print('Example: python main.py "How do I build a calculator app?"')
+        sys.exit(1)
 
-        if verbose:
-            prompt_token_info = (
-                f"Prompt tokens: {response.usage_metadata.prompt_token_count}"
+    if args.trace:
+        tracer.configure(args.trace)
+
+    # Index the workspace in the background while the first model call is in flight.
+    if not args.no_index:
+        start_index(AGENT_WORKING_DIRECTORY, snapshot_path=args.index_cache)
+
+    # Echo script output as it arrives in verbose single-prompt runs; batch
+    # sessions would interleave on the console.
+    configure_output(output_cap_bytes=args.output_cap, live_output=verbose and not args.batch)
+    configure_limits(max_concurrent=args.max_scripts)
+
+    if args.warm_python:
+        try:
+            enable_warm_pool()
+        except OSError as e:
+            print(f"Warning: {e}; running scripts in fresh interpreters.", file=sys.stderr)
+
+    rate_limiter = None
+    if args.replay:
+        # Replayed sessions never reach the network, so no API key is needed.
+        client = ReplayBackend(args.replay)
+    else:
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            print(
+                "Error: GEMINI_API_KEY environment variable not set.", file=sys.stderr
             )
-            response_token_info = (
-                f"Response tokens: {response.usage_metadata.candidates_token_count}"
+            sys.exit(1)
+
+        client = genai.Client(api_key=api_key)
+        # Every session's model calls share one set of rate budgets.
+        rate_limiter = RateLimitedBackend(
+            client,
+            requests_per_minute=args.rpm,
+            tokens_per_minute=args.tpm,
+            max_retries=args.max_retries,
+        )
+        if args.no_context_cache:
+            client = rate_limiter
+        else:
+            # The system prompt and tool declarations are uploaded once and
+            # referenced by every request; deleted again when the process exits.
+            client = ContextCachingBackend(client, inner=rate_limiter)
+            atexit.register(client.close)
+        if args.record:
+            client = RecordingBackend(client, args.record)
+
+    response_cache = None
+    if args.response_cache:
+        response_cache = ResponseCache(
+            args.response_cache,
+            ttl_seconds=args.response_cache_ttl,
+            working_directory=AGENT_WORKING_DIRECTORY,
+        )
+        client = CachingBackend(client, response_cache)
+
+    if args.batch:
+        asyncio.run(
+            run_batch(
+                client,
+                args.batch,
+                workers=args.workers,
+                timeout=args.timeout,
+                history_budget=args.history_budget,
             )
-            print(prompt_token_info)
-            print(response_token_info)
-
-        if not (
-            response.candidates
-            and response.candidates[0].content
-            and response.candidates[0].content.parts
-        ):
-            print("\nFinal response:")
-            print("No valid response content received from the AI (breaking loop).")
-            break
+        )
+    else:
+        user_prompt = " ".join(prompt_parts)
 
-        model_response_content = response.candidates[0].content
-        messages.append(model_response_content)
+        process_ai_interaction(
+            client, user_prompt, verbose, history_budget=args.history_budget
+        )
 
-        has_function_call_this_turn = False
-        final_text_response_content = None
+        if verbose and response_cache is not None:
+            stats = response_cache.stats()
+            print(
+                f"Response cache: {stats['hits']} hits, {stats['misses']} misses, "
+                f"{stats['invalidations']} invalidated"
+            )
+
+    if verbose and rate_limiter is not None:
+        # Batch results go to stdout as JSON lines, so this goes to stderr.
+        stats = rate_limiter.stats()
+        print(
+            f"Rate limiter: {stats['calls']} calls, {stats['retries']} retries, "
+            f"{stats['throttle_seconds']}s throttled, {stats['backoff_seconds']}s "
+            f"backing off, queue depth peaked at {stats['max_queue_depth']}",
+            file=sys.stderr,
+        )
+
+
+def process_ai_interaction(
+    client,
+    user_prompt: str,
+    verbose: bool,
+    history_budget: int = DEFAULT_TOKEN_BUDGET,
+):
+    """Synchronous entry point; runs the async agent loop to completion."""
+    return asyncio.run(
+        process_ai_interaction_async(
+            client, user_prompt, verbose, history_budget=history_budget
+        )
+    )
 
-        for part in model_response_content.parts:
-            if part.function_call:
-                has_function_call_this_turn = True
 
-                print(f" - Calling function: {part.function_call.name}")
+async def process_ai_interaction_async(
+    client,
+    user_prompt: str,
+    verbose: bool,
+    history_budget: int = DEFAULT_TOKEN_BUDGET,
+    quiet: bool = False,
+):
+    """
+    Runs one agent session for user_prompt.
+
+    Args:
+        client: A genai.Client (its async API is used for streaming) or any
+                model backend from backends.py.
+        user_prompt: The user's request.
+        verbose: If True, prints iteration, token and cache details.
+        history_budget: Estimated prompt-token budget for the history.
+        quiet: If True, prints nothing (used by batch mode).
+
+    Returns:
+        A dict with the final response text (or None), the session status,
+        the number of iterations and the prompt/response token totals
+        (cached_tokens counts the prompt tokens served from a context cache).
+    """
+    emit = _silent if quiet else print
+    backend = as_backend(client)
+    result = {
+        "status": "max_iterations",
+        "final_response": None,
+        "iterations": 0,
+        "prompt_tokens": 0,
+        "response_tokens": 0,
+        "cached_tokens": 0,
+    }
 
-                function_call_result = call_function(
-                    part.function_call, verbose=verbose
+    if verbose:
+        emit(f"User prompt: {user_prompt}\n")
+
+    # Initialize the history ONLY with the user's initial prompt.
+    # It compacts stale tool results before each request to stay within budget.
+    history = ConversationHistory(token_budget=history_budget)
+    history.append(types.Content(role="user", parts=[types.Part(text=user_prompt)]))
+    cache_stats_at_start = tool_cache.stats()
+
+    # AGENTIC LOOP START
+    for i in range(20):
+        result["iterations"] = i + 1
+        if verbose:
+            emit(f"\n--- Agent Iteration {i+1} ---")
+            emit(f"Current messages in conversation: {len(history)}")
+
+        # Stream the response so text shows up as soon as it is generated and
+        # function calls start running the moment their part arrives.
+        stream = backend.generate_stream(
+            MODEL_NAME, history.contents(), GENERATE_CONTENT_CONFIG
+        )
+
+        usage_metadata = None
+        model_parts = []
+        text_chunks = []
+        final_text_response_content = None
+        pending_calls = AsyncCallBatch(verbose=verbose)
+
+        # If the stream fails or the session is cancelled (e.g. by a batch
+        # timeout), don't leave this turn's calls running behind the error.
+        try:
+
+            with span("model_call", iteration=i + 1, messages=len(history)) as model_span:
+                async for chunk in stream:
+                    if chunk.usage_metadata:
+                        usage_metadata = chunk.usage_metadata
+
+                    if not (
+                        chunk.candidates
+                        and chunk.candidates[0].content
+                        and chunk.candidates[0].content.parts
+                    ):
+                        continue
+
+                    for part in chunk.candidates[0].content.parts:
+                        if part.function_call:
+                            # Close off any text streamed before this call.
+                            if text_chunks:
+                                model_parts.append(types.Part(text="".join(text_chunks)))
+                                text_chunks = []
+                                emit()
+                            model_parts.append(part)
+
+                            emit(f" - Calling function: {part.function_call.name}")
+                            pending_calls.submit(part.function_call)
+
+                        elif part.text:
+                            text_chunks.append(part.text)
+                            emit(part.text, end="", flush=True)
+
+                if usage_metadata:
+                    model_span.set(
+                        prompt_tokens=usage_metadata.prompt_token_count,
+                        response_tokens=usage_metadata.candidates_token_count,
+                        cached_tokens=usage_metadata.cached_content_token_count or 0,
+                    )
+
+            if text_chunks:
+                final_text_response_content = "".join(text_chunks)
+                model_parts.append(types.Part(text=final_text_response_content))
+                emit()
+
+            if usage_metadata:
+                result["prompt_tokens"] += usage_metadata.prompt_token_count or 0
+                result["response_tokens"] += usage_metadata.candidates_token_count or 0
+                result["cached_tokens"] += usage_metadata.cached_content_token_count or 0
+
+            if verbose and usage_metadata:
+                prompt_token_info = f"Prompt tokens: {usage_metadata.prompt_token_count}"
+                if usage_metadata.cached_content_token_count:
+                    prompt_token_info += (
+                        f" ({usage_metadata.cached_content_token_count} from the context cache)"
+                    )
+                response_token_info = (
+                    f"Response tokens: {usage_metadata.candidates_token_count}"
                 )
+                emit(prompt_token_info)
+                emit(response_token_info)
+
+            if not model_parts:
+                emit("\nFinal response:")
+                emit("No valid response content received from the AI (breaking loop).")
+                result["status"] = "no_response"
+                break
+
+            history.append(types.Content(role="model", parts=model_parts))
 
-                if not (
-                    function_call_result.parts
-                    and function_call_result.parts[0].function_response
-                    and function_call_result.parts[0].function_response.response
-                ):
+            has_function_call_this_turn = len(pending_calls) > 0
+
+            if has_function_call_this_turn:
+                # Wait for every call the model planned this turn and hand all the
+                # results back in a single tool message.
+                with span("tool_batch", iteration=i + 1, calls=len(pending_calls)):
+                    function_call_result = await pending_calls.gather()
+
+                if len(function_call_result.parts) != len(pending_calls):
                     raise RuntimeError(
                         f"Unexpected function call result format: {function_call_result}"
                     )
 
-                result_content = function_call_result.parts[
-                    0
-                ].function_response.response
+                for result_part in function_call_result.parts:
+                    if not (
+                        result_part.function_response
+                        and result_part.function_response.response
+                    ):
+                        raise RuntimeError(
+                            f"Unexpected function call result format: {function_call_result}"
+                        )
 
-                if verbose:
-                    print(f"-> {result_content}")
-                else:
-                    print(result_content)
+                    result_content = result_part.function_response.response
 
-                messages.append(function_call_result)
-                break
+                    if verbose:
+                        emit(f"-> {result_content}")
+                    else:
+                        emit(result_content)
 
-            elif part.text:
-                final_text_response_content = part.text
-                if not verbose and not has_function_call_this_turn:
-                    print(part.text)
+                history.append(function_call_result)
+        finally:
+            await pending_calls.cancel()
 
         if not has_function_call_this_turn:
-            print("\nFinal response:")
+            result["status"] = "completed"
+            result["final_response"] = final_text_response_content
+            emit("\nFinal response:")
             if final_text_response_content:
-                print(final_text_response_content)
+                emit(final_text_response_content)
             else:
-                print("Agent finished without a clear text response.")
+                emit("Agent finished without a clear text response.")
             break
 
     else:
-        print("\nMax iterations (20) reached. Agent stopped without concluding.")
+        emit("\nMax iterations (20) reached. Agent stopped without concluding.")
+        messages = history.messages
         if messages and messages[-1].parts and messages[-1].parts[0].text:
-            print(f"Last message from agent: {messages[-1].parts[0].text}")
+            emit(f"Last message from agent: {messages[-1].parts[0].text}")
         else:
-            print("No final text response from agent at max iterations.")
+            emit("No final text response from agent at max iterations.")
+
+    if verbose:
+        emit(
+            f"History compaction saved ~{history.tokens_saved} prompt tokens this run "
+            f"(history now ~{history.sent_tokens} of ~{history.raw_tokens} tokens)."
+        )
+        emit(format_stats(cache_stats_at_start, tool_cache.stats()))
+        if result["cached_tokens"]:
+            emit(
+                f"Context cache served {result['cached_tokens']} of "
+                f"{result['prompt_tokens']} prompt tokens this run "
+                f"({100 * result['cached_tokens'] // max(result['prompt_tokens'], 1)}%)."
+            )
+
+    return result
+
+
+def _silent(*args, **kwargs):
+    pass
+
+
+def _read_batch_prompts(path):
+    """
+    Yields (id, prompt) pairs from a JSONL file.
+
+    Each line is either a JSON string or an object with a "prompt" field. Objects
+    in the backlog format ({"request_id", "title", "body"}) are accepted too, with
+    the body used as the prompt. Ids default to the line number. Lines that are
+    not valid JSON yield a None prompt so the session is reported as an error.
+    """
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                yield str(line_number), None
+                continue
+            if isinstance(record, str):
+                yield str(line_number), record
+                continue
+            prompt = record.get("prompt") or record.get("body") or record.get("text")
+            prompt_id = record.get("id") or record.get("request_id") or line_number
+            yield str(prompt_id), prompt
+
+
+async def run_batch(
+    client,
+    prompts_path: str,
+    workers: int = DEFAULT_BATCH_WORKERS,
+    timeout: float = DEFAULT_SESSION_TIMEOUT,
+    history_budget: int = DEFAULT_TOKEN_BUDGET,
+    out=sys.stdout,
+):
+    """
+    Runs every prompt in a JSONL file as its own agent session.
+
+    Sessions share the client but each keeps its own history. At most `workers`
+    sessions run at once, and a session that takes longer than `timeout`
+    seconds is cancelled and reported as timed out. One JSON line per session is
+    written to `out` as soon as that session finishes, so results arrive in
+    completion order rather than input order.
+    """
+    slots = asyncio.Semaphore(workers)
+    tasks = []
+
+    async def run_session(prompt_id, prompt):
+        started = time.perf_counter()
+        record = {"id": prompt_id}
+        try:
+            if not prompt:
+                raise ValueError("no prompt found on this line")
+            record.update(
+                await asyncio.wait_for(
+                    process_ai_interaction_async(
+                        client,
+                        prompt,
+                        verbose=False,
+                        history_budget=history_budget,
+                        quiet=True,
+                    ),
+                    timeout,
+                )
+            )
+        except asyncio.TimeoutError:
+            record["status"] = "timeout"
+            record["error"] = f"Session exceeded {timeout:g} seconds"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            slots.release()
+
+        record["latency_seconds"] = round(time.perf_counter() - started, 3)
+        out.write(json.dumps(record) + "\n")
+        out.flush()
+
+    # Wait for a free slot before starting each session, so a large file never
+    # has more than `workers` sessions (and their histories) in memory at once.
+    for prompt_id, prompt in _read_batch_prompts(prompts_path):
+        await slots.acquire()
+        tasks.append(asyncio.create_task(run_session(prompt_id, prompt)))
+
+    await asyncio.gather(*tasks)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,229 @@
+import asyncio
+import random
+import threading
+import time
+
+import httpx
+from google.genai import errors
+
+from backends import as_backend
+from history import estimate_prefix_tokens, estimate_tokens
+from tracing import span
+
+# Default budgets; Gemini's free tier allows 15 requests and 1M input tokens
+# a minute for gemini-2.0-flash. 0 disables a budget.
+DEFAULT_REQUESTS_PER_MINUTE = 15
+DEFAULT_TOKENS_PER_MINUTE = 1_000_000
+
+# How much of a budget can be spent at once, in seconds' worth of its rate.
+DEFAULT_BURST_SECONDS = 60.0
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY_SECONDS = 1.0
+DEFAULT_MAX_DELAY_SECONDS = 60.0
+
+# Request timeout, rate limit and transient server errors.
+RETRYABLE_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `per_minute` tokens a minute, holding
+    at most `capacity`.
+
+    Callers reserve tokens up front and sleep for the returned wait, so the
+    bucket can go into debt and later callers queue behind earlier ones in the
+    order they reserved.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, capacity if capacity is not None else per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Takes `amount` tokens; returns the seconds to wait before spending them."""
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._blocked_until - now)
+
+    def refund(self, amount):
+        """Returns tokens reserved but not used; a negative amount charges extra."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def hold(self, seconds):
+        """Makes every reservation wait at least `seconds` from now."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from a Retry-After header or a RetryInfo detail."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        pass
+
+    body = error.details if isinstance(getattr(error, "details", None), dict) else {}
+    for detail in (body.get("error") or {}).get("details") or []:
+        delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+        if isinstance(delay, str) and delay.endswith("s"):
+            try:
+                return float(delay[:-1])
+            except ValueError:
+                pass
+    return None
+
+
+def is_retryable(error):
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_CODES
+    return isinstance(error, httpx.TransportError)
+
+
+def request_tokens(contents, config):
+    """Estimated prompt tokens of a request, including the system instruction and tools."""
+    tokens = sum(estimate_tokens(content) for content in contents)
+    if config is not None:
+        tokens += estimate_prefix_tokens(config.system_instruction, config.tools)
+    return tokens
+
+
+class RateLimitedBackend:
+    """
+    Keeps model calls within requests-per-minute and tokens-per-minute budgets
+    and retries the ones that fail transiently.
+
+    One instance is shared by every session in the process, so concurrent
+    sessions draw on the same buckets. Token costs are estimated before a
+    request and corrected from its usage metadata afterwards. Retryable
+    errors (429, 5xx, network failures) are retried up to `max_retries` times
+    with jittered exponential backoff, or after the delay the server asked
+    for; a 429 also holds back every other session for that long. A request
+    is only retried if it failed before streaming its first chunk.
+    """
+
+    def __init__(
+        self,
+        inner,
+        requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+        tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+        burst_seconds=DEFAULT_BURST_SECONDS,
+        max_retries=DEFAULT_MAX_RETRIES,
+        base_delay=DEFAULT_BASE_DELAY_SECONDS,
+        max_delay=DEFAULT_MAX_DELAY_SECONDS,
+    ):
+        self.inner = as_backend(inner)
+        self.requests = None
+        self.tokens = None
+        if requests_per_minute:
+            self.requests = TokenBucket(
+                requests_per_minute, requests_per_minute * burst_seconds / 60
+            )
+        if tokens_per_minute:
+            self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.throttle_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+    async def _wait(self, seconds, reason):
+        # Time spent here, waiting for budget or backing off, is queue time.
+        with self._lock:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            depth = self.queue_depth
+        started = time.perf_counter()
+        try:
+            with span(f"rate_limit.{reason}", seconds=round(seconds, 3), queue_depth=depth):
+                await asyncio.sleep(seconds)
+        finally:
+            waited = time.perf_counter() - started
+            with self._lock:
+                self.queue_depth -= 1
+                if reason == "throttle":
+                    self.throttle_seconds += waited
+                else:
+                    self.backoff_seconds += waited
+
+    async def _acquire(self, estimated_tokens):
+        waits = [0.0]
+        if self.requests:
+            waits.append(self.requests.reserve(1))
+        if self.tokens:
+            waits.append(self.tokens.reserve(estimated_tokens))
+        if max(waits) > 0:
+            await self._wait(max(waits), "throttle")
+
+    def _backoff(self, attempt, error):
+        hint = retry_after(error)
+        if hint is not None:
+            # Jitter keeps sessions told the same delay from retrying together.
+            return hint + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    async def generate_stream(self, model, contents, config):
+        estimated_tokens = request_tokens(contents, config)
+        attempt = 0
+        while True:
+            await self._acquire(estimated_tokens)
+            with self._lock:
+                self.calls += 1
+
+            started = False
+            usage_metadata = None
+            try:
+                async for chunk in self.inner.generate_stream(model, contents, config):
+                    started = True
+                    if chunk.usage_metadata:
+                        usage_metadata = chunk.usage_metadata
+                    yield chunk
+            except (errors.APIError, httpx.TransportError) as e:
+                if not started and self.tokens:
+                    # Nothing was generated, so the prompt wasn't charged.
+                    self.tokens.refund(estimated_tokens)
+                if started or attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                if getattr(e, "code", None) == 429 and self.requests:
+                    self.requests.hold(delay)
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                await self._wait(delay, "backoff")
+                continue
+
+            if self.tokens and usage_metadata and usage_metadata.prompt_token_count:
+                self.tokens.refund(estimated_tokens - usage_metadata.prompt_token_count)
+            return
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "throttle_seconds": round(self.throttle_seconds, 3),
+                "backoff_seconds": round(self.backoff_seconds, 3),
+            }
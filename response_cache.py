@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from google.genai import types
+
+from backends import _dump, _dump_request, as_backend
+from tracing import span
+
+# Default upper bound on the total size of the cache directory, in bytes.
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Default age after which a cached response is no longer served, in seconds.
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+
+# Function-call arguments that name paths in the working directory.
+PATH_ARGUMENTS = ("file_path", "directory")
+
+
+def request_key(model, contents, config):
+    """sha256 of everything that decides a response: model, system instruction, tools and messages."""
+    request = _dump_request(model, contents, config)
+    encoded = json.dumps(request, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def _fingerprint(abs_path):
+    """(mtime_ns, size) of a path, or None if it doesn't exist."""
+    try:
+        stat_result = os.stat(abs_path)
+    except OSError:
+        return None
+    return [stat_result.st_mtime_ns, stat_result.st_size]
+
+
+def fingerprint_files(paths):
+    """Maps each path to its current (mtime_ns, size) fingerprint."""
+    return {path: _fingerprint(path) for path in paths}
+
+
+def referenced_paths(contents, working_directory="."):
+    """Absolute paths named by the function calls in a conversation."""
+    paths = set()
+    for content in contents:
+        for part in content.parts or []:
+            if not part.function_call:
+                continue
+            args = part.function_call.args or {}
+            names = [args[name] for name in PATH_ARGUMENTS if isinstance(args.get(name), str)]
+            names += [p for p in args.get("paths") or [] if isinstance(p, str)]
+            names += [
+                f.get("file_path")
+                for f in args.get("files") or []
+                if isinstance(f, dict) and isinstance(f.get("file_path"), str)
+            ]
+            for name in names:
+                # A glob stands for the directory it starts from.
+                static = name.split("*")[0].split("?")[0].split("[")[0]
+                paths.add(os.path.abspath(os.path.join(working_directory, static or ".")))
+    return sorted(paths)
+
+
+class ResponseCache:
+    """
+    On-disk cache of streamed model responses, one JSON file per request.
+
+    An entry is served only while it is younger than `ttl_seconds` and every
+    file referenced by the conversation's function calls still has the
+    mtime and size it had when the entry was recorded; history compaction can
+    elide the tool results themselves, so the request alone doesn't prove the
+    files are unchanged. When the directory grows past `max_bytes`, the least
+    recently used entries are deleted.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_bytes=DEFAULT_MAX_BYTES,
+        ttl_seconds=DEFAULT_TTL_SECONDS,
+        working_directory=".",
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.working_directory = working_directory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key):
+        """Returns the cached response chunks for a key, or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        stale = time.time() - entry["created"] > self.ttl_seconds or any(
+            _fingerprint(file_path) != fingerprint
+            for file_path, fingerprint in entry["files"].items()
+        )
+        with self._lock:
+            if stale:
+                self.misses += 1
+                self.invalidations += 1
+            else:
+                self.hits += 1
+        if stale:
+            self._remove(path)
+            return None
+
+        # Touch the entry so eviction sees it as recently used.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["chunks"]
+
+    def put(self, key, chunks, files):
+        """
+        Stores response chunks with `files`, the fingerprint_files() of the
+        referenced files taken when the request was made.
+        """
+        entry = {
+            "created": time.time(),
+            "files": files,
+            "chunks": chunks,
+        }
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for root, _dirs, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat_result = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat_result.st_mtime, stat_result.st_size, path))
+                total += stat_result.st_size
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+class CachingBackend:
+    """
+    Serves repeated requests from a ResponseCache and records new ones.
+
+    Only complete streams are stored, so an interrupted response is fetched
+    again next time.
+    """
+
+    def __init__(self, inner, cache):
+        self.inner = as_backend(inner)
+        self.cache = cache
+
+    async def generate_stream(self, model, contents, config):
+        key = request_key(model, contents, config)
+        with span("response_cache.lookup") as lookup_span:
+            cached = self.cache.get(key)
+            lookup_span.set(hit=cached is not None)
+        if cached is not None:
+            for chunk in cached:
+                yield types.GenerateContentResponse.model_validate(chunk)
+            return
+
+        # Fingerprint before asking the model: a file changed while the
+        # response streams in must invalidate it, not be recorded as its input.
+        files = fingerprint_files(referenced_paths(contents, self.cache.working_directory))
+        chunks = []
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            chunks.append(_dump(chunk))
+            yield chunk
+        self.cache.put(key, chunks, files)
@@ -54,3 +54,961 @@ print(
 result4 = run_python_file(current_project_root, "calculator/nonexistent.py")
 print(result4)
 print("\n" + "=" * 50 + "\n")  # Separator
+
+import asyncio
+
+from google.genai import types
+from call_function import AsyncCallBatch
+
+
+async def run_turn(calls):
+    """Runs one model turn's function calls through an AsyncCallBatch."""
+    batch = AsyncCallBatch()
+    for call in calls:
+        batch.submit(call)
+    return await batch.gather()
+
+
+print(
+    "--- Running Test Case 5: AsyncCallBatch with several calls in one turn ---"
+)
+# Expected: Three function responses, in the order requested. The two listings run
+# concurrently; the read of calculator/main.py returns its source.
+result5 = asyncio.run(
+    run_turn(
+        [
+            types.FunctionCall(name="get_files_info", args={"directory": "."}),
+            types.FunctionCall(name="get_files_info", args={"directory": "calculator"}),
+            types.FunctionCall(
+                name="get_file_content", args={"file_path": "calculator/main.py"}
+            ),
+        ]
+    )
+)
+for part in result5.parts:
+    print(f"{part.function_response.name}: {str(part.function_response.response)[:80]}")
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from history import ConversationHistory
+
+print("--- Running Test Case 6: ConversationHistory deduplicates repeated reads ---")
+# Expected: The first read of calculator/main.py is replaced by a "[Superseded: ...]"
+# stub once the same file is read again; the second read is sent verbatim.
+history = ConversationHistory(token_budget=0)
+for _ in range(2):
+    read_call = types.FunctionCall(
+        name="get_file_content", args={"file_path": "calculator/main.py"}
+    )
+    history.append(types.Content(role="model", parts=[types.Part(function_call=read_call)]))
+    history.append(asyncio.run(run_turn([read_call])))
+for content in history.contents():
+    if content.role == "tool":
+        print(f"tool: {str(content.parts[0].function_response.response)[:70]}")
+print(f"Tokens saved: {history.tokens_saved}")
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 7: run_python_file(current_project_root, 'calculator/main.py', ['3 + 5']) ---"
+)
+# Expected: The args reach the script, so the calculator renders 3 + 5 = 8 in a box.
+result7 = run_python_file(current_project_root, "calculator/main.py", ["3 + 5"])
+print(result7)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from tracing import tracer
+
+print("--- Running Test Case 8: tracer hook receives tool spans ---")
+# Expected: A tool_call span for get_file_content, preceded by its resolve_path and
+# read phase spans, each with a duration.
+collected_spans = []
+tracer.add_hook(collected_spans.append)
+asyncio.run(
+    run_turn(
+        [types.FunctionCall(name="get_file_content", args={"file_path": "calculator/tests.py"})]
+    )
+)
+for record in collected_spans:
+    print(f"{record['name']}: {record['attributes']}")
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from get_files_info import get_files_info
+
+print(
+    "--- Running Test Case 9: get_files_info(current_project_root, 'calculator', recursive=True, include=['*.py']) ---"
+)
+# Expected: Every .py file under calculator/ with paths relative to it, plus the pkg
+# directory itself; __pycache__ directories are pruned.
+result9 = get_files_info(
+    current_project_root, "calculator", recursive=True, include=["*.py"]
+)
+print(result9)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+import tempfile
+from write_file import write_file
+from workspace_index import start_index
+
+print("--- Running Test Case 10: workspace index sees the agent's own writes ---")
+# Expected: The index is ready, the written file is listed with its line count and
+# hash, and the listing served from the index matches the file on disk.
+index_root = tempfile.mkdtemp()
+workspace_index = start_index(index_root)
+workspace_index.ready.wait(timeout=10)
+print(write_file(index_root, "notes/todo.txt", "one\ntwo\nthree"))
+entry = workspace_index.lookup(os.path.join(index_root, "notes", "todo.txt"))
+print(f"size={entry.size}, lines={entry.line_count}, has_hash={entry.sha1 is not None}")
+print(get_files_info(index_root, recursive=True))
+workspace_index.stop()
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from search_files import search_files
+
+print(
+    "--- Running Test Case 11: search_files(current_project_root, 'def render', directory='calculator', context_lines=1) ---"
+)
+# Expected: The render function's definition in calculator/pkg/render.py as
+# 'path:line: text', with one line of context on either side ('path-line- text').
+result11 = search_files(
+    current_project_root, "def render", directory="calculator", context_lines=1
+)
+print(result11)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 12: search_files(current_project_root, '(', directory='../', literal=True) ---")
+# Expected: Error: Cannot search "../" as it is outside the permitted working directory
+print(search_files(current_project_root, "(", directory="../", literal=True))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from get_file_content import get_file_content
+
+print(
+    "--- Running Test Case 13: get_file_content(current_project_root, 'calculator/pkg/calculator.py', start_line=3, line_count=4) ---"
+)
+# Expected: A '[File ...: lines 3-6 of N, bytes A-B of M]' header followed by exactly
+# those four lines of calculator.py.
+result13 = get_file_content(
+    current_project_root, "calculator/pkg/calculator.py", start_line=3, line_count=4
+)
+print(result13)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 14: write_file with SEARCH/REPLACE edits, then a conflicting edit ---")
+# Expected: The first edit succeeds with a '+1 -1 lines' summary and a short diff;
+# the second fails because its SEARCH text is no longer in the file, and the file
+# keeps the first edit.
+print(write_file(index_root, "notes/todo.txt", "one\ntwo\nthree\n"))
+print(
+    write_file(
+        index_root,
+        "notes/todo.txt",
+        edits="<<<<<<< SEARCH\ntwo\n=======\n2\n>>>>>>> REPLACE",
+    )
+)
+print(
+    write_file(
+        index_root,
+        "notes/todo.txt",
+        edits="<<<<<<< SEARCH\ntwo\n=======\nTWO\n>>>>>>> REPLACE",
+    )
+)
+print(get_file_content(index_root, "notes/todo.txt"))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from read_files import read_files
+from write_files import write_files
+
+print(
+    "--- Running Test Case 15: read_files(current_project_root, ['calculator/main.py', 'calculator/pkg/*.py', 'missing.py']) ---"
+)
+# Expected: One result per file in order -- main.py, then the pkg/*.py matches
+# sorted by name -- each with its character count, and an error for missing.py.
+for file_result in read_files(
+    current_project_root, ["calculator/main.py", "calculator/pkg/*.py", "missing.py"]
+):
+    if "content" in file_result:
+        print(f"{file_result['path']}: {len(file_result['content'])} characters")
+    else:
+        print(f"{file_result['path']}: {file_result.get('error') or file_result.get('skipped')}")
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 16: write_files is all-or-nothing ---")
+# Expected: Both files fail (one with a SEARCH conflict, the other as not written),
+# and notes/todo.txt keeps its previous content.
+for file_result in write_files(
+    index_root,
+    [
+        {"file_path": "notes/todo.txt", "content": "replaced\n"},
+        {"file_path": "notes/done.txt", "edits": "<<<<<<< SEARCH\nx\n=======\ny\n>>>>>>> REPLACE"},
+    ],
+):
+    print(f"{file_result['path']}: {file_result.get('error') or file_result.get('result')}")
+print(get_file_content(index_root, "notes/todo.txt"))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+from run_python import enable_warm_pool
+
+print(
+    "--- Running Test Case 17: run_python_file(current_project_root, 'calculator/main.py', ['3 + 5']) in the warm pool ---"
+)
+# Expected: The same output as Test Case 7, produced by a child of the warm
+# interpreter instead of a fresh one.
+enable_warm_pool()
+print(run_python_file(current_project_root, "calculator/main.py", ["3 + 5"]))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 18: run_python_file on a script printing ~1 MB, with a 4 KB cap ---"
+)
+# Expected: The first and last 2048 bytes of stdout, a "[... N bytes dropped ...]"
+# marker between them, and a summary line counting the dropped bytes.
+from run_python import configure_output
+
+print(
+    write_file(
+        index_root,
+        "noisy.py",
+        "for i in range(100000):\n    print(f'line {i:06d}')\n",
+    )
+)
+configure_output(output_cap_bytes=4096)
+noisy_output = run_python_file(index_root, "noisy.py")
+configure_output(output_cap_bytes=32 * 1024)
+print(noisy_output[:60] + "\n...\n" + noisy_output[-260:])
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 19: run_python_file with timeout=1 on a script that sleeps ---"
+)
+# Expected: "Error: Process timed out after 1 seconds." followed by the output
+# printed before the timeout.
+print(
+    write_file(
+        index_root,
+        "slow.py",
+        "import time\nprint('started', flush=True)\ntime.sleep(10)\n",
+    )
+)
+print(run_python_file(index_root, "slow.py", timeout=1))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 20: run_python_file on a CPU-bound script with a 1-second CPU limit ---"
+)
+# Expected: "Process killed by SIGXCPU", then the queue wait and run time.
+from run_python import DEFAULT_LIMITS, configure_limits
+
+print(write_file(index_root, "spin.py", "while True:\n    pass\n"))
+configure_limits(RLIMIT_CPU=1)
+print(run_python_file(index_root, "spin.py"))
+configure_limits(RLIMIT_CPU=DEFAULT_LIMITS["RLIMIT_CPU"])
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 21: run_tests(current_project_root, 'calculator/tests.py'), twice ---"
+)
+# Expected: every test passed, 0 failed, each test listed with its status and duration;
+# the second run is served from the cache ("cached": True) because neither the
+# test file nor the calculator sources it imports changed.
+from run_tests import run_tests
+
+first_run = run_tests(current_project_root, "calculator/tests.py")
+print({name: value for name, value in first_run.items() if name != "tests"})
+for test in first_run["tests"]:
+    print(f"  {test['name']}: {test['status']}")
+print("cached on second run:", run_tests(current_project_root, "calculator/tests.py")["cached"])
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 22: CachingBackend serves a repeated request from disk ---"
+)
+# Expected: the scripted model is called once for two identical requests
+# (1 hit, 1 miss); after notes/todo.txt, which a function call in the
+# conversation names, changes, the entry is invalidated and the model is
+# called again.
+import asyncio
+
+from google.genai import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from backends import ScriptedBackend
+from response_cache import CachingBackend, ResponseCache
+
+scripted = ScriptedBackend(
+    [
+        [{"call": "get_file_content", "args": {"file_path": "notes/todo.txt"}}],
+        [{"text": "The notes list three items."}],
+    ]
+)
+response_cache = ResponseCache(tempfile.mkdtemp(), working_directory=index_root)
+cached_backend = CachingBackend(scripted, response_cache)
+conversation = [
+    types.Content(role="user", parts=[types.Part(text="What is in the notes?")]),
+    types.Content(
+        role="model",
+        parts=[
+            types.Part(
+                function_call=types.FunctionCall(
+                    name="get_file_content", args={"file_path": "notes/todo.txt"}
+                )
+            )
+        ],
+    ),
+]
+
+
+async def ask():
+    chunks = [
+        chunk async for chunk in cached_backend.generate_stream("model", conversation, None)
+    ]
+    return chunks[0].candidates[0].content.parts[0].text
+
+
+print(asyncio.run(ask()), asyncio.run(ask()), "model calls:", scripted.calls)
+print(response_cache.stats())
+print(write_file(index_root, "notes/todo.txt", "one\ntwo\nthree\nfour\n"))
+print(asyncio.run(ask()), "model calls:", scripted.calls)
+print(response_cache.stats())
+
+
+# Expected: the file changes while the response streams in, so the stored
+# entry records the file as it was when asked and the next request misses.
+class EditDuringStreamBackend:
+    def __init__(self, inner):
+        self.inner = inner
+
+    async def generate_stream(self, model, contents, config):
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            yield chunk
+        with open(os.path.join(index_root, "notes", "todo.txt"), "a") as f:
+            f.write("five\n")
+
+
+response_cache = ResponseCache(tempfile.mkdtemp(), working_directory=index_root)
+cached_backend = CachingBackend(EditDuringStreamBackend(scripted), response_cache)
+asyncio.run(ask())
+asyncio.run(ask())
+print("edited while streaming:", response_cache.stats())
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 23: ContextCachingBackend against a token-counting fake client ---"
+)
+# Expected: with caching, the system prompt and tool declarations are sent once
+# (1 cache created) and every request reports them as cached tokens, so the
+# cached run bills far fewer uncached prompt tokens than the plain run. When the
+# fake refuses the cache (prefix too small), requests fall back to the full
+# prefix and still get answered, with 0 cached tokens.
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from google.genai import errors
+
+from backends import as_backend
+from context_cache import ContextCachingBackend
+from history import estimate_prefix_tokens, estimate_tokens
+from registry import registry
+
+
+def _api_error(code, status, message, details=None):
+    """An APIError shaped like the ones google-genai raises for Gemini error responses."""
+    error = {"code": code, "message": message, "status": status}
+    if details:
+        error["details"] = details
+    error_class = errors.ClientError if code < 500 else errors.ServerError
+    return error_class(code, {"error": error})
+
+
+class FakeGeminiClient:
+    """
+    Stand-in for genai.Client with the async surface the agent uses, for
+    offline tests of context caching.
+
+    Responses play back a ScriptedBackend plan. Usage metadata counts the
+    system instruction and tool declarations as prompt tokens; when a request
+    references a live cache made with `aio.caches.create`, those tokens are
+    reported as `cached_content_token_count` instead. Caches whose prefix is
+    smaller than `min_cache_tokens` are refused with a 400, as the real API
+    does, and requests naming an expired or deleted cache get a 404.
+    """
+
+    def __init__(self, turns, min_cache_tokens=0, latency=0.0):
+        self.scripted = ScriptedBackend(turns, latency=latency)
+        self.min_cache_tokens = min_cache_tokens
+        self.cached_contents = {}  # name -> {"tokens": ..., "expires_at": ...}
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.creates = 0
+        self.updates = 0
+        self.aio = SimpleNamespace(
+            models=SimpleNamespace(generate_content_stream=self._generate_content_stream),
+            caches=SimpleNamespace(create=self._create, update=self._update),
+        )
+        self.caches = SimpleNamespace(delete=self._delete)
+
+    def _expire_time(self, ttl):
+        return time.time() + float(ttl.rstrip("s"))
+
+    def _cached_content(self, name):
+        entry = self.cached_contents[name]
+        return types.CachedContent(
+            name=name,
+            expire_time=datetime.fromtimestamp(entry["expires_at"], timezone.utc),
+            usage_metadata=types.CachedContentUsageMetadata(total_token_count=entry["tokens"]),
+        )
+
+    async def _create(self, model, config):
+        tokens = estimate_prefix_tokens(config.system_instruction, config.tools)
+        if tokens < self.min_cache_tokens:
+            raise _api_error(
+                400,
+                "INVALID_ARGUMENT",
+                f"Cached content is too small: {tokens} < {self.min_cache_tokens} tokens",
+            )
+        self.creates += 1
+        name = f"cachedContents/fake-{self.creates}"
+        self.cached_contents[name] = {
+            "tokens": tokens,
+            "expires_at": self._expire_time(config.ttl or "3600s"),
+        }
+        return self._cached_content(name)
+
+    async def _update(self, name, config):
+        if name not in self.cached_contents:
+            raise _api_error(404, "NOT_FOUND", f"{name} not found")
+        self.updates += 1
+        self.cached_contents[name]["expires_at"] = self._expire_time(config.ttl)
+        return self._cached_content(name)
+
+    def _delete(self, name):
+        self.cached_contents.pop(name, None)
+
+    async def _generate_content_stream(self, model, contents, config):
+        if config is not None and config.cached_content:
+            entry = self.cached_contents.get(config.cached_content)
+            if entry is None or entry["expires_at"] <= time.time():
+                raise _api_error(404, "NOT_FOUND", f"{config.cached_content} not found")
+            if config.system_instruction or config.tools:
+                raise _api_error(
+                    400,
+                    "INVALID_ARGUMENT",
+                    "system_instruction and tools must be in the cached content",
+                )
+            cached_tokens = entry["tokens"]
+        else:
+            cached_tokens = 0
+        prefix_tokens = cached_tokens or (
+            estimate_prefix_tokens(config.system_instruction, config.tools) if config else 0
+        )
+        prompt_tokens = sum(estimate_tokens(content) for content in contents) + prefix_tokens
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        return self._stream(model, contents, prompt_tokens, cached_tokens)
+
+    async def _stream(self, model, contents, prompt_tokens, cached_tokens):
+        async for chunk in self.scripted.generate_stream(model, contents, None):
+            if chunk.usage_metadata:
+                chunk.usage_metadata.prompt_token_count = prompt_tokens
+                chunk.usage_metadata.cached_content_token_count = cached_tokens or None
+            yield chunk
+
+
+plan = [
+    [{"call": "get_file_content", "args": {"file_path": "calculator/main.py"}}],
+    [{"text": "Done."}],
+]
+config = types.GenerateContentConfig(
+    tools=[registry.tool()], system_instruction="You are a helpful AI coding agent. " * 50
+)
+conversation = [types.Content(role="user", parts=[types.Part(text="Read the calculator.")])]
+
+
+async def run_requests(backend, count):
+    for _ in range(count):
+        async for _chunk in backend.generate_stream("model", conversation, config):
+            pass
+
+
+def token_report(fake):
+    uncached = fake.prompt_tokens - fake.cached_tokens
+    return f"prompt tokens {fake.prompt_tokens}, cached {fake.cached_tokens}, uncached {uncached}"
+
+
+plain = FakeGeminiClient(plan)
+asyncio.run(run_requests(as_backend(plain), 5))
+print("without caching:", token_report(plain))
+
+fake = FakeGeminiClient(plan)
+caching = ContextCachingBackend(fake)
+asyncio.run(run_requests(caching, 5))
+print("with caching:   ", token_report(fake), "| caches created:", fake.creates)
+
+refusing = FakeGeminiClient(plan, min_cache_tokens=10**6)
+asyncio.run(run_requests(ContextCachingBackend(refusing), 2))
+print("cache refused:  ", token_report(refusing), "| model calls:", refusing.scripted.calls)
+caching.close()
+print("caches left after close:", len(fake.cached_contents))
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 24: RateLimitedBackend shared by three sessions against a flaky stub ---"
+)
+# Expected: the stub answers its first two requests with a 429 carrying a
+# 0.2s retry hint; both are retried and all three sessions get "Done.". At two
+# requests a second with a burst of one, later requests are throttled, so the
+# queue peaks above 1. A 400 is not retryable and is raised at once.
+from rate_limit import RateLimitedBackend, request_tokens
+
+# Error statuses FaultInjectingBackend raises, by HTTP code.
+_ERROR_STATUSES = {
+    400: "INVALID_ARGUMENT",
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    503: "UNAVAILABLE",
+}
+
+
+class FaultInjectingBackend:
+    """
+    Fails the first `failures` requests to another backend, for testing retries.
+
+    Each failing request waits `latency` seconds and then raises the APIError
+    Gemini would send for `code`. With `retry_delay` (e.g. "2s") the error
+    carries a RetryInfo hint, as Gemini's 429s do. Later requests pass through.
+    """
+
+    def __init__(self, inner, failures=1, code=429, retry_delay=None, latency=0.0):
+        self.inner = as_backend(inner)
+        self.failures = failures
+        self.code = code
+        self.retry_delay = retry_delay
+        self.latency = latency
+        self.calls = 0
+        self.injected = 0
+
+    async def generate_stream(self, model, contents, config):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.injected < self.failures:
+            self.injected += 1
+            details = None
+            if self.retry_delay:
+                details = [
+                    {
+                        "@type": "type.googleapis.com/google.rpc.RetryInfo",
+                        "retryDelay": self.retry_delay,
+                    }
+                ]
+            raise _api_error(
+                self.code,
+                _ERROR_STATUSES.get(self.code, "UNKNOWN"),
+                f"Injected failure {self.injected} of {self.failures}",
+                details,
+            )
+        async for chunk in self.inner.generate_stream(model, contents, config):
+            yield chunk
+
+
+flaky = FaultInjectingBackend(
+    ScriptedBackend([[{"text": "Done."}]]), failures=2, code=429, retry_delay="0.2s", latency=0.05
+)
+limited = RateLimitedBackend(flaky, requests_per_minute=120, burst_seconds=0.5, base_delay=0.1)
+
+
+async def session():
+    chunks = [chunk async for chunk in limited.generate_stream("model", conversation, None)]
+    return chunks[0].candidates[0].content.parts[0].text
+
+
+async def run_sessions():
+    return await asyncio.gather(session(), session(), session())
+
+
+print(asyncio.run(run_sessions()))
+stats = limited.stats()
+print(
+    "calls:", stats["calls"], "retries:", stats["retries"],
+    "throttled:", stats["throttle_seconds"] > 0, "backed off:", stats["backoff_seconds"] > 0,
+    "max queue depth > 1:", stats["max_queue_depth"] > 1, "queue now:", stats["queue_depth"],
+)
+
+rejecting = RateLimitedBackend(
+    FaultInjectingBackend(ScriptedBackend([[{"text": "Done."}]]), failures=1, code=400)
+)
+try:
+    asyncio.run(rejecting.generate_stream("model", conversation, None).__anext__())
+except Exception as e:
+    print(f"{type(e).__name__}: {e.code} {e.status}", "| retries:", rejecting.stats()["retries"])
+
+# Expected: a request that fails three times before succeeding is charged
+# against the tokens-per-minute budget once, not four times.
+retried = RateLimitedBackend(
+    FaultInjectingBackend(ScriptedBackend([[{"text": "Done."}]]), failures=3, code=503),
+    requests_per_minute=0,
+    tokens_per_minute=60,
+    base_delay=0.01,
+)
+asyncio.run(retried.generate_stream("model", conversation, None).__anext__())
+charged = retried.tokens.capacity - retried.tokens._tokens
+print(
+    "retries:", retried.stats()["retries"], "| tokens charged:", round(charged),
+    "for a", request_tokens(conversation, None), "token request",
+)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 25: calls with relative, absolute and non-string paths in one turn ---"
+)
+# Expected: a relative read and an absolute write outside the working directory
+# are compared without a ValueError (they don't overlap); a write whose path
+# isn't a string conflicts with everything. Running the turn gives the read
+# its file and the write its "outside the permitted working directory" error.
+from call_function import calls_conflict
+
+relative_read = types.FunctionCall(
+    name="get_file_content", args={"file_path": "calculator/main.py"}
+)
+absolute_write = types.FunctionCall(
+    name="write_file", args={"file_path": "/tmp/outside.txt", "content": "x"}
+)
+odd_write = types.FunctionCall(name="write_file", args={"file_path": 42, "content": "x"})
+print("relative read vs absolute write conflict:", calls_conflict(relative_read, absolute_write))
+print("relative read vs non-string write conflict:", calls_conflict(relative_read, odd_write))
+
+
+for part in asyncio.run(run_turn([relative_read, absolute_write])).parts:
+    print(f"{part.function_response.name}: {str(part.function_response.response)[:90]}")
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 26: agent loop orders a write before an overlapping read, overlaps independent reads ---"
+)
+# Expected: the scripted model writes order.txt and reads it back in the same
+# turn; although the write is slowed down, the read waits for it and returns
+# "new contents". Three reads of different files in one turn run at the same
+# time (peak concurrency 3), and both sessions complete.
+import threading
+import time
+
+from backends import RecordingBackend
+from main import process_ai_interaction_async
+from registry import registry
+
+scratch = tempfile.mkdtemp()
+for name in ("a.txt", "b.txt", "c.txt", "order.txt"):
+    with open(os.path.join(scratch, name), "w") as f:
+        f.write(f"old contents of {name}\n")
+
+running = {"now": 0, "peak": 0}
+running_lock = threading.Lock()
+
+
+def slowed(func):
+    def wrapper(**kwargs):
+        with running_lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        try:
+            time.sleep(0.2)
+            return func(**kwargs)
+        finally:
+            with running_lock:
+                running["now"] -= 1
+
+    return wrapper
+
+
+original_functions = dict(registry.functions)
+registry.functions["write_file"] = slowed(registry.functions["write_file"])
+registry.functions["get_file_content"] = slowed(registry.functions["get_file_content"])
+project_directory = os.getcwd()
+os.chdir(scratch)  # The agent's working directory is ".".
+try:
+    ordered = RecordingBackend(
+        ScriptedBackend(
+            [
+                [
+                    {"call": "write_file", "args": {"file_path": "order.txt", "content": "new contents"}},
+                    {"call": "get_file_content", "args": {"file_path": "order.txt"}},
+                ],
+                [{"text": "Done."}],
+            ]
+        ),
+        os.path.join(scratch, "ordered.json"),
+    )
+    session = asyncio.run(process_ai_interaction_async(ordered, "Rewrite order.txt", False, quiet=True))
+    tool_message = ordered.interactions[1]["request"]["contents"][-1]
+    for part in tool_message["parts"]:
+        print(f"{part['function_response']['name']}: {part['function_response']['response']}")
+    print("status:", session["status"])
+
+    running["peak"] = 0
+    independent = ScriptedBackend(
+        [
+            [{"call": "get_file_content", "args": {"file_path": name}} for name in ("a.txt", "b.txt", "c.txt")],
+            [{"text": "Done."}],
+        ]
+    )
+    session = asyncio.run(process_ai_interaction_async(independent, "Read three files", False, quiet=True))
+    print("status:", session["status"], "| peak concurrent reads:", running["peak"])
+finally:
+    os.chdir(project_directory)
+    registry.functions.clear()
+    registry.functions.update(original_functions)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 27: run_batch writes one JSONL record per prompt ---")
+# Expected (sorted by id): "fast" and line 1 complete with "Done."; "slow"
+# exceeds the 0.5-second session timeout and is reported as a timeout; line 3
+# (not JSON) and "empty" (no prompt) are reported as errors.
+import io
+import json
+
+from main import run_batch
+
+
+class SlowOnRequestBackend(ScriptedBackend):
+    """Scripted model that takes a second to answer prompts mentioning "slow"."""
+
+    async def generate_stream(self, model, contents, config):
+        if "slow" in contents[0].parts[0].text:
+            await asyncio.sleep(1)
+        async for chunk in super().generate_stream(model, contents, config):
+            yield chunk
+
+
+prompts_path = os.path.join(tempfile.mkdtemp(), "prompts.jsonl")
+with open(prompts_path, "w") as f:
+    f.write('"Say done."\n')
+    f.write('{"id": "fast", "prompt": "Say done."}\n')
+    f.write("this line is not JSON\n")
+    f.write("\n")
+    f.write('{"id": "slow", "prompt": "Say done, slowly."}\n')
+    f.write('{"id": "empty", "prompt": ""}\n')
+
+batch_output = io.StringIO()
+asyncio.run(
+    run_batch(
+        SlowOnRequestBackend([[{"text": "Done."}]]),
+        prompts_path,
+        workers=2,
+        timeout=0.5,
+        out=batch_output,
+    )
+)
+records = [json.loads(line) for line in batch_output.getvalue().splitlines()]
+for record in sorted(records, key=lambda record: record["id"]):
+    print(
+        {
+            name: record.get(name)
+            for name in ("id", "status", "final_response", "iterations", "error")
+            if name in record
+        }
+    )
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 28: ranged reads of a 2 MB file don't scan the whole file ---"
+)
+# Expected: the byte-range read's header gives only bytes ("bytes 1000000-1000100
+# of 2050000"); the line read gives its line numbers but no total, which would
+# need a full scan of the file.
+large_directory = tempfile.mkdtemp()
+with open(os.path.join(large_directory, "large.txt"), "w") as f:
+    f.write("0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ.,;:!?-+*/=()[]{}<>\n" * 25000)
+print(get_file_content(large_directory, "large.txt", byte_offset=1000000, byte_count=100).splitlines()[0])
+print(get_file_content(large_directory, "large.txt", start_line=20000, line_count=1).splitlines()[0])
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print('--- Running Test Case 29: read_files on a file whose content starts with "Error:" ---')
+# Expected: the log file is returned as content, not reported as a failed read;
+# the missing file still gets an error.
+with open(os.path.join(large_directory, "failure.log"), "w") as f:
+    f.write("Error: disk quota exceeded\nTraceback (most recent call last):\n")
+for result in read_files(large_directory, ["failure.log", "missing.log"]):
+    print(result)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print(
+    "--- Running Test Case 30: run_tests sees a fix to a module the agent process already imported ---"
+)
+# Expected: 1 failed (the agent has the buggy shout module loaded, which must not
+# matter), then after shout.py is fixed on disk: 1 passed, not served from the cache.
+import importlib
+
+tests_directory = tempfile.mkdtemp()
+with open(os.path.join(tests_directory, "shout.py"), "w") as f:
+    f.write("def shout(text):\n    return text\n")
+with open(os.path.join(tests_directory, "test_shout.py"), "w") as f:
+    f.write(
+        "import unittest\n"
+        "from shout import shout\n\n\n"
+        "class TestShout(unittest.TestCase):\n"
+        "    def test_shout(self):\n"
+        "        self.assertEqual(shout('hi'), 'HI')\n"
+    )
+sys.path.insert(0, tests_directory)
+importlib.import_module("shout")  # Loaded in the agent's process, as tools may do.
+before_fix = run_tests(tests_directory, "test_shout.py")
+print("before fix:", before_fix["passed"], "passed,", before_fix["failed"], "failed")
+with open(os.path.join(tests_directory, "shout.py"), "w") as f:
+    f.write("def shout(text):\n    return text.upper()\n")
+after_fix = run_tests(tests_directory, "test_shout.py")
+print("after fix:", after_fix["passed"], "passed,", after_fix["failed"], "failed, cached:", after_fix["cached"])
+sys.path.remove(tests_directory)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 31: run_tests takes one scheduler slot per worker ---")
+# Expected: a lone caller asking for 8 slots of 3 gets 3, and 2 with one slot
+# held elsewhere. run_tests on 6 tests, limited to 2 concurrent scripts,
+# passes all 6 with at most 2 scripts running.
+import threading
+
+from run_python import DEFAULT_MAX_CONCURRENT_SCRIPTS, ScriptScheduler, configure_limits, scheduler
+
+three_slots = ScriptScheduler(3)
+with three_slots.slots(8) as (_wait, held):
+    print("alone:", held)
+with three_slots.slot():
+    with three_slots.slots(8) as (_wait, held):
+        print("one slot busy:", held)
+
+configure_limits(2)
+peak_running = 0
+run_finished = threading.Event()
+
+
+def watch_running():
+    global peak_running
+    while not run_finished.is_set():
+        peak_running = max(peak_running, scheduler.running)
+        time.sleep(0.001)
+
+
+watcher = threading.Thread(target=watch_running)
+watcher.start()
+slow_tests_directory = tempfile.mkdtemp()
+with open(os.path.join(slow_tests_directory, "test_slow.py"), "w") as f:
+    f.write("import time\nimport unittest\n\n\nclass TestSlow(unittest.TestCase):\n")
+    for i in range(6):
+        f.write(f"    def test_{i}(self):\n        time.sleep(0.2)\n")
+limited = run_tests(slow_tests_directory, "test_slow.py")
+run_finished.set()
+watcher.join()
+configure_limits(DEFAULT_MAX_CONCURRENT_SCRIPTS)
+print("passed:", limited["passed"], "failed:", limited["failed"], "| peak running scripts:", peak_running)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 32: a failed or timed-out turn doesn't leave its calls running ---")
+# Expected: the model starts a slowed write, queues a second write to the same
+# file, then its stream breaks. The session raises only after the first write
+# finished (0 calls running), and the queued write never ran, so the file holds
+# "first". A session cancelled by a timeout while streaming behaves the same.
+from backends import ScriptedBackend
+
+
+class BrokenStreamBackend(ScriptedBackend):
+    """Plays its turn, then fails as a dropped connection would."""
+
+    async def generate_stream(self, model, contents, config):
+        async for chunk in super().generate_stream(model, contents, config):
+            yield chunk
+        raise ConnectionError("stream dropped")
+
+
+two_writes = [
+    {"call": "write_file", "args": {"file_path": "cancelled.txt", "content": "first"}},
+    {"call": "write_file", "args": {"file_path": "cancelled.txt", "content": "second"}},
+    {"text": "Done."},
+]
+registry.functions["write_file"] = slowed(registry.functions["write_file"])
+os.chdir(scratch)
+try:
+    try:
+        asyncio.run(
+            process_ai_interaction_async(
+                BrokenStreamBackend([two_writes], chunk_latency=0.05), "Write twice", False, quiet=True
+            )
+        )
+    except ConnectionError as e:
+        with open("cancelled.txt") as f:
+            print(f"raised {e!r} | running calls: {running['now']} | file: {f.read()}")
+
+    async def timed_out_session():
+        slow_stream = ScriptedBackend([two_writes], chunk_latency=1.0)
+        try:
+            await asyncio.wait_for(
+                process_ai_interaction_async(slow_stream, "Write twice", False, quiet=True), 0.1
+            )
+        except asyncio.TimeoutError:
+            with open("cancelled.txt") as f:
+                print(f"timed out | running calls: {running['now']} | file: {f.read()}")
+
+    with open("cancelled.txt", "w") as f:
+        f.write("untouched")
+    asyncio.run(timed_out_session())
+finally:
+    os.chdir(project_directory)
+    registry.functions.clear()
+    registry.functions.update(original_functions)
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 33: workspace index follows .gitignore edits ---")
+# Expected: with "*.log" ignored, only keep.txt is listed. After the agent
+# empties .gitignore, debug.log is listed too; after .gitignore is changed
+# outside the agent to ignore "*.txt", the watcher drops keep.txt. Each listing
+# matches what a freshly built .gitignore matcher says is on disk.
+from get_files_info import GitignoreMatcher
+
+gitignore_root = tempfile.mkdtemp()
+for name, text in ((".gitignore", "*.log\n"), ("keep.txt", "kept\n"), ("debug.log", "noise\n")):
+    with open(os.path.join(gitignore_root, name), "w") as f:
+        f.write(text)
+gitignore_index = start_index(gitignore_root)
+gitignore_index.ready.wait(timeout=10)
+
+
+def indexed_names():
+    return sorted(name for name, _path, _entry in gitignore_index.list_dir(gitignore_root))
+
+
+print("indexed:", indexed_names())
+write_file(gitignore_root, ".gitignore", "")
+print("after the agent's edit:", indexed_names())
+with open(os.path.join(gitignore_root, ".gitignore"), "w") as f:
+    f.write("*.txt\n")
+deadline = time.monotonic() + 5
+while "keep.txt" in indexed_names() and time.monotonic() < deadline:
+    time.sleep(0.05)
+print("after an outside edit:", indexed_names())
+fresh_matcher = GitignoreMatcher(gitignore_root)
+on_disk = sorted(
+    name
+    for name in os.listdir(gitignore_root)
+    if not fresh_matcher.is_ignored(os.path.join(gitignore_root, name), False)
+)
+print("index matches a fresh .gitignore check:", indexed_names() == on_disk)
+gitignore_index.stop()
+print("\n" + "=" * 50 + "\n")  # Separator
+
+print("--- Running Test Case 34: unified diffs with blank lines between and after hunks ---")
+# Expected: both hunks apply although one blank line separates them and
+# another follows the diff; the file reads "a, B, c, d, e, f, G, h" with the
+# blank line in the middle untouched. A hunk with more lines than its header
+# counts is rejected instead of being cut short.
+from edits import EditConflictError, apply_unified_diff
+
+original = "a\nb\nc\nd\n\ne\nf\ng\nh\n"
+two_hunks = (
+    "@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n"
+    "\n"
+    "@@ -7,3 +7,3 @@\n f\n-g\n+G\n h\n"
+    "\n"
+)
+print(repr(apply_unified_diff(original, two_hunks)))
+try:
+    apply_unified_diff(original, "@@ -1,2 +1,2 @@\n a\n-b\n+B\n c\n")
+except EditConflictError as e:
+    print(f"EditConflictError: {e}")
+print("\n" + "=" * 50 + "\n")  # Separator